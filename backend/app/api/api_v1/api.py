@@ -5,6 +5,9 @@ from app.api import auth
 from app.api import search
 from app.api import image
 from app.api import dashboard  
+from app.api import upstreams
+from app.api import assets
+from app.api import metrics
 
 api_router = APIRouter()
 
@@ -13,3 +16,6 @@ api_router.include_router(auth.router)
 api_router.include_router(search.router)
 api_router.include_router(image.router)
 api_router.include_router(dashboard.router)
+api_router.include_router(upstreams.router)
+api_router.include_router(assets.router)
+api_router.include_router(metrics.router)
@@ -0,0 +1,32 @@
+import os
+
+from fastapi import APIRouter, HTTPException, Request, status
+
+from app.assets.images import ASSET_KEY, MEDIA_TYPES, asset_path, thumbnail_path
+from app.assets.responses import asset_response
+from app.core.config import settings
+
+router = APIRouter(prefix="/assets", tags=["assets"])
+
+# Asset keys are content hashes, so these URLs are unguessable and can be
+# embedded in <img> tags and cached by browsers and CDNs forever.
+
+def _key_or_404(key: str) -> str:
+    if not ASSET_KEY.match(key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asset not found")
+    return key
+
+@router.get("/images/{key}")
+async def get_image_asset(key: str, request: Request):
+    path = asset_path(settings.IMAGE_ASSET_DIR, _key_or_404(key))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Asset not found")
+    return asset_response(request, path, key, MEDIA_TYPES[os.path.splitext(key)[1]])
+
+@router.get("/thumbnails/{key}")
+async def get_image_thumbnail(key: str, request: Request):
+    path = thumbnail_path(settings.IMAGE_ASSET_DIR, _key_or_404(key))
+    if os.path.exists(path):
+        return asset_response(request, path, f"thumb-{key}", "image/jpeg")
+    # no thumbnail (Pillow missing or decoding failed): fall back to the full image
+    return await get_image_asset(key, request)
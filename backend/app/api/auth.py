@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Cookie
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_session
 from app.schemas import auth as auth_schemas
 from app.models import User
-from app.core.security import hash_password, verify_password, create_access_token, decode_access_token
+from app.core.security import hash_password, verify_and_update_password, create_access_token, PasswordHasherBusy
+from app.api.deps import get_current_user, get_principal_cache, get_replica_session
+from app.core.metrics import stage
+from app.cache.principal import Principal, PrincipalCache
+from sqlalchemy import update
 from sqlalchemy.future import select
 from datetime import timedelta
 
@@ -14,23 +18,56 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 @router.post("/register", response_model=auth_schemas.UserRead, status_code=status.HTTP_201_CREATED)
 async def register_user(payload: auth_schemas.UserCreate, session: AsyncSession = Depends(get_session)):
     # Check if user exists
-    result = await session.execute(select(User).where(User.email == payload.email))
+    with stage("user_lookup"):
+        result = await session.execute(select(User).where(User.email == payload.email))
     existing_user = result.scalar_one_or_none()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    user = User(email=payload.email, hashed_password=hash_password(payload.password))
+    try:
+        with stage("password_hash"):
+            hashed_password = await hash_password(payload.password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+
+    user = User(email=payload.email, hashed_password=hashed_password)
     session.add(user)
-    await session.commit()
-    await session.refresh(user)
+    with stage("commit"):
+        await session.commit()
+        await session.refresh(user)
     return user
 
 @router.post("/login", status_code=status.HTTP_200_OK)
-async def login_user(payload: auth_schemas.UserCreate, response: Response, session: AsyncSession = Depends(get_session)):
-    result = await session.execute(select(User).where(User.email == payload.email))
-    user = result.scalar_one_or_none()
-    if not user or not verify_password(payload.password, user.hashed_password):
+async def login_user(
+    payload: auth_schemas.UserCreate,
+    response: Response,
+    session: AsyncSession = Depends(get_replica_session),
+    primary: AsyncSession = Depends(get_session),
+    principals: PrincipalCache = Depends(get_principal_cache),
+):
+    with stage("user_lookup"):
+        result = await session.execute(select(User).where(User.email == payload.email))
+        user = result.scalar_one_or_none()
+        if not user:
+            # just registered: the replica may not have the row yet
+            result = await primary.execute(select(User).where(User.email == payload.email))
+            user = result.scalar_one_or_none()
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    try:
+        with stage("password_verify"):
+            valid, new_hash = await verify_and_update_password(payload.password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # transparently move the stored hash to the current scheme/cost
+        with stage("commit"):
+            await primary.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
+            await primary.commit()
+        # the users row changed: every worker drops its cached principal
+        await principals.invalidate(user.id)
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(subject=str(user.id), expires_delta=access_token_expires)
@@ -53,14 +90,5 @@ async def logout_user(response: Response):
     return {"message": "Logout successful"}
 
 @router.get("/me", response_model=auth_schemas.UserRead)
-async def get_current_user(access_token: str = Cookie(None), session: AsyncSession = Depends(get_session)):
-    if not access_token:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    user_id = decode_access_token(access_token)
-    if not user_id:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    result = await session.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
+async def read_current_user(current_user: Principal = Depends(get_current_user)):
+    return current_user
@@ -1,59 +1,331 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import and_
+from sqlalchemy.orm import defer
+from sqlalchemy import and_, cast, func, literal_column, null, String, union_all
 from typing import Optional
 from datetime import datetime
+import uuid
 
+from app.core.config import settings
+from app.core import fastjson
+from app.core.fastjson import FastJSONResponse, RawJSON
+from app.core.metrics import stage
 from app.db.session import get_session
-from app.api.deps import get_current_user
-from app.models import SearchHistory, ImageHistory, User
+from app.db.routing import ReadRouter
+from app.db.history_export import stream_export, encode_ndjson, CSVEncoder
+from app.db.pagination import keyset_page, keyset_columns_page, split_page, InvalidCursor
+from app.db.payload_store import PayloadStore
+from app.db.text_search import TextSearchBackend
+from app.api.deps import get_current_user, get_dashboard_cache, get_db_router, get_payload_store, get_read_session, get_text_search
+from app.models import SearchHistory, ImageHistory, Payload
+from app.cache.dashboard import DashboardCache, etag_matches, make_etag
+from app.cache.principal import Principal
 from app.schemas import dashboard as dashboard_schemas
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
+def history_filters(model, user_id, keyword, date_from, date_to, text_search: TextSearchBackend):
+    # user_id=None is only used by admin exports across every user
+    filters = [model.user_id == user_id] if user_id is not None else []
+
+    if keyword:
+        match = text_search.match(model, keyword, user_id)
+        if match is not None:
+            filters.append(match)
+
+    if date_from:
+        filters.append(model.created_at >= date_from)
+
+    if date_to:
+        filters.append(model.created_at <= date_to)
+
+    return filters
+
+def history_page(model, filters, keyword, sort, cursor, limit, text_search: TextSearchBackend):
+    # payloads stay in the database until a detail request asks for them
+    statement = select(model).options(defer(model.mcp_response)).where(and_(*filters))
+    rank = text_search.rank(model, keyword) if keyword and sort == "relevance" else None
+    if rank is not None:
+        # relevance order has no stable keyset, so it is a single page
+        return statement.order_by(rank.desc(), model.created_at.desc()).limit(limit), False
+    return keyset_page(statement, model, cursor, limit), True
+
+# Rows come straight from our own tables, so the response dicts are built
+# by hand (shaped like dashboard_schemas.SearchEntry/ImageEntry) and returned
+# as FastJSONResponse instead of being re-validated through the models.
+def search_summary(row: SearchHistory, mcp_response=None) -> dict:
+    return {
+        "id": str(row.id),
+        "query": row.query,
+        "mcp_response": mcp_response,
+        "payload_digest": row.payload_digest,
+        "mcp_server": row.mcp_server,
+        "created_at": row.created_at,
+    }
+
+def image_summary(row: ImageHistory, mcp_response=None) -> dict:
+    full_url = thumbnail_url = row.image_url
+    if row.asset_key:
+        full_url = f"{settings.IMAGE_ASSET_BASE_URL}/assets/images/{row.asset_key}"
+        thumbnail_url = f"{settings.IMAGE_ASSET_BASE_URL}/assets/thumbnails/{row.asset_key}"
+    return {
+        "id": str(row.id),
+        "prompt": row.prompt,
+        "image_url": row.image_url,
+        "full_url": full_url,
+        "thumbnail_url": thumbnail_url,
+        "mcp_response": mcp_response,
+        "payload_digest": row.payload_digest,
+        "mcp_server": row.mcp_server,
+        "created_at": row.created_at,
+    }
+
+async def entry_payload(session: AsyncSession, payloads: PayloadStore, row):
+    if row.payload_digest is None:
+        return row.mcp_response
+    # the decompressed canonical JSON goes out as-is, never parsed
+    with stage("payload_load"):
+        raw = await payloads.load_raw(session, row.payload_digest)
+    return RawJSON(raw) if raw is not None else None
+
+def page_response(request: Request, etag: str, body: Optional[bytes]) -> Response:
+    # private: pages are per user; no-cache: clients revalidate every poll
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if body is None or etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
 @router.get("/", response_model=dashboard_schemas.DashboardResponse)
 async def get_dashboard_entries(
+    request: Request,
     type: Optional[str] = Query(None, regex="^(search|image)$"),
     keyword: Optional[str] = Query(None, min_length=1),
     date_from: Optional[datetime] = Query(None),
     date_to: Optional[datetime] = Query(None),
-    session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    sort: str = Query("recent", regex="^(recent|relevance)$"),
+    limit: int = Query(settings.DASHBOARD_PAGE_SIZE, ge=1, le=settings.DASHBOARD_MAX_PAGE_SIZE),
+    search_cursor: Optional[str] = Query(None),
+    image_cursor: Optional[str] = Query(None),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_user),
+    text_search: TextSearchBackend = Depends(get_text_search),
+    cache: Optional[DashboardCache] = Depends(get_dashboard_cache),
 ):
-    filters_search = [SearchHistory.user_id == current_user.id]
-    filters_image = [ImageHistory.user_id == current_user.id]
+    # unchanged history (same version) and filters: answered from the cache,
+    # with a 304 when the client already holds the page
+    version = filters_key = None
+    if cache is not None:
+        filters_key = cache.filters_key({
+            "type": type, "keyword": keyword, "date_from": date_from, "date_to": date_to, "sort": sort,
+            "limit": limit, "search_cursor": search_cursor, "image_cursor": image_cursor,
+        })
+        version = await cache.version(current_user.id)
+    if version is not None:
+        if request.headers.get("if-none-match"):
+            etag = await cache.etag(current_user.id, version, filters_key)
+            if etag is not None and etag_matches(request.headers.get("if-none-match"), etag):
+                return page_response(request, etag, None)
+        page = await cache.get(current_user.id, version, filters_key)
+        if page is not None:
+            return page_response(request, page.etag, page.body)
 
-    if keyword:
-        filters_search.append(SearchHistory.query.ilike(f"%{keyword}%"))
-        filters_image.append(ImageHistory.prompt.ilike(f"%{keyword}%"))
+    searches = []
+    images = []
+    next_search_cursor = None
+    next_image_cursor = None
 
-    if date_from:
-        filters_search.append(SearchHistory.created_at >= date_from)
-        filters_image.append(ImageHistory.created_at >= date_from)
+    try:
+        if type in (None, "search"):
+            filters = history_filters(SearchHistory, current_user.id, keyword, date_from, date_to, text_search)
+            statement, paged = history_page(SearchHistory, filters, keyword, sort, search_cursor, limit, text_search)
+            with stage("query"):
+                result = await session.execute(statement)
+            rows, next_search_cursor = split_page(result.scalars().all(), limit) if paged else (result.scalars().all(), None)
+            with stage("serialize"):
+                searches = [search_summary(row) for row in rows]
 
-    if date_to:
-        filters_search.append(SearchHistory.created_at <= date_to)
-        filters_image.append(ImageHistory.created_at <= date_to)
+        if type in (None, "image"):
+            filters = history_filters(ImageHistory, current_user.id, keyword, date_from, date_to, text_search)
+            statement, paged = history_page(ImageHistory, filters, keyword, sort, image_cursor, limit, text_search)
+            with stage("query"):
+                result = await session.execute(statement)
+            rows, next_image_cursor = split_page(result.scalars().all(), limit) if paged else (result.scalars().all(), None)
+            with stage("serialize"):
+                images = [image_summary(row) for row in rows]
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    searches = []
-    images = []
+    with stage("serialize"):
+        body = fastjson.dumps({
+            "searches": searches,
+            "images": images,
+            "next_search_cursor": next_search_cursor,
+            "next_image_cursor": next_image_cursor,
+        })
+    if version is not None:
+        page = await cache.put(current_user.id, version, filters_key, body)
+        return page_response(request, page.etag, page.body)
+    return page_response(request, make_etag(body), body)
 
-    if type in (None, "search"):
-        result = await session.execute(select(SearchHistory).where(and_(*filters_search)).order_by(SearchHistory.created_at.desc()).limit(50))
-        searches = result.scalars().all()
+def timeline_branch(model, kind: str, text_column, image_url_column, filters, cursor, limit):
+    created_at = model.created_at
+    if not getattr(created_at.type, "timezone", False):
+        # image_history.created_at is a naive UTC TIMESTAMP; merge it as timestamptz
+        # so the union does not reinterpret it in the session's TimeZone
+        created_at = func.timezone("UTC", created_at)
+    statement = select(
+        literal_column(f"'{kind}'").label("type"),
+        model.id.label("id"),
+        text_column.label("text"),
+        image_url_column.label("image_url"),
+        model.payload_digest.label("payload_digest"),
+        model.mcp_server.label("mcp_server"),
+        created_at.label("created_at"),
+    ).where(and_(*filters))
+    # each branch walks its own (user_id, created_at, id) index and stops after one page
+    return keyset_columns_page(statement, model.created_at, model.id, cursor, limit)
 
-    if type in (None, "image"):
-        result = await session.execute(select(ImageHistory).where(and_(*filters_image)).order_by(ImageHistory.created_at.desc()).limit(50))
-        images = result.scalars().all()
+@router.get("/timeline", response_model=dashboard_schemas.TimelineResponse)
+async def get_dashboard_timeline(
+    keyword: Optional[str] = Query(None, min_length=1),
+    date_from: Optional[datetime] = Query(None),
+    date_to: Optional[datetime] = Query(None),
+    limit: int = Query(settings.DASHBOARD_PAGE_SIZE, ge=1, le=settings.DASHBOARD_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_user),
+    text_search: TextSearchBackend = Depends(get_text_search),
+):
+    try:
+        searches = timeline_branch(
+            SearchHistory, "search", SearchHistory.query, cast(null(), String),
+            history_filters(SearchHistory, current_user.id, keyword, date_from, date_to, text_search),
+            cursor, limit,
+        )
+        images = timeline_branch(
+            ImageHistory, "image", ImageHistory.prompt, ImageHistory.image_url,
+            history_filters(ImageHistory, current_user.id, keyword, date_from, date_to, text_search),
+            cursor, limit,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # one round-trip: both histories merged and ordered by Postgres
+    merged = union_all(searches, images).subquery()
+    statement = select(merged).order_by(merged.c.created_at.desc(), merged.c.id.desc()).limit(limit + 1)
+    with stage("query"):
+        result = await session.execute(statement)
+    rows, next_cursor = split_page(result.all(), limit)
+
+    with stage("serialize"):
+        entries = [
+            {
+                "type": row.type,
+                "id": str(row.id),
+                "text": row.text,
+                "image_url": row.image_url,
+                "payload_digest": row.payload_digest,
+                "mcp_server": row.mcp_server,
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ]
+    return FastJSONResponse({"entries": entries, "next_cursor": next_cursor})
+
+def export_statement(model, kind: str, text_column, image_url_column, filters, ordered: bool):
+    statement = select(
+        literal_column(f"'{kind}'").label("type"),
+        model.id.label("id"),
+        model.user_id.label("user_id"),
+        text_column.label("text"),
+        image_url_column.label("image_url"),
+        model.mcp_server.label("mcp_server"),
+        model.created_at.label("created_at"),
+        model.mcp_response.label("mcp_response"),
+        Payload.codec.label("payload_codec"),
+        Payload.data.label("payload_data"),
+    ).outerjoin(Payload, Payload.digest == model.payload_digest).where(and_(*filters))
+    if ordered:
+        statement = statement.order_by(model.created_at, model.id)
+    return statement
+
+@router.get("/export")
+async def export_history(
+    filters: dashboard_schemas.DashboardFilter = Depends(),
+    format: str = Query("ndjson", regex="^(ndjson|csv)$"),
+    gzip: bool = Query(False),
+    user_id: Optional[uuid.UUID] = Query(None, description="Admin only: export another user's history"),
+    all_users: bool = Query(False, description="Admin only: export every user's history"),
+    current_user: Principal = Depends(get_current_user),
+    text_search: TextSearchBackend = Depends(get_text_search),
+    db_router: ReadRouter = Depends(get_db_router),
+):
+    if (user_id is not None or all_users) and not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    owner_id = None if all_users else (user_id or current_user.id)
+
+    statements = []
+    if filters.type in (None, "search"):
+        statements.append(export_statement(
+            SearchHistory, "search", SearchHistory.query, cast(null(), String),
+            history_filters(SearchHistory, owner_id, filters.keyword, filters.date_from, filters.date_to, text_search),
+            ordered=owner_id is not None,
+        ))
+    if filters.type in (None, "image"):
+        statements.append(export_statement(
+            ImageHistory, "image", ImageHistory.prompt, ImageHistory.image_url,
+            history_filters(ImageHistory, owner_id, filters.keyword, filters.date_from, filters.date_to, text_search),
+            ordered=owner_id is not None,
+        ))
+
+    encode = encode_ndjson if format == "ndjson" else CSVEncoder()
+    filename = f"history.{format}"
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    # the stream opens its own session: it outlives this handler
+    sessions = await db_router.sessions_for(owner_id)
+    body = stream_export(sessions, statements, encode, compress=gzip, yield_per=settings.EXPORT_YIELD_PER)
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.get("/search/{search_id}", response_model=dashboard_schemas.SearchEntry)
+async def get_search_entry(
+    search_id: uuid.UUID,
+    session: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_user),
+    payloads: PayloadStore = Depends(get_payload_store),
+):
+    result = await session.execute(select(SearchHistory).where(SearchHistory.id == search_id, SearchHistory.user_id == current_user.id))
+    entry = result.scalar_one_or_none()
+    if not entry:
+        raise HTTPException(status_code=404, detail="Search entry not found")
+    return FastJSONResponse(search_summary(entry, await entry_payload(session, payloads, entry)))
 
-    return dashboard_schemas.DashboardResponse(searches=searches, images=images)
+@router.get("/image/{image_id}", response_model=dashboard_schemas.ImageEntry)
+async def get_image_entry(
+    image_id: uuid.UUID,
+    session: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_user),
+    payloads: PayloadStore = Depends(get_payload_store),
+):
+    result = await session.execute(select(ImageHistory).where(ImageHistory.id == image_id, ImageHistory.user_id == current_user.id))
+    entry = result.scalar_one_or_none()
+    if not entry:
+        raise HTTPException(status_code=404, detail="Image entry not found")
+    return FastJSONResponse(image_summary(entry, await entry_payload(session, payloads, entry)))
 
 @router.delete("/search/{search_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_search_entry(
     search_id: str,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
+    text_search: TextSearchBackend = Depends(get_text_search),
+    db_router: ReadRouter = Depends(get_db_router),
+    cache: Optional[DashboardCache] = Depends(get_dashboard_cache),
 ):
     result = await session.execute(select(SearchHistory).where(SearchHistory.id == search_id, SearchHistory.user_id == current_user.id))
     entry = result.scalar_one_or_none()
@@ -61,13 +333,20 @@ async def delete_search_entry(
         raise HTTPException(status_code=404, detail="Search entry not found")
     await session.delete(entry)
     await session.commit()
+    text_search.remove(SearchHistory.__tablename__, entry.id)
+    await db_router.mark_write(current_user.id)
+    if cache is not None:
+        await cache.bump(current_user.id)
     return
 
 @router.delete("/image/{image_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_image_entry(
     image_id: str,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
+    text_search: TextSearchBackend = Depends(get_text_search),
+    db_router: ReadRouter = Depends(get_db_router),
+    cache: Optional[DashboardCache] = Depends(get_dashboard_cache),
 ):
     result = await session.execute(select(ImageHistory).where(ImageHistory.id == image_id, ImageHistory.user_id == current_user.id))
     entry = result.scalar_one_or_none()
@@ -75,4 +354,8 @@ async def delete_image_entry(
         raise HTTPException(status_code=404, detail="Image entry not found")
     await session.delete(entry)
     await session.commit()
-    return
+    text_search.remove(ImageHistory.__tablename__, entry.id)
+    await db_router.mark_write(current_user.id)
+    if cache is not None:
+        await cache.bump(current_user.id)
+    return
\ No newline at end of file
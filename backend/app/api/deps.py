@@ -1,21 +1,145 @@
-from fastapi import Depends, HTTPException, status, Cookie
+from typing import Optional
+from fastapi import Depends, HTTPException, status, Cookie, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_session
 from app.models import User
-from app.core.security import decode_access_token
+from app.core.security import decode_token
+from app.core.metrics import record_cache, stage
+from app.cache.dashboard import DashboardCache
+from app.cache.principal import Principal, PrincipalCache
+from app.cache.refresh import BackgroundRefresher
+from app.cache.result_cache import ResultCache
+from app.cache.semantic import SemanticCache
+from app.core.singleflight import SingleFlight
+from app.db.history_writer import HistoryWriter
+from app.db.payload_store import PayloadStore
+from app.db.routing import ReadRouter
+from app.db.text_search import TextSearchBackend
+from app.jobs.queue import JobQueue
+from app.mcp.admission import INTERACTIVE, set_caller
+from app.mcp.client import MCPClient
+from app.mcp.registry import MCPClientRegistry, TAVILY, FLUX
 from sqlalchemy.future import select
 
+def get_principal_cache(request: Request) -> PrincipalCache:
+    return request.app.state.principals
+
+
+def get_db_router(request: Request) -> ReadRouter:
+    return request.app.state.db_router
+
+
+async def get_replica_session(router: ReadRouter = Depends(get_db_router)):
+    # lag-tolerant lookups (auth); callers retry a miss on the primary
+    sessions = await router.sessions_for()
+    async with sessions() as session:
+        yield session
+
+
 async def get_current_user(
     access_token: str = Cookie(None),
-    session: AsyncSession = Depends(get_session)
-):
+    session: AsyncSession = Depends(get_replica_session),
+    primary: AsyncSession = Depends(get_session),
+    principals: PrincipalCache = Depends(get_principal_cache),
+) -> Principal:
     if not access_token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-    user_id = decode_access_token(access_token)
-    if not user_id:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
-    result = await session.execute(select(User).where(User.id == user_id))
-    user = result.scalar_one_or_none()
-    if not user or not user.is_active:
+
+    user_id = principals.user_id_for(access_token)
+    record_cache("principal_token", "local", "miss" if user_id is None else "hit")
+    if user_id is None:
+        with stage("token_decode"):
+            payload = decode_token(access_token)
+        user_id = payload.get("sub") if payload else None
+        if not user_id:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
+        principals.remember_token(access_token, user_id, payload.get("exp"))
+
+    principal = principals.get(user_id)
+    record_cache("principal", "local", "miss" if principal is None else "hit")
+    if principal is None:
+        with stage("user_lookup"):
+            result = await session.execute(select(User).where(User.id == user_id))
+            user = result.scalar_one_or_none()
+            if user is None:
+                # a user created moments ago may not have reached the replica yet
+                result = await primary.execute(select(User).where(User.id == user_id))
+                user = result.scalar_one_or_none()
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found or inactive")
+        principal = Principal.from_user(user)
+        principals.put(principal)
+
+    if not principal.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found or inactive")
-    return user
+    return principal
+
+
+async def bind_mcp_caller(current_user: Principal = Depends(get_current_user)):
+    # identifies the user behind upstream calls for per-user fair share and rate limits
+    set_caller(current_user.id, INTERACTIVE)
+
+
+async def get_read_session(
+    current_user: Principal = Depends(get_current_user),
+    router: ReadRouter = Depends(get_db_router),
+):
+    # the caller's own history: pinned to the primary right after they wrote
+    sessions = await router.sessions_for(current_user.id)
+    async with sessions() as session:
+        yield session
+
+
+def get_mcp_registry(request: Request) -> MCPClientRegistry:
+    return request.app.state.mcp
+
+
+def _get_mcp_client(registry: MCPClientRegistry, name: str) -> MCPClient:
+    try:
+        return registry.get(name)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"MCP upstream '{name}' is not configured")
+
+
+def get_tavily_client(registry: MCPClientRegistry = Depends(get_mcp_registry)) -> MCPClient:
+    return _get_mcp_client(registry, TAVILY)
+
+
+def get_flux_client(registry: MCPClientRegistry = Depends(get_mcp_registry)) -> MCPClient:
+    return _get_mcp_client(registry, FLUX)
+
+
+def get_singleflight(request: Request) -> SingleFlight:
+    return request.app.state.singleflight
+
+
+def get_result_cache(request: Request) -> ResultCache:
+    return request.app.state.result_cache
+
+
+def get_refresher(request: Request) -> BackgroundRefresher:
+    return request.app.state.refresher
+
+
+def get_semantic_cache(request: Request) -> Optional[SemanticCache]:
+    return getattr(request.app.state, "semantic_cache", None)
+
+
+def get_dashboard_cache(request: Request) -> Optional[DashboardCache]:
+    return getattr(request.app.state, "dashboard_cache", None)
+
+
+def get_history_writer(request: Request) -> HistoryWriter:
+    return request.app.state.history_writer
+
+
+def get_image_jobs(request: Request) -> JobQueue:
+    return request.app.state.image_jobs
+
+
+def get_payload_store(request: Request) -> PayloadStore:
+    return request.app.state.payloads
+
+
+def get_text_search(request: Request) -> TextSearchBackend:
+    return request.app.state.text_search
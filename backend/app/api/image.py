@@ -1,67 +1,249 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import math
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_session
 from app.mcp.client import MCPClient
 from app.core.config import settings
-from app.core.redis import get_redis
 from app import models, schemas
-import json
+from app.api.deps import get_current_user, bind_mcp_caller, get_flux_client, get_singleflight, get_result_cache, get_refresher, get_history_writer, get_image_jobs
+from app.cache.principal import Principal
+from app.cache.refresh import BackgroundRefresher
+from app.cache.result_cache import ResultCache, CacheEntry
+from app.core.fastjson import FastJSONResponse
+from app.core.metrics import stage
+from app.core.singleflight import SingleFlight
+from app.core.sse import EVENT_STREAM, SSE_HEADERS, format_sse, wants_event_stream
+from app.mcp.admission import BACKGROUND, set_caller
+from app.mcp.resilience import UpstreamUnavailable
+from app.mcp.streaming import stream_tool_call
+from app.db.history_writer import HistoryWriter
+from app.jobs.queue import JobQueue, JobQueueFull, TERMINAL
+from app.mcp.registry import FLUX
+from typing import Optional
 
 router = APIRouter(prefix="/image", tags=["image"])
 
-@router.post("/", response_model=schemas.ImageGenerateResponse, status_code=status.HTTP_201_CREATED)
-async def generate_image(
-    payload: schemas.ImageGenerateRequest,
-    session: AsyncSession = Depends(get_session),
-    redis=Depends(get_redis),
-    current_user: models.User = Depends(get_current_user),
-):
-    prompt = payload.prompt.strip()
-    if not prompt:
-        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Prompt must not be empty")
+TOOL = "generateImageUrl"
+
+async def save_image(writer: HistoryWriter, session: Optional[AsyncSession], user_id, prompt: str, image_url: str, response: dict) -> str:
+    new_entry = models.ImageHistory(
+        user_id=user_id,
+        prompt=prompt,
+        image_url=image_url,
+        mcp_response=response,
+        mcp_server=settings.FLUX_MCP_URL,
+    )
+    with stage("history_write"):
+        await writer.submit(new_entry, session)
+    return str(new_entry.id)
 
-    cache_key = f"mcp:image:{current_user.id}:{prompt}"
-    cached = await redis.get(cache_key)
-    if cached:
-        cached_data = json.loads(cached)
+def image_url_of(response: dict) -> str:
+    image_url = response.get("result", {}).get("url")
+    if not image_url:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="MCP Image server returned invalid response")
+    return image_url
+
+async def fetch_image(client: MCPClient, singleflight: SingleFlight, digest: str, prompt: str):
+    with stage("mcp_call"):
+        response = await singleflight.do(
+            f"{TOOL}:{digest}",
+            lambda: client.call_tool(TOOL, {"prompt": prompt}),
+            timeout=client.timeout,
+        )
+    return image_url_of(response), response
+
+def image_refresher(cache: ResultCache, client: MCPClient, singleflight: SingleFlight, digest: str, prompt: str):
+    async def refresh():
+        set_caller(None, BACKGROUND)
+        image_url, response = await fetch_image(client, singleflight, digest, prompt)
+        await cache.set(TOOL, digest, {"image_url": image_url, "mcp_response": response})
+    return refresh
+
+async def saved_id_for_hit(cache: ResultCache, writer: HistoryWriter, session: Optional[AsyncSession], user_id, prompt: str, digest: str, cached: CacheEntry, saved_id: Optional[str]) -> str:
+    # shared hit: only record history the first time this user sees it
+    if saved_id is None:
+        saved_id = await save_image(writer, session, user_id, prompt, cached.value["image_url"], cached.value["mcp_response"])
+        with stage("cache_write"):
+            await cache.set_saved_id(TOOL, user_id, digest, saved_id)
+    return saved_id
+
+async def store_image(cache: ResultCache, writer: HistoryWriter, session: Optional[AsyncSession], user_id, prompt: str, digest: str, image_url: str, response: dict) -> str:
+    saved_id = await save_image(writer, session, user_id, prompt, image_url, response)
+    with stage("cache_write"):
+        await cache.set(TOOL, digest, {"image_url": image_url, "mcp_response": response})
+        await cache.set_saved_id(TOOL, user_id, digest, saved_id)
+    return saved_id
+
+async def resolve_image(
+    client: MCPClient,
+    singleflight: SingleFlight,
+    cache: ResultCache,
+    refresher: BackgroundRefresher,
+    writer: HistoryWriter,
+    session: Optional[AsyncSession],
+    user_id,
+    prompt: str,
+) -> dict:
+    digest = cache.digest(prompt)
+    with stage("cache_lookup"):
+        cached, saved_id = await cache.lookup(TOOL, user_id, digest)
+    if cached is not None:
+        if cached.stale:
+            refresher.schedule(f"{TOOL}:{digest}", image_refresher(cache, client, singleflight, digest, prompt))
+        saved_id = await saved_id_for_hit(cache, writer, session, user_id, prompt, digest, cached, saved_id)
         return {
             "cached": True,
-            "image_url": cached_data["image_url"],
-            "saved_id": cached_data.get("saved_id"),
+            "stale": cached.stale,
+            "image_url": cached.value["image_url"],
+            "saved_id": saved_id,
         }
 
-    client = MCPClient(
-        base_url=settings.FLUX_MCP_URL,
-        api_key=settings.FLUX_API_KEY
-    )
-
     try:
-        response = await client.call_tool("generateImageUrl", {"prompt": prompt})
-        image_url = response.get("result", {}).get("url")
-        if not image_url:
-            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="MCP Image server returned invalid response")
+        image_url, response = await fetch_image(client, singleflight, digest, prompt)
+    except (HTTPException, UpstreamUnavailable):
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"MCP server error: {str(e)}")
 
-    new_entry = models.ImageHistory(
-        user_id=current_user.id,
-        prompt=prompt,
-        image_url=image_url,
-        mcp_response=response,
-        mcp_server=settings.FLUX_MCP_URL,
-    )
-    session.add(new_entry)
-    await session.commit()
-    await session.refresh(new_entry)
-
-    await redis.set(
-        cache_key,
-        json.dumps({"image_url": image_url, "saved_id": str(new_entry.id)}),
-        ex=300,
-    )
+    saved_id = await store_image(cache, writer, session, user_id, prompt, digest, image_url, response)
 
     return {
         "cached": False,
         "image_url": image_url,
-        "saved_id": str(new_entry.id),
-    }
\ No newline at end of file
+        "saved_id": saved_id,
+    }
+
+@router.post("/", response_model=schemas.ImageGenerateResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(bind_mcp_caller)])
+async def generate_image(
+    payload: schemas.ImageGenerateRequest,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    current_user: Principal = Depends(get_current_user),
+    client: MCPClient = Depends(get_flux_client),
+    singleflight: SingleFlight = Depends(get_singleflight),
+    cache: ResultCache = Depends(get_result_cache),
+    refresher: BackgroundRefresher = Depends(get_refresher),
+    writer: HistoryWriter = Depends(get_history_writer),
+):
+    prompt = payload.prompt.strip()
+    if not prompt:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Prompt must not be empty")
+
+    if not wants_event_stream(request):
+        body = await resolve_image(client, singleflight, cache, refresher, writer, session, current_user.id, prompt)
+        return FastJSONResponse(body, status_code=status.HTTP_201_CREATED)
+
+    digest = cache.digest(prompt)
+
+    async def events():
+        with stage("cache_lookup"):
+            cached, saved_id = await cache.lookup(TOOL, current_user.id, digest)
+        yield format_sse("cache", {"hit": cached is not None, "stale": cached.stale if cached else False})
+        if cached is not None:
+            if cached.stale:
+                refresher.schedule(f"{TOOL}:{digest}", image_refresher(cache, client, singleflight, digest, prompt))
+            yield format_sse("result", {"image_url": cached.value["image_url"]})
+            yield format_sse("saved", {"saved_id": await saved_id_for_hit(cache, writer, session, current_user.id, prompt, digest, cached, saved_id)})
+            return
+        try:
+            response = None
+            async for event in stream_tool_call(singleflight, f"{TOOL}:{digest}", client, TOOL, {"prompt": prompt}):
+                if event.kind == "result":
+                    response = event.data
+                else:
+                    yield format_sse("progress" if event.kind == "progress" else "partial", event.data)
+            image_url = image_url_of(response)
+        except HTTPException as e:
+            yield format_sse("error", {"detail": e.detail})
+            return
+        except UpstreamUnavailable as e:
+            yield format_sse("error", {"detail": str(e), "retry_after": e.retry_after})
+            return
+        except Exception as e:
+            yield format_sse("error", {"detail": f"MCP server error: {str(e)}"})
+            return
+        yield format_sse("result", {"image_url": image_url})
+        yield format_sse("saved", {"saved_id": await store_image(cache, writer, session, current_user.id, prompt, digest, image_url, response)})
+
+    return StreamingResponse(events(), media_type=EVENT_STREAM, headers=SSE_HEADERS)
+
+
+def image_job_runner(state):
+    async def run(user_id: str, payload: dict) -> dict:
+        return await resolve_image(
+            state.mcp.get(FLUX),
+            state.singleflight,
+            state.result_cache,
+            state.refresher,
+            state.history_writer,
+            None,
+            uuid.UUID(user_id),
+            payload["prompt"],
+        )
+    return run
+
+def job_view(job: dict) -> dict:
+    result = job.get("result") or {}
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "image_url": result.get("image_url"),
+        "saved_id": result.get("saved_id"),
+        "cached": result.get("cached"),
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+    }
+
+@router.post("/jobs", response_model=schemas.ImageJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_image_job(
+    payload: schemas.ImageGenerateRequest,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    cache: ResultCache = Depends(get_result_cache),
+    jobs: JobQueue = Depends(get_image_jobs),
+):
+    prompt = payload.prompt.strip()
+    if not prompt:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Prompt must not be empty")
+    try:
+        job, created = await jobs.submit(current_user.id, {"prompt": prompt}, dedup=cache.digest(prompt))
+    except JobQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Image job queue is full",
+            headers={"Retry-After": str(math.ceil(settings.IMAGE_JOB_MAX_BACKOFF))},
+        )
+    response.headers["Location"] = f"{router.prefix}/jobs/{job['id']}"
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return job_view(job)
+
+@router.get("/jobs/{job_id}", response_model=schemas.ImageJobResponse)
+async def get_image_job(
+    job_id: str,
+    request: Request,
+    wait: float = Query(0, ge=0, le=settings.IMAGE_JOB_MAX_WAIT, description="Seconds to wait for the job to finish"),
+    current_user: Principal = Depends(get_current_user),
+    jobs: JobQueue = Depends(get_image_jobs),
+):
+    job = await jobs.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    if wants_event_stream(request):
+        async def events():
+            current = job
+            yield format_sse("status", job_view(current))
+            while current is not None and current["status"] not in TERMINAL:
+                previous = (current["status"], current["attempts"])
+                current = await jobs.wait(job_id, current_user.id, settings.IMAGE_JOB_MAX_WAIT)
+                if current is not None and (current["status"], current["attempts"]) != previous:
+                    yield format_sse("status", job_view(current))
+        return StreamingResponse(events(), media_type=EVENT_STREAM, headers=SSE_HEADERS)
+
+    if wait and job["status"] not in TERMINAL:
+        job = await jobs.wait(job_id, current_user.id, wait) or job
+    return job_view(job)
@@ -0,0 +1,49 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import get_current_user
+from app.cache.principal import Principal
+from app.core.config import settings
+from app.core.metrics import CONTENT_TYPE, REGISTRY
+from app.core.profiler import SamplingProfiler
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+def get_profiler(request: Request) -> SamplingProfiler:
+    return request.app.state.profiler
+
+def require_admin(current_user: Principal = Depends(get_current_user)) -> Principal:
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+@router.get("", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if settings.METRICS_TOKEN and not hmac.compare_digest((authorization or "").encode(), f"Bearer {settings.METRICS_TOKEN}".encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@router.get("/profiler", dependencies=[Depends(require_admin)])
+async def get_profile(profiler: SamplingProfiler = Depends(get_profiler)):
+    return profiler.snapshot()
+
+@router.post("/profiler", dependencies=[Depends(require_admin)])
+async def start_profiler(
+    interval: Optional[float] = Query(None, ge=0.001, le=1.0, description="Seconds between samples"),
+    profiler: SamplingProfiler = Depends(get_profiler),
+):
+    # started from a handler, so it samples the thread running the event loop
+    profiler.start(interval)
+    return profiler.snapshot()
+
+@router.delete("/profiler", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def stop_profiler(profiler: SamplingProfiler = Depends(get_profiler)):
+    # collapsed stacks, ready for flamegraph.pl or speedscope; stop() joins the
+    # sampler thread, which can take an interval, so it is not run on the loop
+    await run_in_threadpool(profiler.stop)
+    return PlainTextResponse(profiler.collapsed())
@@ -1,48 +1,246 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_session
 from app.mcp.client import MCPClient
 from app.core.config import settings
-from app.core.redis import get_redis
 from app import models, schemas
-from app.api.deps import get_current_user
-import json
+from app.api.deps import (
+    get_current_user,
+    bind_mcp_caller,
+    get_tavily_client,
+    get_singleflight,
+    get_result_cache,
+    get_refresher,
+    get_semantic_cache,
+    get_history_writer,
+)
+from app.cache.principal import Principal
+from app.cache.refresh import BackgroundRefresher
+from app.cache.result_cache import ResultCache, CacheEntry
+from app.cache.semantic import SemanticCache
+from typing import Dict, Optional
+import asyncio
+from app.core.fastjson import FastJSONResponse
+from app.core.metrics import record_cache, stage
+from app.core.singleflight import SingleFlight
+from app.core.sse import EVENT_STREAM, SSE_HEADERS, format_sse, wants_event_stream
+from app.mcp.admission import BACKGROUND, BATCH, set_caller
+from app.mcp.resilience import UpstreamUnavailable
+from app.mcp.streaming import stream_tool_call
+from app.db.history_writer import HistoryWriter
 
 router = APIRouter(prefix="/search", tags=["search"])
 
-@router.post("/", response_model=schemas.SearchResponse)
+TOOL = "tavily-search"
+
+def search_entry(user_id, query: str, response: dict) -> models.SearchHistory:
+    return models.SearchHistory(user_id=user_id, query=query, mcp_response=response, mcp_server=settings.TAVILY_MCP_URL)
+
+async def save_search(writer: HistoryWriter, session: AsyncSession, user_id, query: str, response: dict) -> str:
+    entry = search_entry(user_id, query, response)
+    with stage("history_write"):
+        await writer.submit(entry, session)
+    return str(entry.id)
+
+async def fetch_search(client: MCPClient, singleflight: SingleFlight, digest: str, query: str):
+    with stage("mcp_call"):
+        return await singleflight.do(
+            f"{TOOL}:{digest}",
+            lambda: client.call_tool(TOOL, {"query": query, "limit": 5}),
+            timeout=client.timeout,
+        )
+
+def search_refresher(cache: ResultCache, client: MCPClient, singleflight: SingleFlight, digest: str, query: str):
+    async def refresh():
+        set_caller(None, BACKGROUND)
+        await cache.set(TOOL, digest, await fetch_search(client, singleflight, digest, query))
+    return refresh
+
+@router.post("/", response_model=schemas.SearchResponse, dependencies=[Depends(bind_mcp_caller)])
 async def do_search(
     payload: schemas.SearchRequest,
+    request: Request,
     session: AsyncSession = Depends(get_session),
-    redis=Depends(get_redis),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
+    client: MCPClient = Depends(get_tavily_client),
+    singleflight: SingleFlight = Depends(get_singleflight),
+    cache: ResultCache = Depends(get_result_cache),
+    refresher: BackgroundRefresher = Depends(get_refresher),
+    semantic: Optional[SemanticCache] = Depends(get_semantic_cache),
+    writer: HistoryWriter = Depends(get_history_writer),
 ):
     query = payload.query.strip()
     if not query:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Query cannot be empty")
 
-    cache_key = f"mcp:search:{current_user.id}:{query}"
-    cached = await redis.get(cache_key)
-    if cached:
-        result = json.loads(cached)
-        return {"cached": True, "result": result}
+    digest = cache.digest(query)
+
+    async def serve(cached: CacheEntry, semantic_info: Optional[dict], saved_id: Optional[str]):
+        if cached.stale and semantic_info is None:
+            refresher.schedule(f"{TOOL}:{digest}", search_refresher(cache, client, singleflight, digest, query))
+        # shared hit: only record history the first time this user sees it
+        if saved_id is None:
+            saved_id = await save_search(writer, session, current_user.id, query, cached.value)
+            with stage("cache_write"):
+                await cache.set_saved_id(TOOL, current_user.id, digest, saved_id)
+        return {"cached": True, "stale": cached.stale, "result": cached.value, "saved_id": saved_id, "semantic": semantic_info}
+
+    async def lookup():
+        with stage("cache_lookup"):
+            cached, saved_id = await cache.lookup(TOOL, current_user.id, digest)
+            if cached is not None:
+                return cached, None, saved_id
+            semantic_info = None
+            if semantic is not None:
+                match = await semantic.lookup(query)
+                semantic_info = {"hit": False, "similarity": match.similarity if match else None}
+                if semantic.is_hit(match):
+                    near = await cache.get(TOOL, match.digest)
+                    if near is not None and not near.stale:
+                        record_cache("semantic", "index", "hit")
+                        return near, {"hit": True, "similarity": match.similarity, "matched_query": match.query}, saved_id
+                    if near is None:
+                        semantic.discard(match.digest)
+                record_cache("semantic", "index", "miss")
+            return None, semantic_info, saved_id
+
+    async def store(response: dict) -> str:
+        saved_id = await save_search(writer, session, current_user.id, query, response)
+        with stage("cache_write"):
+            await cache.set(TOOL, digest, response)
+            await cache.set_saved_id(TOOL, current_user.id, digest, saved_id)
+            if semantic is not None:
+                semantic.add(query, digest)
+        return saved_id
+
+    async def events():
+        cached, semantic_info, saved_id = await lookup()
+        yield format_sse("cache", {"hit": cached is not None, "stale": cached.stale if cached else False, "semantic": semantic_info})
+        if cached is not None:
+            body = await serve(cached, semantic_info, saved_id)
+            yield format_sse("result", {"result": body["result"]})
+            yield format_sse("saved", {"saved_id": body["saved_id"]})
+            return
+        response = None
+        try:
+            async for event in stream_tool_call(singleflight, f"{TOOL}:{digest}", client, TOOL, {"query": query, "limit": 5}):
+                if event.kind == "result":
+                    response = event.data
+                else:
+                    yield format_sse("progress" if event.kind == "progress" else "partial", event.data)
+        except UpstreamUnavailable as e:
+            yield format_sse("error", {"detail": str(e), "retry_after": e.retry_after})
+            return
+        except Exception as e:
+            yield format_sse("error", {"detail": f"MCP Server error: {str(e)}"})
+            return
+        yield format_sse("result", {"result": response})
+        yield format_sse("saved", {"saved_id": await store(response)})
+
+    if wants_event_stream(request):
+        return StreamingResponse(events(), media_type=EVENT_STREAM, headers=SSE_HEADERS)
 
-    client = MCPClient(
-        settings.TAVILY_MCP_URL,
-        api_key=settings.TAVILY_API_KEY,
-        profile=settings.TAVILY_PROFILE
-    )
+    # upstream payloads are opaque: encoded directly instead of being walked
+    # by response_model validation and jsonable_encoder
+    cached, semantic_info, saved_id = await lookup()
+    if cached is not None:
+        return FastJSONResponse(await serve(cached, semantic_info, saved_id))
 
     try:
-        response = await client.call_tool("tavily-search", {"query": query, "limit": 5})
+        response = await fetch_search(client, singleflight, digest, query)
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"MCP Server error: {str(e)}")
 
-    entry = models.SearchHistory(user_id=current_user.id, query=query, mcp_response=response, mcp_server=settings.TAVILY_MCP_URL)
-    session.add(entry)
-    await session.commit()
-    await session.refresh(entry)
+    saved_id = await store(response)
+    return FastJSONResponse({"cached": False, "result": response, "saved_id": saved_id, "semantic": semantic_info})
+
+@router.post("/batch", response_model=schemas.SearchBatchResponse, dependencies=[Depends(bind_mcp_caller)])
+async def do_search_batch(
+    payload: schemas.SearchBatchRequest,
+    session: AsyncSession = Depends(get_session),
+    current_user: Principal = Depends(get_current_user),
+    client: MCPClient = Depends(get_tavily_client),
+    singleflight: SingleFlight = Depends(get_singleflight),
+    cache: ResultCache = Depends(get_result_cache),
+    refresher: BackgroundRefresher = Depends(get_refresher),
+    writer: HistoryWriter = Depends(get_history_writer),
+):
+    if len(payload.queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.SEARCH_BATCH_MAX_QUERIES} queries per batch",
+        )
+
+    # batch fan-out yields to interactive searches in the upstream queue
+    set_caller(current_user.id, BATCH)
+    queries = [query.strip() for query in payload.queries]
+    # first spelling of each normalized query is the one sent upstream
+    query_for: Dict[str, str] = {}
+    for query in queries:
+        if query:
+            query_for.setdefault(cache.digest(query), query)
+    digests = list(query_for)
+
+    with stage("cache_lookup"):
+        hits = await cache.get_many(TOOL, digests)
+    for digest, entry in hits.items():
+        if entry.stale:
+            refresher.schedule(f"{TOOL}:{digest}", search_refresher(cache, client, singleflight, digest, query_for[digest]))
+
+    semaphore = asyncio.Semaphore(settings.SEARCH_BATCH_CONCURRENCY)
+
+    async def resolve(digest: str):
+        async with semaphore:
+            return await fetch_search(client, singleflight, digest, query_for[digest])
+
+    misses = [digest for digest in digests if digest not in hits]
+    outcomes = await asyncio.gather(*(resolve(digest) for digest in misses), return_exceptions=True)
+    fetched = {}
+    errors = {}
+    for digest, outcome in zip(misses, outcomes):
+        if isinstance(outcome, Exception):
+            errors[digest] = f"MCP Server error: {str(outcome)}"
+        else:
+            fetched[digest] = outcome
+    if fetched:
+        with stage("cache_write"):
+            await cache.set_many(TOOL, fetched)
+
+    with stage("cache_lookup"):
+        saved_ids = await cache.get_saved_ids(TOOL, current_user.id, list(hits))
+    new_entries = {}
+    for digest in [*hits, *fetched]:
+        if digest not in saved_ids:
+            response = fetched[digest] if digest in fetched else hits[digest].value
+            new_entries[digest] = search_entry(current_user.id, query_for[digest], response)
+    if new_entries:
+        # every history row of the batch in one multi-row INSERT
+        with stage("history_write"):
+            try:
+                await writer.write_many(list(new_entries.values()))
+            except Exception:
+                for entry in new_entries.values():
+                    await writer.submit(entry, session)
+        new_ids = {digest: str(entry.id) for digest, entry in new_entries.items()}
+        saved_ids.update(new_ids)
+        with stage("cache_write"):
+            await cache.set_saved_ids(TOOL, current_user.id, new_ids)
 
-    await redis.set(cache_key, json.dumps(response), ex=300)
+    results = []
+    for query in queries:
+        if not query:
+            results.append({"query": query, "error": "Query cannot be empty"})
+            continue
+        digest = cache.digest(query)
+        if digest in errors:
+            results.append({"query": query, "error": errors[digest]})
+        elif digest in fetched:
+            results.append({"query": query, "cached": False, "result": fetched[digest], "saved_id": saved_ids.get(digest)})
+        else:
+            entry = hits[digest]
+            results.append({"query": query, "cached": True, "stale": entry.stale, "result": entry.value, "saved_id": saved_ids.get(digest)})
 
-    return {"cached": False, "result": response, "saved_id": str(entry.id)}
\ No newline at end of file
+    return FastJSONResponse({"results": results})
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.api.deps import get_current_user, get_mcp_registry
+from app.cache.principal import Principal
+from app.mcp.registry import MCPClientRegistry
+
+router = APIRouter(prefix="/upstreams", tags=["upstreams"])
+
+@router.get("/")
+async def get_upstream_stats(
+    current_user: Principal = Depends(get_current_user),
+    registry: MCPClientRegistry = Depends(get_mcp_registry),
+):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    # breaker state, latency histograms and hedging counters per MCP upstream
+    return registry.stats()
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import httpx
+from redis.exceptions import RedisError
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.cache.local import LocalTTLCache
+from app.core.metrics import family, sample
+
+try:
+    from PIL import Image
+except ImportError:  # optional: without Pillow only full-size assets are stored
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp", "image/gif": ".gif"}
+MEDIA_TYPES = {ext: media_type for media_type, ext in EXTENSIONS.items()}
+
+# sha256 of the image bytes plus its extension, e.g. "3fa9...e1.png"
+ASSET_KEY = re.compile(r"^[0-9a-f]{64}\.(png|jpg|webp|gif)$")
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+def sniff_extension(data: bytes, content_type: str) -> Optional[str]:
+    ext = EXTENSIONS.get(content_type.split(";")[0].strip().lower())
+    if ext:
+        return ext
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if data.startswith(b"GIF8"):
+        return ".gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def asset_path(root: str, key: str) -> str:
+    return os.path.join(root, "full", key[:2], key)
+
+
+def thumbnail_path(root: str, key: str) -> str:
+    return os.path.join(root, "thumbnails", key[:2], f"{key.split('.')[0]}.jpg")
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# Runs in the thumbnail pool: disk writes and Pillow decoding stay off the event loop.
+def store_files(root: str, key: str, data: bytes, thumbnail_size: int) -> bool:
+    path = asset_path(root, key)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    thumb = thumbnail_path(root, key)
+    if Image is None or os.path.exists(thumb):
+        return os.path.exists(thumb)
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((thumbnail_size, thumbnail_size))
+            out = io.BytesIO()
+            image.convert("RGB").save(out, "JPEG", quality=80, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # undecodable image: keep the full asset, /thumbnails falls back to it
+        logger.warning("could not build a thumbnail for %s", key, exc_info=True)
+        return False
+    _write_atomic(thumb, out.getvalue())
+    return True
+
+
+# Downloads each generated image once into a content-addressed directory and
+# records the asset key on the image_history rows that reference it. Fed by
+# the history writer, so rows are always committed before they are updated.
+class ImageAssetStore:
+    def __init__(
+        self,
+        root: str,
+        engine: AsyncEngine,
+        table,
+        http: httpx.AsyncClient,
+        redis=None,
+        max_bytes: int = 20 * 1024 * 1024,
+        thumbnail_size: int = 256,
+        workers: int = 2,
+        max_concurrency: int = 4,
+        max_pending: int = 1000,
+        prefix: str = "assets",
+        listeners: Optional[List[Callable[[str, List[Dict[str, Any]]], None]]] = None,
+    ):
+        self.root = root
+        self.engine = engine
+        # models.ImageHistory.__table__
+        self.table = table
+        self.http = http
+        self.redis = redis
+        self.max_bytes = max_bytes
+        self.thumbnail_size = thumbnail_size
+        self.max_pending = max_pending
+        self.prefix = prefix
+        # called with (table name, updated rows) once asset keys are attached
+        self.listeners = listeners or []
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._known = LocalTTLCache(maxsize=10000, ttl=3600)
+        self._pending: Dict[str, List[Any]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.stored = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def collect_metrics(self) -> List[str]:
+        lines = family("image_assets_pending", "gauge", "Image URLs waiting to be downloaded.")
+        lines.append(sample("image_assets_pending", {}, len(self._pending)))
+        for name, help, value in (
+            ("image_assets_stored_total", "Image assets downloaded and stored.", self.stored),
+            ("image_assets_failed_total", "Image asset downloads that failed.", self.failed),
+            ("image_assets_dropped_total", "Image asset downloads dropped because too many were pending.", self.dropped),
+        ):
+            lines += family(name, "counter", help) + [sample(name, {}, value)]
+        return lines
+
+    def _url_key(self, url: str) -> str:
+        return f"{self.prefix}:url:{hashlib.sha256(url.encode('utf-8')).hexdigest()}"
+
+    # history writer listener
+    def on_rows(self, table_name: str, rows: Iterable[Dict[str, Any]]):
+        if table_name != self.table.name:
+            return
+        for row in rows:
+            url = row.get("image_url")
+            if not url or row.get("asset_key"):
+                continue
+            owner = (row["id"], row.get("user_id"))
+            pending = self._pending.get(url)
+            if pending is not None:
+                pending.append(owner)
+                continue
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                continue
+            self._pending[url] = [owner]
+            task = asyncio.ensure_future(self._fetch(url))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, url: str):
+        key = None
+        try:
+            async with self._semaphore:
+                key = await self._lookup(url) or await self._download(url)
+        except Exception:
+            self.failed += 1
+            logger.warning("could not store image asset for %s", url, exc_info=True)
+        # rows that arrive from here on schedule a new (cheap, already known) fetch
+        owners = self._pending.pop(url, [])
+        if key and owners:
+            ids = [row_id for row_id, _ in owners]
+            try:
+                async with self.engine.begin() as conn:
+                    await conn.execute(update(self.table).where(self.table.c.id.in_(ids)).values(asset_key=key))
+            except Exception:
+                logger.exception("could not attach asset %s to %d image rows", key, len(ids))
+                return
+            rows = [{"id": row_id, "user_id": user_id, "asset_key": key} for row_id, user_id in owners]
+            for listener in self.listeners:
+                try:
+                    listener(self.table.name, rows)
+                except Exception:
+                    logger.exception("asset listener failed for %s", self.table.name)
+
+    async def _lookup(self, url: str) -> Optional[str]:
+        key = self._known.get(url)
+        if key is not None or self.redis is None:
+            return key
+        try:
+            key = await self.redis.get(self._url_key(url))
+        except RedisError:
+            return None
+        if key is not None and os.path.exists(asset_path(self.root, key)):
+            self._known.set(url, key)
+            return key
+        return None
+
+    async def _download(self, url: str) -> str:
+        data = bytearray()
+        async with self.http.stream("GET", url) as resp:
+            resp.raise_for_status()
+            content_type = resp.headers.get("content-type", "")
+            async for chunk in resp.aiter_bytes():
+                data += chunk
+                if len(data) > self.max_bytes:
+                    raise ImageTooLarge(f"image at {url} exceeds {self.max_bytes} bytes")
+        ext = sniff_extension(bytes(data[:16]), content_type)
+        if ext is None:
+            raise ValueError(f"unsupported image type {content_type!r} at {url}")
+        key = f"{hashlib.sha256(data).hexdigest()}{ext}"
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, store_files, self.root, key, bytes(data), self.thumbnail_size)
+        self.stored += 1
+        self._known.set(url, key)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self._url_key(url), key, ex=30 * 24 * 3600)
+            except RedisError:
+                pass
+        return key
+
+    async def close(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+        await self.http.aclose()
@@ -0,0 +1,65 @@
+import os
+import re
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+# content-addressed files never change under the same URL
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # single range only; anything else is answered with the full file
+    match = _RANGE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        return (max(size - length, 0), size - 1) if length else (size, size)
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+async def _file_slice(path: str, start: int, length: int):
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        while length > 0:
+            chunk = await f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+# Strong ETag (the content hash), conditional GET and single byte ranges.
+# Full responses go through FileResponse, which streams from disk without
+# buffering the file.
+def asset_response(request: Request, path: str, etag: str, media_type: str) -> Response:
+    etag = f'"{etag}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE, "Accept-Ranges": "bytes"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        size = os.path.getsize(path)
+        byte_range = parse_range(range_header, size)
+        if byte_range is not None:
+            start, end = byte_range
+            if start >= size or start > end:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            length = end - start + 1
+            headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(length)})
+            return StreamingResponse(_file_slice(path, start, length), status_code=206, media_type=media_type, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers)
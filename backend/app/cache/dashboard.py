@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from redis.exceptions import RedisError
+
+from app.cache.local import LocalTTLCache
+from app.core import fastjson
+from app.core.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPage(NamedTuple):
+    etag: str
+    body: bytes
+
+
+def make_etag(body: bytes) -> str:
+    # strong: derived from the exact bytes sent
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# Rendered GET /dashboard/ pages keyed by user, filter set and the user's
+# history version. Inserts, deletes and asset attachments bump the version in
+# Redis, so pages for an older version are never read again and just expire.
+# mark_write (the read router's) runs before the bump: a poll that sees the new
+# version must already be pinned to the primary, or it would re-render the
+# page from a replica that lacks the new rows and cache it under that version.
+class DashboardCache:
+    def __init__(
+        self,
+        redis,
+        local: Optional[LocalTTLCache] = None,
+        ttl: int = 300,
+        prefix: str = "dashboard",
+        mark_write: Optional[Callable[..., Awaitable[None]]] = None,
+    ):
+        self.redis = redis
+        self.local = local if local is not None else LocalTTLCache(maxsize=0)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.mark_write = mark_write
+        self._pending: Set[asyncio.Task] = set()
+
+    def _version_key(self, user_id) -> str:
+        return f"{self.prefix}:version:{user_id}"
+
+    def _page_key(self, user_id, version: str, filters: str) -> str:
+        return f"{self.prefix}:page:{user_id}:{version}:{filters}"
+
+    @staticmethod
+    def filters_key(params: Dict[str, Any]) -> str:
+        canonical = fastjson.dumps({key: params[key] for key in sorted(params)})
+        return hashlib.sha256(canonical).hexdigest()[:32]
+
+    async def version(self, user_id) -> Optional[str]:
+        # None when Redis is unreachable: the caller renders without the cache
+        try:
+            version = await self.redis.get(self._version_key(user_id))
+        except RedisError:
+            return None
+        return str(version) if version is not None else "0"
+
+    async def etag(self, user_id, version: str, filters: str) -> Optional[str]:
+        # a conditional request only needs the validator, not the body
+        key = self._page_key(user_id, version, filters)
+        page = self.local.get(key)
+        if page is not None:
+            return page.etag
+        try:
+            return await self.redis.hget(key, "etag")
+        except RedisError:
+            return None
+
+    async def get(self, user_id, version: str, filters: str) -> Optional[CachedPage]:
+        key = self._page_key(user_id, version, filters)
+        page = self.local.get(key)
+        record_cache("dashboard", "local", "miss" if page is None else "hit")
+        if page is not None:
+            return page
+        try:
+            stored = await self.redis.hgetall(key)
+        except RedisError:
+            return None
+        record_cache("dashboard", "redis", "hit" if stored else "miss")
+        if not stored:
+            return None
+        body = stored["body"]
+        page = CachedPage(stored["etag"], body.encode("utf-8") if isinstance(body, str) else body)
+        self.local.set(key, page)
+        return page
+
+    async def put(self, user_id, version: str, filters: str, body: bytes) -> CachedPage:
+        page = CachedPage(make_etag(body), body)
+        key = self._page_key(user_id, version, filters)
+        self.local.set(key, page)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(key, mapping={"etag": page.etag, "body": body})
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+        except RedisError:
+            pass
+        return page
+
+    async def bump(self, *user_ids):
+        if not user_ids:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.incr(self._version_key(user_id))
+            await pipe.execute()
+        except RedisError:
+            logger.warning("could not bump dashboard versions for %d users", len(user_ids), exc_info=True)
+
+    async def _invalidate(self, user_ids: List[str]):
+        if self.mark_write is not None:
+            await self.mark_write(*user_ids)
+        await self.bump(*user_ids)
+
+    # history writer and image asset listener
+    def on_rows(self, table_name: str, rows: Iterable[Dict[str, Any]]):
+        user_ids: List[str] = sorted({str(row["user_id"]) for row in rows if row.get("user_id") is not None})
+        if user_ids:
+            task = asyncio.ensure_future(self._invalidate(user_ids))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def close(self):
+        # let in-flight bumps land so no worker keeps serving a stale version
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
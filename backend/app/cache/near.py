@@ -0,0 +1,207 @@
+import asyncio
+import itertools
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from redis.exceptions import RedisError
+
+from app.cache.local import LocalTTLCache
+from app.core.metrics import family, record_cache, sample
+from app.core.redis import INVALIDATE_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# commands whose first argument is a key they modify (delete/unlink take several)
+WRITE_COMMANDS = frozenset({
+    "set", "setex", "psetex", "getset", "getdel", "append", "incr", "incrby", "decr", "decrby",
+    "hset", "hdel", "hincrby", "expire", "pexpire", "persist", "delete", "unlink",
+})
+
+
+# Process-local copy of hot string keys in front of the shared Redis client,
+# kept coherent by server-assisted client-side caching. A dedicated tracker
+# connection turns on CLIENT TRACKING in BCAST mode for the cached prefixes,
+# redirected to itself, and subscribes to the invalidation channel, so a write
+# to a tracked key from any worker evicts it here. Reads bypass the local copy
+# until tracking is up and after it drops. Everything other than GET/MGET is
+# passed straight through to the wrapped client.
+class NearCache:
+    def __init__(
+        self,
+        redis,
+        tracker,
+        prefixes: Sequence[str],
+        maxsize: int = 10000,
+        ttl: float = 60.0,
+        reconnect_delay: float = 1.0,
+    ):
+        self.redis = redis
+        self.tracker = tracker
+        self.prefixes = tuple(prefixes)
+        self.reconnect_delay = reconnect_delay
+        self.tracking = False
+        self.invalidations = 0
+        self._local = LocalTTLCache(maxsize, ttl)
+        # reads in flight: an invalidation arriving before the reply cancels the store
+        self._inflight: Dict[str, int] = {}
+        self._tokens = itertools.count(1)
+        self._listener: Optional[asyncio.Task] = None
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.redis, name)
+        if name not in WRITE_COMMANDS:
+            return attr
+
+        async def write(*args, **kwargs):
+            # our own writes are evicted right away instead of when the message arrives
+            keys = args if name in ("delete", "unlink") else args[:1]
+            try:
+                return await attr(*args, **kwargs)
+            finally:
+                self.invalidate(*keys)
+        return write
+
+    def pipeline(self, transaction: bool = True) -> "NearCachePipeline":
+        return NearCachePipeline(self, self.redis.pipeline(transaction=transaction))
+
+    def _tracked(self, key: str) -> bool:
+        return self.tracking and key.startswith(self.prefixes)
+
+    def invalidate(self, *keys: str):
+        for key in keys:
+            self._local.pop(key)
+            self._inflight.pop(key, None)
+
+    def _begin(self, key: str) -> int:
+        token = next(self._tokens)
+        self._inflight[key] = token
+        return token
+
+    def _store(self, key: str, token: int, value: Optional[str]):
+        if self._inflight.get(key) == token:
+            del self._inflight[key]
+            if self.tracking:
+                # misses are cached too: creating the key sends an invalidation
+                self._local.set(key, value)
+
+    async def get(self, name: str) -> Optional[str]:
+        if not self._tracked(name):
+            return await self.redis.get(name)
+        value = self._local.get(name, _MISSING)
+        record_cache("near", "local", "miss" if value is _MISSING else "hit")
+        if value is not _MISSING:
+            return value
+        token = self._begin(name)
+        value = await self.redis.get(name)
+        self._store(name, token, value)
+        return value
+
+    async def mget(self, keys, *args) -> List[Optional[str]]:
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        keys += list(args)
+        values: List[Any] = [_MISSING] * len(keys)
+        for i, key in enumerate(keys):
+            if self._tracked(key):
+                values[i] = self._local.get(key, _MISSING)
+                record_cache("near", "local", "miss" if values[i] is _MISSING else "hit")
+        remote = [i for i, value in enumerate(values) if value is _MISSING]
+        if remote:
+            # whatever the local copy lacks still comes back in a single MGET
+            tokens = {keys[i]: self._begin(keys[i]) for i in remote if self._tracked(keys[i])}
+            fetched = await self.redis.mget([keys[i] for i in remote])
+            for i, value in zip(remote, fetched):
+                values[i] = value
+                if keys[i] in tokens:
+                    self._store(keys[i], tokens[keys[i]], value)
+        return values
+
+    def _on_message(self, message: dict):
+        if message.get("type") != "message":
+            return
+        keys = message.get("data")
+        self.invalidations += 1
+        if keys is None:
+            # FLUSHALL/FLUSHDB
+            self._local.clear()
+            self._inflight.clear()
+        else:
+            self.invalidate(*([keys] if isinstance(keys, str) else keys))
+
+    def start(self):
+        if self._listener is None:
+            self._listener = asyncio.ensure_future(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                client_id = await self.tracker.client_id()
+                await self.tracker.client_tracking_on(clientid=client_id, prefix=list(self.prefixes), bcast=True)
+                pubsub = self.tracker.pubsub()
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                try:
+                    # nothing cached before tracking was on can be trusted
+                    self._local.clear()
+                    self._inflight.clear()
+                    self.tracking = True
+                    async for message in pubsub.listen():
+                        self._on_message(message)
+                finally:
+                    self.tracking = False
+                    await pubsub.close()
+            except asyncio.CancelledError:
+                raise
+            except RedisError:
+                self._local.clear()
+                logger.warning("near-cache tracking connection lost, reading through to Redis", exc_info=True)
+                await asyncio.sleep(self.reconnect_delay)
+
+    def collect_metrics(self) -> List[str]:
+        lines = family("near_cache_tracking", "gauge", "1 while the near-cache receives invalidations.")
+        lines.append(sample("near_cache_tracking", {}, int(self.tracking)))
+        lines += family("near_cache_entries", "gauge", "Keys held in the near-cache.")
+        lines.append(sample("near_cache_entries", {}, len(self._local)))
+        lines += family("near_cache_invalidations_total", "counter", "Invalidation messages received.")
+        lines.append(sample("near_cache_invalidations_total", {}, self.invalidations))
+        return lines
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self.tracker is not self.redis:
+            await self.tracker.close()
+        await self.redis.close()
+
+
+class NearCachePipeline:
+    def __init__(self, near: NearCache, pipe):
+        self.near = near
+        self.pipe = pipe
+        self._written: List[str] = []
+
+    def __getattr__(self, name: str):
+        command = getattr(self.pipe, name)
+        if name not in WRITE_COMMANDS:
+            return command
+
+        def queue(*args, **kwargs):
+            self._written.extend(args if name in ("delete", "unlink") else args[:1])
+            command(*args, **kwargs)
+            return self
+        return queue
+
+    async def execute(self, *args, **kwargs):
+        written, self._written = self._written, []
+        try:
+            return await self.pipe.execute(*args, **kwargs)
+        finally:
+            self.near.invalidate(*written)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.pipe.__aexit__(*exc)
@@ -0,0 +1,29 @@
+import hashlib
+import re
+import unicodedata
+from app.core.config import settings
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(
+    text: str,
+    casefold: bool | None = None,
+    whitespace: bool | None = None,
+    nfkc: bool | None = None,
+) -> str:
+    casefold = settings.CACHE_NORMALIZE_CASE if casefold is None else casefold
+    whitespace = settings.CACHE_NORMALIZE_WHITESPACE if whitespace is None else whitespace
+    nfkc = settings.CACHE_NORMALIZE_NFKC if nfkc is None else nfkc
+
+    if nfkc:
+        text = unicodedata.normalize("NFKC", text)
+    if whitespace:
+        text = _WHITESPACE.sub(" ", text).strip()
+    if casefold:
+        text = text.casefold()
+    return text
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from app.cache.local import LocalTTLCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "auth:principal:invalidate"
+
+
+# The subset of a users row every authenticated request needs.
+@dataclass(frozen=True)
+class Principal:
+    id: uuid.UUID
+    email: str
+    is_active: bool
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(id=user.id, email=user.email, is_active=user.is_active, is_admin=user.is_admin)
+
+
+# Two in-process maps: token -> user id (skips JWT decode, never outlives the
+# token's exp) and user id -> Principal (skips the users lookup). Changes to a
+# user are broadcast over Redis pub/sub so every worker drops its copy.
+class PrincipalCache:
+    def __init__(self, redis=None, ttl: float = 60.0, maxsize: int = 10000, channel: str = INVALIDATION_CHANNEL):
+        self.redis = redis
+        self.channel = channel
+        self._tokens = LocalTTLCache(maxsize, ttl)
+        self._principals = LocalTTLCache(maxsize, ttl)
+        self._listener: Optional[asyncio.Task] = None
+
+    def user_id_for(self, token: str) -> Optional[str]:
+        return self._tokens.get(token)
+
+    def remember_token(self, token: str, user_id: str, expires_at: Optional[float] = None):
+        ttl = None
+        if expires_at is not None:
+            ttl = expires_at - time.time()
+            if ttl <= 0:
+                return
+        self._tokens.set(token, user_id, ttl)
+
+    def get(self, user_id: str) -> Optional[Principal]:
+        return self._principals.get(str(user_id))
+
+    def put(self, principal: Principal):
+        self._principals.set(str(principal.id), principal)
+
+    def invalidate_local(self, user_id):
+        self._principals.pop(str(user_id))
+
+    async def invalidate(self, user_id):
+        self.invalidate_local(user_id)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.publish(self.channel, str(user_id))
+        except RedisError:
+            logger.warning("could not broadcast principal invalidation for %s", user_id, exc_info=True)
+
+    def start(self):
+        if self.redis is not None and self._listener is None:
+            self._listener = asyncio.ensure_future(self._listen())
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                try:
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self.invalidate_local(message["data"])
+                finally:
+                    await pubsub.close()
+            except asyncio.CancelledError:
+                raise
+            except RedisError:
+                # missed invalidations are bounded by the ttl; drop everything to be safe
+                self._principals.clear()
+                logger.warning("principal invalidation listener lost its connection", exc_info=True)
+                await asyncio.sleep(1.0)
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
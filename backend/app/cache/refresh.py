@@ -0,0 +1,39 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+# Bounded pool for stale-while-revalidate refreshes. A key is refreshed at
+# most once at a time and new work is dropped once max_pending is reached,
+# so a burst of stale hits cannot pile up background upstream calls.
+class BackgroundRefresher:
+    def __init__(self, max_concurrency: int = 4, max_pending: int = 100):
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def schedule(self, key: str, fn: Callable[[], Awaitable[None]]) -> bool:
+        if key in self._tasks or len(self._tasks) >= self.max_pending:
+            return False
+        task = asyncio.ensure_future(self._run(key, fn))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return True
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[None]]):
+        async with self._semaphore:
+            try:
+                await fn()
+            except Exception:
+                logger.warning("background refresh of %s failed", key, exc_info=True)
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
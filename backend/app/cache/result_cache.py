@@ -0,0 +1,185 @@
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from app.cache.local import LocalTTLCache
+from app.cache.normalize import content_digest
+from app.core import fastjson
+from app.core.metrics import record_cache
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    # served as-is for fresh_ttl seconds, then served stale while a refresh runs
+    fresh_ttl: int
+    stale_ttl: int = 0
+
+    @property
+    def ttl(self) -> int:
+        return self.fresh_ttl + self.stale_ttl
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    stale: bool
+
+
+DEFAULT_POLICY = CachePolicy(fresh_ttl=300)
+
+
+# Upstream results are shared by every user and keyed by a hash of the
+# normalized query; which history row a user got for that query is kept
+# under a separate per-user key.
+class ResultCache:
+    def __init__(
+        self,
+        redis,
+        local: Optional[LocalTTLCache] = None,
+        policies: Optional[Dict[str, CachePolicy]] = None,
+        prefix: str = "mcp",
+    ):
+        self.redis = redis
+        self.local = local if local is not None else LocalTTLCache(maxsize=0)
+        self.policies = policies or {}
+        self.prefix = prefix
+
+    def policy(self, tool: str) -> CachePolicy:
+        return self.policies.get(tool, DEFAULT_POLICY)
+
+    def digest(self, text: str) -> str:
+        return content_digest(text)
+
+    def _result_key(self, tool: str, digest: str) -> str:
+        return f"{self.prefix}:result:{tool}:{digest}"
+
+    def _history_key(self, tool: str, user_id, digest: str) -> str:
+        return f"{self.prefix}:history:{tool}:{user_id}:{digest}"
+
+    def _entry(self, tool: str, envelope: dict) -> Optional[CacheEntry]:
+        age = time.time() - envelope["t"]
+        policy = self.policy(tool)
+        if age >= policy.ttl:
+            return None
+        return CacheEntry(envelope["v"], stale=age >= policy.fresh_ttl)
+
+    def _counted(self, tool: str, tier: str, envelope: dict) -> Optional[CacheEntry]:
+        entry = self._entry(tool, envelope)
+        record_cache(tool, tier, "miss" if entry is None else "stale" if entry.stale else "hit")
+        return entry
+
+    async def get(self, tool: str, digest: str) -> Optional[CacheEntry]:
+        key = self._result_key(tool, digest)
+        envelope = self.local.get(key)
+        if envelope is not None:
+            return self._counted(tool, "local", envelope)
+        record_cache(tool, "local", "miss")
+        try:
+            raw = await self.redis.get(key)
+        except RedisError:
+            record_cache(tool, "redis", "error")
+            return None
+        if raw is None:
+            record_cache(tool, "redis", "miss")
+            return None
+        envelope = fastjson.loads(raw)
+        self.local.set(key, envelope)
+        return self._counted(tool, "redis", envelope)
+
+    async def lookup(self, tool: str, user_id, digest: str) -> Tuple[Optional[CacheEntry], Optional[str]]:
+        # a handler's hit path needs the shared result and this user's history
+        # id: both come back in one MGET instead of two round-trips
+        key = self._result_key(tool, digest)
+        envelope = self.local.get(key)
+        if envelope is not None:
+            return self._counted(tool, "local", envelope), await self.get_saved_id(tool, user_id, digest)
+        record_cache(tool, "local", "miss")
+        try:
+            raw, saved_id = await self.redis.mget([key, self._history_key(tool, user_id, digest)])
+        except RedisError:
+            record_cache(tool, "redis", "error")
+            return None, None
+        if raw is None:
+            record_cache(tool, "redis", "miss")
+            return None, saved_id
+        envelope = fastjson.loads(raw)
+        self.local.set(key, envelope)
+        return self._counted(tool, "redis", envelope), saved_id
+
+    async def get_many(self, tool: str, digests: List[str]) -> Dict[str, CacheEntry]:
+        envelopes: Dict[str, dict] = {}
+        tiers: Dict[str, str] = {}
+        remote: List[str] = []
+        for digest in digests:
+            envelope = self.local.get(self._result_key(tool, digest))
+            if envelope is None:
+                record_cache(tool, "local", "miss")
+                remote.append(digest)
+            else:
+                envelopes[digest] = envelope
+                tiers[digest] = "local"
+
+        if remote:
+            # everything the local tier missed comes back in a single MGET
+            keys = [self._result_key(tool, digest) for digest in remote]
+            try:
+                raws = await self.redis.mget(keys)
+            except RedisError:
+                raws = [None] * len(keys)
+            for digest, key, raw in zip(remote, keys, raws):
+                if raw is not None:
+                    envelopes[digest] = fastjson.loads(raw)
+                    tiers[digest] = "redis"
+                    self.local.set(key, envelopes[digest])
+                else:
+                    record_cache(tool, "redis", "miss")
+
+        entries = {}
+        for digest, envelope in envelopes.items():
+            entry = self._counted(tool, tiers[digest], envelope)
+            if entry is not None:
+                entries[digest] = entry
+        return entries
+
+    async def set(self, tool: str, digest: str, value: Any):
+        await self.set_many(tool, {digest: value})
+
+    async def set_many(self, tool: str, values: Dict[str, Any]):
+        ttl = self.policy(tool).ttl
+        now = time.time()
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for digest, value in values.items():
+                key = self._result_key(tool, digest)
+                envelope = {"v": value, "t": now}
+                self.local.set(key, envelope, ttl)
+                pipe.set(key, fastjson.dumps(envelope), ex=ttl)
+            await pipe.execute()
+        except RedisError:
+            pass
+
+    async def get_saved_id(self, tool: str, user_id, digest: str) -> Optional[str]:
+        return (await self.get_saved_ids(tool, user_id, [digest])).get(digest)
+
+    async def get_saved_ids(self, tool: str, user_id, digests: List[str]) -> Dict[str, str]:
+        if not digests:
+            return {}
+        try:
+            values = await self.redis.mget([self._history_key(tool, user_id, digest) for digest in digests])
+        except RedisError:
+            return {}
+        return {digest: value for digest, value in zip(digests, values) if value is not None}
+
+    async def set_saved_id(self, tool: str, user_id, digest: str, saved_id: str):
+        await self.set_saved_ids(tool, user_id, {digest: saved_id})
+
+    async def set_saved_ids(self, tool: str, user_id, saved_ids: Dict[str, str]):
+        ttl = self.policy(tool).ttl
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for digest, saved_id in saved_ids.items():
+                pipe.set(self._history_key(tool, user_id, digest), saved_id, ex=ttl)
+            await pipe.execute()
+        except RedisError:
+            pass
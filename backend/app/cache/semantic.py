@@ -0,0 +1,157 @@
+import asyncio
+import os
+import re
+import zlib
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from app.cache.normalize import normalize_query
+
+_WORD = re.compile(r"\w+")
+
+INDEX_FORMAT_VERSION = 1
+
+
+# Bag of words plus character n-grams hashed into a fixed-size signed vector.
+# Deterministic across processes (crc32, not hash()) so persisted indexes stay valid.
+class HashedNgramEmbedder:
+    def __init__(self, dim: int = 512, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for word in _WORD.findall(normalize_query(text, casefold=True, whitespace=True, nfkc=True)):
+            features.append(f"w:{word}")
+            padded = f"<{word}>"
+            for i in range(max(len(padded) - self.ngram + 1, 1)):
+                features.append(f"g:{padded[i:i + self.ngram]}")
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vec[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec
+
+
+class SemanticMatch(NamedTuple):
+    digest: str
+    query: str
+    similarity: float
+
+
+# Fixed-capacity in-memory cosine index; once full, the oldest rows are overwritten.
+class VectorIndex:
+    def __init__(self, dim: int, capacity: int = 20000):
+        self.dim = dim
+        self.capacity = capacity
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._digests: List[Optional[str]] = [None] * capacity
+        self._queries: List[Optional[str]] = [None] * capacity
+        self._rows: Dict[str, int] = {}
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, digest: str, query: str, vector: np.ndarray):
+        if digest in self._rows:
+            return
+        row = self._next
+        evicted = self._digests[row]
+        if evicted is not None:
+            self._rows.pop(evicted, None)
+        self._vectors[row] = vector
+        self._digests[row] = digest
+        self._queries[row] = query
+        self._rows[digest] = row
+        self._next = (row + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def discard(self, digest: str):
+        row = self._rows.pop(digest, None)
+        if row is not None:
+            self._vectors[row] = 0.0
+            self._digests[row] = None
+            self._queries[row] = None
+
+    def scan(self, vector: np.ndarray) -> Optional[int]:
+        # read-only, so it can run off the event loop while rows change
+        size = self._size
+        if not size:
+            return None
+        return int(np.argmax(self._vectors[:size] @ vector))
+
+    def match_row(self, row: int, vector: np.ndarray) -> Optional[SemanticMatch]:
+        digest = self._digests[row]
+        if digest is None:
+            return None
+        return SemanticMatch(digest, self._queries[row], float(self._vectors[row] @ vector))
+
+    def nearest(self, vector: np.ndarray) -> Optional[SemanticMatch]:
+        if not self._rows:
+            return None
+        row = self.scan(vector)
+        return self.match_row(row, vector) if row is not None else None
+
+    def save(self, path: str):
+        rows = sorted(self._rows.values())
+        # every worker saves on shutdown: each writes its own temp file and the last rename wins
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    version=np.array(INDEX_FORMAT_VERSION),
+                    vectors=self._vectors[rows],
+                    digests=np.array([self._digests[r] for r in rows], dtype=str),
+                    queries=np.array([self._queries[r] for r in rows], dtype=str),
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def load(self, path: str) -> int:
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != INDEX_FORMAT_VERSION or data["vectors"].shape[1:] != (self.dim,):
+                return 0
+            for vector, digest, query in zip(data["vectors"], data["digests"], data["queries"]):
+                self.add(str(digest), str(query), vector)
+        return len(self)
+
+
+class SemanticCache:
+    def __init__(self, embedder: HashedNgramEmbedder, index: VectorIndex, threshold: float = 0.85):
+        self.embedder = embedder
+        self.index = index
+        self.threshold = threshold
+
+    def _scan(self, query: str):
+        vector = self.embedder.embed(query)
+        return vector, self.index.scan(vector)
+
+    async def lookup(self, query: str) -> Optional[SemanticMatch]:
+        if not len(self.index):
+            return None
+        # the matmul over every row releases the GIL; on the loop it would stall other requests
+        vector, row = await asyncio.get_running_loop().run_in_executor(None, self._scan, query)
+        # the row may have been overwritten meanwhile: read and rescore it as it is now
+        return self.index.match_row(row, vector) if row is not None else None
+
+    def is_hit(self, match: Optional[SemanticMatch]) -> bool:
+        return match is not None and match.similarity >= self.threshold
+
+    def add(self, query: str, digest: str):
+        self.index.add(digest, query, self.embedder.embed(query))
+
+    def discard(self, digest: str):
+        self.index.discard(digest)
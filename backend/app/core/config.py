@@ -1,18 +1,178 @@
 from pydantic import BaseSettings, AnyUrl
-from typing import Optional
+from typing import List, Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "//darshil:1234@localhost:5432/ai_content_explorer"
+    # read replica for dashboard, export and auth lookups; unset reads go to DATABASE_URL
+    DATABASE_REPLICA_URL: Optional[str] = None
     SECRET_KEY: str = "YOUR_SECRET_KEY_CHANGE_ME"  
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7
     REFRESH_TOKEN_EXPIRE_DAYS: int = 30
     ALGORITHM: str = "HS256"
     TAVILY_MCP_URL: Optional[AnyUrl]
+    TAVILY_API_KEY: Optional[str] = None
+    TAVILY_PROFILE: Optional[str] = None
+    TAVILY_TIMEOUT: float = 30
     FLUX_MCP_URL: Optional[AnyUrl]
+    FLUX_API_KEY: Optional[str] = None
+    FLUX_TIMEOUT: float = 60
     SMITHERY_API_KEY: Optional[str] = None
+    # "memory://" runs against an in-process fake (single worker, no Lua)
     REDIS_URL: str = "redis://localhost:6379"
     COOKIE_SECURE: bool = False
 
+    # the shared Redis connection pool (per worker)
+    REDIS_MAX_CONNECTIONS: int = 200
+    REDIS_POOL_TIMEOUT: float = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    # process-local copies of hot keys, invalidated through Redis CLIENT TRACKING
+    NEAR_CACHE_ENABLED: bool = True
+    NEAR_CACHE_PREFIXES: List[str] = ["mcp:result:", "mcp:history:", "dashboard:version:"]
+    NEAR_CACHE_MAXSIZE: int = 10000
+    NEAR_CACHE_TTL: float = 60.0
+
+    # MCP HTTP transport pool
+    MCP_POOL_MAX_CONNECTIONS: int = 100
+    MCP_POOL_MAX_KEEPALIVE: int = 20
+    MCP_KEEPALIVE_EXPIRY: float = 30.0
+    MCP_CONNECT_TIMEOUT: float = 5.0
+    MCP_HTTP2: bool = False
+
+    # request coalescing for identical in-flight MCP calls
+    SINGLEFLIGHT_ENABLED: bool = True
+    SINGLEFLIGHT_LOCK_TTL: float = 30.0
+    SINGLEFLIGHT_RESULT_TTL: float = 10.0
+
+    # shared MCP result cache (in-process LRU in front of Redis)
+    SEARCH_CACHE_FRESH_TTL: int = 300
+    SEARCH_CACHE_STALE_TTL: int = 3600
+    IMAGE_CACHE_FRESH_TTL: int = 300
+    IMAGE_CACHE_STALE_TTL: int = 0
+    CACHE_REFRESH_CONCURRENCY: int = 4
+    CACHE_REFRESH_MAX_PENDING: int = 100
+
+    # near-duplicate search cache over hashed n-gram vectors; off by default:
+    # every worker holds CAPACITY x DIM float32 (2000 x 512 is 4 MB)
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.85
+    SEMANTIC_CACHE_DIM: int = 512
+    SEMANTIC_CACHE_CAPACITY: int = 2000
+    SEMANTIC_CACHE_INDEX_PATH: Optional[str] = None
+
+    # authenticated principal cache
+    PRINCIPAL_CACHE_TTL: float = 60.0
+    PRINCIPAL_CACHE_MAXSIZE: int = 10000
+
+    # password hashing (first scheme is used for new hashes)
+    PASSWORD_SCHEMES: List[str] = ["argon2", "bcrypt"]
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536
+    ARGON2_PARALLELISM: int = 4
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    PASSWORD_HASH_USE_PROCESSES: bool = False
+
+    # write-behind history persistence
+    HISTORY_QUEUE_MAXSIZE: int = 10000
+    HISTORY_BATCH_SIZE: int = 500
+    HISTORY_FLUSH_INTERVAL: float = 0.05
+    HISTORY_ENQUEUE_TIMEOUT: float = 1.0
+    HISTORY_DRAIN_TIMEOUT: float = 10.0
+
+    # content-addressed MCP response storage: "zstd" (falls back to gzip without zstandard) or "gzip"
+    PAYLOAD_CODEC: str = "zstd"
+    PAYLOAD_COMPRESSION_LEVEL: int = 3
+
+    # MCP resilience: circuit breaker, adaptive timeouts (p99 x multiplier, capped by the tool timeout), hedging
+    MCP_BREAKER_FAILURE_THRESHOLD: int = 5
+    MCP_BREAKER_RESET_TIMEOUT: float = 30.0
+    MCP_BREAKER_HALF_OPEN_MAX_CALLS: int = 1
+    MCP_ADAPTIVE_TIMEOUT_MIN: float = 1.0
+    MCP_ADAPTIVE_TIMEOUT_MULTIPLIER: float = 3.0
+    MCP_LATENCY_WINDOW: int = 1000
+    MCP_LATENCY_MIN_SAMPLES: int = 50
+    # idempotent tools that may be re-sent once the first attempt passes the hedge quantile
+    MCP_HEDGE_TOOLS: List[str] = ["tavily-search"]
+    MCP_HEDGE_QUANTILE: float = 0.95
+
+    # MCP admission control: per-worker concurrency and queue per upstream, queue positions per user
+    MCP_ADMISSION_MAX_CONCURRENCY: int = 32
+    MCP_ADMISSION_MAX_QUEUE: int = 64
+    MCP_ADMISSION_MAX_WAIT: float = 5.0
+    MCP_ADMISSION_USER_QUEUE: int = 8
+    # cross-worker token buckets in Redis (calls per second, 0 disables)
+    MCP_RATE_LIMIT: float = 0
+    MCP_RATE_BURST: Optional[float] = None
+    MCP_USER_RATE_LIMIT: float = 0
+    MCP_USER_RATE_BURST: Optional[float] = None
+
+    # local image assets: downloaded once, content-addressed, served from /assets
+    IMAGE_ASSET_DIR: str = "./image_assets"
+    IMAGE_ASSET_BASE_URL: str = ""
+    IMAGE_ASSET_MAX_BYTES: int = 20 * 1024 * 1024
+    IMAGE_ASSET_DOWNLOAD_TIMEOUT: float = 30.0
+    IMAGE_ASSET_DOWNLOAD_CONCURRENCY: int = 4
+    IMAGE_ASSET_MAX_PENDING: int = 1000
+    IMAGE_THUMBNAIL_SIZE: int = 256
+    IMAGE_THUMBNAIL_WORKERS: int = 2
+
+    # POST /image/jobs: background generation with retries
+    IMAGE_JOB_WORKERS: int = 4
+    IMAGE_JOB_MAX_QUEUE: int = 1000
+    IMAGE_JOB_MAX_ATTEMPTS: int = 3
+    IMAGE_JOB_BACKOFF: float = 1.0
+    IMAGE_JOB_MAX_BACKOFF: float = 30.0
+    IMAGE_JOB_TTL: int = 86400
+    # pending/running jobs not updated for this long are treated as abandoned by resubmits
+    IMAGE_JOB_LEASE: float = 300.0
+    IMAGE_JOB_MAX_WAIT: float = 30.0
+
+    # POST /search/batch
+    SEARCH_BATCH_MAX_QUERIES: int = 50
+    SEARCH_BATCH_CONCURRENCY: int = 8
+
+    # SQLAlchemy pools (per worker, per engine); ignored for sqlite
+    DB_POOL_SIZE: int = 10
+    DB_REPLICA_POOL_SIZE: Optional[int] = None
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg statement caches; set both to 0 behind pgbouncer in transaction mode
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # the replica is skipped while its measured lag exceeds this, and users who
+    # wrote within this many seconds read from the primary
+    DB_REPLICA_MAX_LAG: float = 5.0
+    DB_REPLICA_LAG_CHECK_INTERVAL: float = 1.0
+
+    # dashboard pagination
+    DASHBOARD_PAGE_SIZE: int = 50
+    DASHBOARD_MAX_PAGE_SIZE: int = 200
+    # rendered GET /dashboard/ pages, invalidated by a per-user history version in Redis
+    DASHBOARD_CACHE_ENABLED: bool = True
+    DASHBOARD_CACHE_TTL: int = 300
+    DASHBOARD_CACHE_LOCAL_MAXSIZE: int = 1024
+    # "postgres" (GIN full-text indexes) or "memory" (in-process inverted index;
+    # single-process only: other workers never see a worker's inserts or deletes)
+    HISTORY_TEXT_SEARCH_BACKEND: str = "postgres"
+    # rows fetched per server-side cursor round-trip during exports
+    EXPORT_YIELD_PER: int = 1000
+    RESULT_CACHE_LOCAL_MAXSIZE: int = 1024
+    RESULT_CACHE_LOCAL_TTL: float = 30.0
+    CACHE_NORMALIZE_CASE: bool = True
+    CACHE_NORMALIZE_WHITESPACE: bool = True
+    CACHE_NORMALIZE_NFKC: bool = True
+
+    # Prometheus /metrics; when a token is set scrapers must send it as a bearer token
+    METRICS_ENABLED: bool = True
+    METRICS_TOKEN: str = ""
+    EVENT_LOOP_MONITOR_INTERVAL: float = 0.5
+    # sampling profiler, started and stopped at runtime via /metrics/profiler
+    PROFILER_INTERVAL: float = 0.005
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,84 @@
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+
+# Bytes that are already valid JSON (e.g. a decompressed payload blob),
+# written into the output verbatim instead of being parsed and re-encoded.
+class RawJSON:
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if orjson is None:
+        # orjson handles these natively
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, uuid.UUID):
+            return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode(value: Any, default) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps(value: Any) -> bytes:
+    # RawJSON values are spliced in by the placeholder pass only when present
+    raws: List[bytes] = []
+    token = f"\x1fraw-{uuid.uuid4().hex}-"
+
+    def default(item: Any) -> Any:
+        if isinstance(item, RawJSON):
+            raws.append(item.data)
+            return f"{token}{len(raws) - 1}"
+        return _default(item)
+
+    out = _encode(value, default)
+    if raws:
+        # the control character is escaped the same way by both encoders
+        quoted = _encode(token, None)[:-1]
+        for index, raw in enumerate(raws):
+            out = out.replace(quoted + str(index).encode() + b'"', raw, 1)
+    return out
+
+
+def dumps_str(value: Any) -> str:
+    return dumps(value).decode("utf-8")
+
+
+def loads(data) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Default response class: encodes with orjson straight to bytes. Handlers on
+# hot paths return it directly to skip response_model validation and
+# jsonable_encoder, which walk every nested upstream payload.
+class FastJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,264 @@
+import asyncio
+import bisect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Prometheus text exposition (format 0.0.4) without a client library. Every
+# update happens on the event loop thread, so plain dicts are enough.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# first path segment (after any /api/v1 prefix) -> handler label
+HANDLERS = ("auth", "search", "image", "dashboard", "assets", "upstreams", "metrics")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def sample(name: str, labels: Dict[str, object], value: float) -> str:
+    if not labels:
+        return f"{name} {_format_value(value)}"
+    rendered = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+    return f"{name}{{{rendered}}} {_format_value(value)}"
+
+
+def family(name: str, kind: str, help: str) -> List[str]:
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+
+
+def histogram_samples(name: str, labels: Dict[str, object], bounds: Sequence[float], counts: Sequence[int], total: float) -> List[str]:
+    # counts are per bucket with the +Inf bucket last; exposition wants them cumulative
+    lines = []
+    cumulative = 0
+    for bound, count in zip([*bounds, float("inf")], counts):
+        cumulative += count
+        lines.append(sample(f"{name}_bucket", {**labels, "le": _format_value(float(bound))}, cumulative))
+    lines.append(sample(f"{name}_sum", labels, total))
+    lines.append(sample(f"{name}_count", labels, cumulative))
+    return lines
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def collect(self) -> List[str]:
+        return family(self.name, self.kind, self.help) + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [sample(self.name, self._labels(key), value) for key, value in self.values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def _samples(self) -> List[str]:
+        return [sample(self.name, self._labels(key), value) for key, value in self.values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(buckets)
+        # key -> [per-bucket counts, sum]
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.bounds) + 1), 0.0]
+        series[0][bisect.bisect_left(self.bounds, value)] += 1
+        series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self.series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self.series.items():
+            lines += histogram_samples(self.name, self._labels(key), self.bounds, counts, total)
+        return lines
+
+
+# Metrics owned by this module plus named collectors that render their
+# families at scrape time from state kept elsewhere (MCP guards, DB pool).
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: Dict[str, Callable[[], List[str]]] = {}
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, name: str, collect: Callable[[], List[str]]):
+        self._collectors[name] = collect
+
+    def remove_collector(self, name: str):
+        self._collectors.pop(name, None)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.collect()
+        for collect in list(self._collectors.values()):
+            lines += collect()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency.", ("handler", "method", "status"))
+)
+STAGE_SECONDS = REGISTRY.register(
+    Histogram("handler_stage_duration_seconds", "Time spent in each stage of a request handler.", ("handler", "stage"))
+)
+CACHE_REQUESTS = REGISTRY.register(
+    Counter("cache_requests_total", "Cache lookups by cache, tier and result (hit, stale, miss).", ("cache", "tier", "result"))
+)
+DB_POOL_WAIT_SECONDS = REGISTRY.register(
+    Histogram("db_pool_checkout_wait_seconds", "Time spent waiting to check a connection out of the pool.")
+)
+EVENT_LOOP_LAG_SECONDS = REGISTRY.register(
+    Histogram("event_loop_lag_seconds", "How late the event loop woke a timer.", buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+)
+
+_handler: ContextVar[str] = ContextVar("metrics_handler", default="background")
+
+
+def current_handler() -> str:
+    return _handler.get()
+
+
+def handler_for(path: str) -> str:
+    parts = [part for part in path.split("/") if part]
+    if parts[:2] == ["api", "v1"]:
+        parts = parts[2:]
+    return parts[0] if parts and parts[0] in HANDLERS else "other"
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, handler=_handler.get(), stage=name)
+
+
+def record_cache(cache: str, tier: str, result: str):
+    CACHE_REQUESTS.inc(cache=cache, tier=tier, result=result)
+
+
+# Pure ASGI so streaming responses are not buffered; also tags everything the
+# request does (dependencies, SSE generators) with its handler for stage().
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        handler = handler_for(scope["path"])
+        token = _handler.set(handler)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start, handler=handler, method=scope["method"], status=f"{status_code // 100}xx"
+            )
+            _handler.reset(token)
+
+
+# Sleeps for a fixed interval and records how much later than asked it woke
+# up: the time some callback held the loop.
+class EventLoopMonitor:
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(loop.time() - start - self.interval, 0.0)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            EVENT_LOOP_LAG_SECONDS.observe(self.last_lag)
+
+    def collect(self) -> List[str]:
+        return family("event_loop_lag_last_seconds", "gauge", "Lag measured by the most recent probe.") + [
+            sample("event_loop_lag_last_seconds", {}, self.last_lag)
+        ]
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,84 @@
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+
+# Wall-clock sampler for one thread (the event loop's): a daemon thread reads
+# that thread's current frame every interval and counts collapsed stacks, the
+# input format of flamegraph.pl and speedscope. Off by default; while on it
+# costs one sys._current_frames() per interval and nothing on the loop itself.
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_depth: int = 64, max_stacks: int = 20000):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.dropped = 0
+        self.started_at: Optional[float] = None
+        self._target: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: Optional[float] = None, thread_id: Optional[int] = None):
+        if self.running:
+            return
+        if interval:
+            self.interval = interval
+        self._target = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self.dropped = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            self.record(frame)
+
+    def record(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+            frame = frame.f_back
+        stack = ";".join(reversed(names))
+        with self._lock:
+            self.samples += 1
+            if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                self.dropped += 1
+                return
+            self.stacks[stack] += 1
+
+    def collapsed(self) -> str:
+        with self._lock:
+            stacks = self.stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def snapshot(self) -> dict:
+        return {
+            "running": self.running,
+            "interval": self.interval,
+            "started_at": self.started_at,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "dropped": self.dropped,
+        }
@@ -1,14 +1,281 @@
-import aioredis
+import asyncio
+import fnmatch
+import itertools
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import redis.asyncio as aioredis
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from redis.exceptions import ResponseError
+
 from app.core.config import settings
 
-redis = None
-
-async def get_redis():
-    global redis
-    if redis is None:
-        redis = await aioredis.from_url(
-            settings.REDIS_URL,
-            encoding="utf-8",
-            decode_responses=True,
-        )
-    return redis
+MEMORY_SCHEME = "memory://"
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+
+
+def create_redis(url: Optional[str] = None):
+    # the one client every subsystem shares; memory:// runs without a server
+    url = url or settings.REDIS_URL
+    if url.startswith(MEMORY_SCHEME):
+        return InMemoryRedis()
+    pool = aioredis.BlockingConnectionPool.from_url(
+        url,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        decode_responses=True,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+def create_tracker(client, url: Optional[str] = None):
+    # CLIENT TRACKING state lives on a single connection, so the near-cache
+    # gets its own one-connection pool with no silent reconnects: a dropped
+    # connection must surface so the cache can be flushed
+    if isinstance(client, InMemoryRedis):
+        return client
+    pool = aioredis.ConnectionPool.from_url(
+        url or settings.REDIS_URL,
+        max_connections=1,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=True,
+        retry=Retry(NoBackoff(), 0),
+        decode_responses=True,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+# In-process stand-in for the subset of redis.asyncio the app uses: strings,
+# hashes, expiry, pub/sub, pipelines and BCAST client tracking. Lua scripts
+# are not supported; EVAL raises ResponseError, which callers already treat
+# like an unavailable Redis. Values come back as str (decode_responses=True).
+class InMemoryRedis:
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._channels: Dict[str, Set["InMemoryPubSub"]] = {}
+        self._tracking: List[tuple] = []
+
+    @staticmethod
+    def _encode(value: Any) -> str:
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        return str(value)
+
+    def _alive(self, key: str) -> bool:
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            self._touched(key)
+        return key in self._data
+
+    def _touched(self, key: str):
+        for _, prefixes in self._tracking:
+            if not prefixes or any(key.startswith(prefix) for prefix in prefixes):
+                self._deliver(INVALIDATE_CHANNEL, [key])
+                return
+
+    def _deliver(self, channel: str, data: Any) -> int:
+        receivers = self._channels.get(channel, ())
+        for pubsub in receivers:
+            pubsub._queue.put_nowait({"type": "message", "pattern": None, "channel": channel, "data": data})
+        return len(receivers)
+
+    def _expire_in(self, key: str, seconds: Optional[float]):
+        if seconds is None:
+            self._expires.pop(key, None)
+        else:
+            self._expires[key] = time.monotonic() + seconds
+
+    async def ping(self) -> bool:
+        return True
+
+    async def get(self, name: str) -> Optional[str]:
+        value = self._data.get(name) if self._alive(name) else None
+        return value if value is None or isinstance(value, str) else None
+
+    async def mget(self, keys, *args) -> List[Optional[str]]:
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        return [await self.get(key) for key in keys + list(args)]
+
+    async def set(self, name: str, value: Any, ex=None, px=None, nx: bool = False, xx: bool = False, keepttl: bool = False):
+        exists = self._alive(name)
+        if (nx and exists) or (xx and not exists):
+            return None
+        self._data[name] = self._encode(value)
+        if ex is not None:
+            self._expire_in(name, float(ex))
+        elif px is not None:
+            self._expire_in(name, px / 1000)
+        elif not keepttl:
+            self._expire_in(name, None)
+        self._touched(name)
+        return True
+
+    async def delete(self, *names: str) -> int:
+        removed = 0
+        for name in names:
+            if self._alive(name):
+                del self._data[name]
+                self._expires.pop(name, None)
+                self._touched(name)
+                removed += 1
+        return removed
+
+    async def exists(self, *names: str) -> int:
+        return sum(1 for name in names if self._alive(name))
+
+    async def incr(self, name: str, amount: int = 1) -> int:
+        value = int(self._data[name]) + amount if self._alive(name) else amount
+        self._data[name] = str(value)
+        self._touched(name)
+        return value
+
+    incrby = incr
+
+    async def expire(self, name: str, time: int) -> bool:
+        if not self._alive(name):
+            return False
+        self._expire_in(name, float(time))
+        return True
+
+    async def pexpire(self, name: str, time: int) -> bool:
+        return await self.expire(name, time / 1000)
+
+    async def hget(self, name: str, key: str) -> Optional[str]:
+        value = self._data.get(name) if self._alive(name) else None
+        return value.get(key) if isinstance(value, dict) else None
+
+    async def hgetall(self, name: str) -> Dict[str, str]:
+        value = self._data.get(name) if self._alive(name) else None
+        return dict(value) if isinstance(value, dict) else {}
+
+    async def hset(self, name: str, key: Optional[str] = None, value: Any = None, mapping: Optional[Dict[str, Any]] = None) -> int:
+        fields = dict(mapping or {})
+        if key is not None:
+            fields[key] = value
+        stored = self._data.get(name) if self._alive(name) else None
+        if not isinstance(stored, dict):
+            stored = self._data[name] = {}
+        added = sum(1 for field in fields if field not in stored)
+        stored.update({field: self._encode(val) for field, val in fields.items()})
+        self._touched(name)
+        return added
+
+    async def keys(self, pattern: str = "*") -> List[str]:
+        return [key for key in list(self._data) if self._alive(key) and fnmatch.fnmatchcase(key, pattern)]
+
+    async def flushall(self) -> bool:
+        self._data.clear()
+        self._expires.clear()
+        if self._tracking:
+            # a flush invalidates everything: real Redis sends a null key list
+            self._deliver(INVALIDATE_CHANNEL, None)
+        return True
+
+    async def publish(self, channel: str, message: Any) -> int:
+        return self._deliver(channel, self._encode(message))
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args):
+        raise ResponseError("EVAL is not supported by InMemoryRedis")
+
+    async def client_id(self) -> int:
+        return next(self._ids)
+
+    async def client_tracking_on(self, clientid: Optional[int] = None, prefix: Iterable[str] = (), bcast: bool = False, **kwargs) -> str:
+        if not bcast:
+            raise ResponseError("InMemoryRedis only supports BCAST tracking")
+        self._tracking = [entry for entry in self._tracking if entry[0] != clientid] + [(clientid, tuple(prefix))]
+        return "OK"
+
+    def pubsub(self, **kwargs) -> "InMemoryPubSub":
+        return InMemoryPubSub(self)
+
+    def pipeline(self, transaction: bool = True) -> "InMemoryPipeline":
+        return InMemoryPipeline(self)
+
+    async def close(self):
+        pass
+
+    aclose = close
+
+
+class InMemoryPubSub:
+    def __init__(self, redis: InMemoryRedis):
+        self.redis = redis
+        self.channels: Set[str] = set()
+        self._queue: "asyncio.Queue[dict]" = asyncio.Queue()
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self.redis._channels.setdefault(channel, set()).add(self)
+            self.channels.add(channel)
+            self._queue.put_nowait({"type": "subscribe", "pattern": None, "channel": channel, "data": len(self.channels)})
+
+    async def unsubscribe(self, *channels: str):
+        for channel in channels or list(self.channels):
+            self.redis._channels.get(channel, set()).discard(self)
+            self.channels.discard(channel)
+            self._queue.put_nowait({"type": "unsubscribe", "pattern": None, "channel": channel, "data": len(self.channels)})
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: Optional[float] = 0.0) -> Optional[dict]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if deadline is None:
+                    message = await self._queue.get()
+                else:
+                    message = await asyncio.wait_for(self._queue.get(), max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                return None
+            if not (ignore_subscribe_messages and message["type"] in ("subscribe", "unsubscribe")):
+                return message
+
+    async def listen(self):
+        while True:
+            yield await self.get_message(timeout=None)
+
+    async def close(self):
+        await self.unsubscribe()
+
+    aclose = reset = close
+
+
+class InMemoryPipeline:
+    def __init__(self, redis: InMemoryRedis):
+        self.redis = redis
+        self._commands: List[tuple] = []
+
+    def __getattr__(self, name: str):
+        command = getattr(self.redis, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        commands, self._commands = self._commands, []
+        results = []
+        for command, args, kwargs in commands:
+            try:
+                results.append(await command(*args, **kwargs))
+            except ResponseError as e:
+                results.append(e)
+        errors = [result for result in results if isinstance(result, ResponseError)]
+        if errors and raise_on_error:
+            raise errors[0]
+        return results
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._commands = []
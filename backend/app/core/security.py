@@ -1,19 +1,106 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional, Tuple
 from jose import JWTError, jwt
 from app.core.config import settings
+from app.core.metrics import family, sample
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# First scheme hashes new passwords; hashes in any other scheme, or with
+# outdated cost parameters, are re-hashed on the next successful login.
+pwd_context = CryptContext(
+    schemes=settings.PASSWORD_SCHEMES,
+    deprecated="auto",
+    argon2__time_cost=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+)
 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-def hash_password(password: str) -> str:
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+# Runs the slow KDF in a worker pool so it never blocks the event loop.
+# At most max_pending calls are admitted (running plus queued); beyond that
+# callers are turned away rather than stalling behind the queue.
+class PasswordHasher:
+    def __init__(self, max_workers: int = 4, max_pending: int = 64, use_processes: bool = False):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.max_workers)
+        return self._executor
+
+    def collect_metrics(self) -> List[str]:
+        lines = family("password_hash_in_flight", "gauge", "Hash/verify calls admitted, running or queued.")
+        lines.append(sample("password_hash_in_flight", {}, self._in_flight))
+        lines += family("password_hash_queue_depth", "gauge", "Admitted calls waiting for a free worker.")
+        lines.append(sample("password_hash_queue_depth", {}, max(self._in_flight - self.max_workers, 0)))
+        lines += family("password_hash_max_pending", "gauge", "Calls admitted before new ones are turned away.")
+        lines.append(sample("password_hash_max_pending", {}, self.max_pending))
+        lines += family("password_hash_rejected_total", "counter", "Calls turned away because max_pending was reached.")
+        lines.append(sample("password_hash_rejected_total", {}, self.rejected))
+        return lines
+
+    async def _submit(self, fn, *args):
+        if self._in_flight >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy("too many password hashing requests in flight")
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._submit(_verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    use_processes=settings.PASSWORD_HASH_USE_PROCESSES,
+)
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.hash(password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    valid, _ = await password_hasher.verify_and_update(plain_password, hashed_password)
+    return valid
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
 
 def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
@@ -21,9 +108,12 @@ def create_access_token(subject: str, expires_delta: Optional[timedelta] = None)
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def decode_access_token(token: str) -> Optional[str]:
+def decode_token(token: str) -> Optional[dict]:
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
+
+def decode_access_token(token: str) -> Optional[str]:
+    payload = decode_token(token)
+    return payload.get("sub") if payload else None
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from redis.exceptions import RedisError
+
+from app.core import fastjson
+from app.mcp.resilience import UpstreamUnavailable
+
+# compare-and-delete so a leader never releases a lock it no longer owns
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlightError(Exception):
+    pass
+
+
+class SingleFlight:
+    def __init__(
+        self,
+        redis=None,
+        prefix: str = "sf",
+        lock_ttl: float = 30.0,
+        result_ttl: float = 10.0,
+    ):
+        self.redis = redis
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, fn, timeout or self.lock_ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # shield: a disconnecting caller must not cancel the call other waiters depend on
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    def _keys(self, key: str):
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return (
+            f"{self.prefix}:lock:{digest}",
+            f"{self.prefix}:result:{digest}",
+            f"{self.prefix}:done:{digest}",
+        )
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+        if self.redis is None:
+            return await fn()
+
+        lock_key, result_key, channel = self._keys(key)
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.redis.set(lock_key, token, nx=True, px=int(timeout * 1000))
+        except RedisError:
+            return await fn()
+
+        if not acquired:
+            return await self._follow(result_key, channel, fn, timeout)
+
+        try:
+            result = await fn()
+        except Exception as e:
+            message = {"ok": False, "error": str(e)}
+            if isinstance(e, UpstreamUnavailable):
+                # followers answer with the same status and Retry-After as the leader
+                message["unavailable"] = {"status_code": e.status_code, "retry_after": e.retry_after}
+            await self._publish(lock_key, token, result_key, channel, message)
+            raise
+        await self._publish(lock_key, token, result_key, channel, {"ok": True, "value": result})
+        return result
+
+    async def _publish(self, lock_key: str, token: str, result_key: str, channel: str, message: dict):
+        payload = fastjson.dumps(message)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(result_key, payload, px=int(self.result_ttl * 1000))
+            pipe.publish(channel, payload)
+            pipe.eval(_RELEASE_LOCK, 1, lock_key, token)
+            await pipe.execute()
+        except RedisError:
+            pass
+
+    async def _follow(self, result_key: str, channel: str, fn: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+        try:
+            pubsub = self.redis.pubsub()
+            await pubsub.subscribe(channel)
+        except RedisError:
+            return await fn()
+        try:
+            # the leader may have finished between our lock attempt and the subscribe
+            raw = await self.redis.get(result_key)
+            if raw is None:
+                raw = await self._next_message(pubsub, timeout)
+        except RedisError:
+            raw = None
+        finally:
+            try:
+                await pubsub.unsubscribe(channel)
+                await pubsub.close()
+            except RedisError:
+                pass
+
+        if raw is None:
+            # leader died or overran its lock: do the work ourselves
+            return await fn()
+        message = fastjson.loads(raw)
+        if not message.get("ok"):
+            error = message.get("error") or "upstream call failed"
+            unavailable = message.get("unavailable")
+            if unavailable:
+                raise UpstreamUnavailable(error, unavailable["retry_after"], unavailable["status_code"])
+            raise SingleFlightError(error)
+        return message.get("value")
+
+    async def _next_message(self, pubsub, timeout: float) -> Optional[str]:
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message and message.get("type") == "message":
+                return message["data"]
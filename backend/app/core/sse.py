@@ -0,0 +1,19 @@
+from typing import Any
+
+from fastapi import Request
+
+from app.core.fastjson import dumps_str
+
+EVENT_STREAM = "text/event-stream"
+
+# keep proxies (nginx) from buffering the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def wants_event_stream(request: Request) -> bool:
+    return EVENT_STREAM in request.headers.get("accept", "")
+
+
+def format_sse(event: str, data: Any) -> str:
+    payload = dumps_str(data)
+    return f"event: {event}\ndata: {payload}\n\n"
@@ -0,0 +1,89 @@
+import csv
+import io
+import zlib
+from typing import AsyncIterator, Callable, Iterable, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.fastjson import RawJSON, dumps_str
+from app.db.payload_store import decompress_payload
+
+EXPORT_FIELDS = ["type", "id", "user_id", "text", "image_url", "mcp_server", "created_at", "mcp_response"]
+
+# flush encoded rows to the client in chunks of roughly this many bytes
+CHUNK_SIZE = 64 * 1024
+
+
+def _record(row) -> dict:
+    return {
+        "type": row.type,
+        "id": str(row.id),
+        "user_id": str(row.user_id),
+        "text": row.text,
+        "image_url": row.image_url,
+        "mcp_server": row.mcp_server,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        # stored payloads are already JSON: passed through without parsing;
+        # legacy rows still carry the payload inline
+        "mcp_response": RawJSON(decompress_payload(row.payload_codec, row.payload_data)) if row.payload_data is not None else row.mcp_response,
+    }
+
+
+def encode_ndjson(rows: Iterable) -> str:
+    return "".join(dumps_str(_record(row)) + "\n" for row in rows)
+
+
+class CSVEncoder:
+    def __init__(self):
+        self._header_written = False
+
+    def __call__(self, rows: Iterable) -> str:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        if not self._header_written:
+            writer.writeheader()
+            self._header_written = True
+        for row in rows:
+            record = _record(row)
+            payload = record["mcp_response"]
+            record["mcp_response"] = payload.data.decode("utf-8") if isinstance(payload, RawJSON) else dumps_str(payload)
+            writer.writerow(record)
+        return buffer.getvalue()
+
+
+# Streams every statement through a server-side cursor (yield_per), so memory
+# stays flat no matter how many rows are exported.
+async def stream_export(
+    session_factory: Callable[[], AsyncSession],
+    statements: List,
+    encode: Callable[[Iterable], str],
+    compress: bool = False,
+    yield_per: int = 1000,
+) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 -> gzip container
+    pending: List[bytes] = []
+    pending_size = 0
+
+    def emit(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    async with session_factory() as session:
+        for statement in statements:
+            result = await session.stream(statement.execution_options(yield_per=yield_per))
+            async for partition in result.partitions():
+                chunk = encode(partition).encode("utf-8")
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size >= CHUNK_SIZE:
+                    out = emit(b"".join(pending))
+                    pending, pending_size = [], 0
+                    if out:
+                        yield out
+
+    # the header row must go out even for an empty CSV export
+    tail = encode([]).encode("utf-8")
+    out = emit(b"".join(pending) + tail)
+    if compressor:
+        out += compressor.flush()
+    if out:
+        yield out
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.core.metrics import family, sample
+
+if TYPE_CHECKING:
+    from app.db.payload_store import PayloadStore
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryQueueFull(Exception):
+    pass
+
+
+def history_row(obj: Any) -> Dict[str, Any]:
+    return {column.name: getattr(obj, column.name) for column in obj.__table__.columns}
+
+
+# Write-behind persistence for history rows. Handlers enqueue model instances
+# (ids are generated client-side, so they can answer immediately) and a
+# background task bulk-inserts them, flushing every batch_size rows or
+# flush_interval seconds, whichever comes first.
+class HistoryWriter:
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        enqueue_timeout: float = 1.0,
+        drain_timeout: float = 10.0,
+        listeners: Optional[List[Callable[[str, List[Dict[str, Any]]], None]]] = None,
+        payloads: Optional["PayloadStore"] = None,
+    ):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.drain_timeout = drain_timeout
+        # called with (table name, rows) once rows are committed
+        self.listeners = listeners or []
+        # moves mcp_response into the content-addressed payload table on insert
+        self.payloads = payloads
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.failed = 0
+
+    def collect_metrics(self) -> List[str]:
+        lines = family("history_queue_depth", "gauge", "History rows waiting to be bulk-inserted.")
+        lines.append(sample("history_queue_depth", {}, self._queue.qsize()))
+        lines += family("history_queue_capacity", "gauge", "Rows the history queue holds before callers write through.")
+        lines.append(sample("history_queue_capacity", {}, self._queue.maxsize))
+        lines += family("history_rows_flushed_total", "counter", "History rows inserted by the background writer.")
+        lines.append(sample("history_rows_flushed_total", {}, self.flushed))
+        lines += family("history_rows_failed_total", "counter", "History rows lost to failed inserts.")
+        lines.append(sample("history_rows_failed_total", {}, self.failed))
+        return lines
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def submit(self, obj: Any, session: Optional[AsyncSession] = None):
+        try:
+            await asyncio.wait_for(self._queue.put(obj), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            # backpressure: the queue stayed full, so write through the caller's session
+            if session is None:
+                raise HistoryQueueFull("history write queue is full")
+            if self.payloads is not None:
+                [row], blobs = self.payloads.externalize([history_row(obj)])
+                await self.payloads.write(session, blobs)
+                obj.payload_digest, obj.mcp_response = row.get("payload_digest"), row.get("mcp_response")
+            session.add(obj)
+            await session.commit()
+            self._notify(obj.__table__.name, [history_row(obj)])
+
+    def _notify(self, table_name: str, rows: List[Dict[str, Any]]):
+        for listener in self.listeners:
+            try:
+                listener(table_name, rows)
+            except Exception:
+                logger.exception("history listener failed for %s", table_name)
+
+    async def write_many(self, objs: List[Any]):
+        # immediate multi-row insert for callers that already hold a batch
+        by_table: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+        for obj in objs:
+            by_table[obj.__table__].append(history_row(obj))
+        for table, rows in by_table.items():
+            await self.insert_rows(table, rows)
+            self.flushed += len(rows)
+            self._notify(table.name, rows)
+
+    async def _next_batch(self) -> List[Any]:
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # poll rather than wait_for(get()) so a timed-out get can never swallow a row
+            await asyncio.sleep(min(remaining, 0.005))
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Any]):
+        by_table: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+        for obj in batch:
+            by_table[obj.__table__].append(history_row(obj))
+        for table, rows in by_table.items():
+            try:
+                await self.insert_rows(table, rows)
+                self.flushed += len(rows)
+                self._notify(table.name, rows)
+            except Exception:
+                logger.exception("bulk insert of %d %s rows failed, retrying row by row", len(rows), table.name)
+                await self._flush_one_by_one(table, rows)
+
+    async def _flush_one_by_one(self, table, rows: List[Dict[str, Any]]):
+        for row in rows:
+            try:
+                await self.insert_rows(table, [row])
+                self.flushed += 1
+                self._notify(table.name, [row])
+            except Exception:
+                self.failed += 1
+                logger.exception("dropping %s row %s", table.name, row.get("id"))
+
+    async def insert_rows(self, table, rows: List[Dict[str, Any]]):
+        # single multi-row INSERT ... VALUES (...), (...), blobs first in the same transaction
+        async with self.engine.begin() as conn:
+            if self.payloads is not None:
+                rows, blobs = self.payloads.externalize(rows)
+                await self.payloads.write(conn, blobs)
+            await conn.execute(insert(table).values(rows))
+
+    async def close(self):
+        if self._task is None:
+            return
+        # drain whatever is queued before stopping the writer
+        try:
+            await asyncio.wait_for(self._queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.error("history writer stopped with %d rows still queued", self._queue.qsize())
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
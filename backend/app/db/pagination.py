@@ -0,0 +1,57 @@
+import base64
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# Opaque keyset cursor over (created_at, id): the position of the last row
+# returned, so the next page is a plain index range scan with no OFFSET.
+def encode_cursor(created_at: datetime, entry_id) -> str:
+    raw = json.dumps({"t": created_at.isoformat(), "id": str(entry_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(data["t"]), uuid.UUID(data["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor("malformed pagination cursor") from e
+
+
+def cursor_time(created_at: datetime, column) -> datetime:
+    # asyncpg refuses an aware value for TIMESTAMP and a cursor can come from
+    # either kind of column (the timeline merges both), so match the column
+    if getattr(column.type, "timezone", False):
+        return created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+    return created_at.astimezone(timezone.utc).replace(tzinfo=None) if created_at.tzinfo else created_at
+
+
+def keyset_page(statement, model, cursor: Optional[str], limit: int):
+    return keyset_columns_page(statement, model.created_at, model.id, cursor, limit)
+
+
+def keyset_columns_page(statement, created_at_column, id_column, cursor: Optional[str], limit: int):
+    if cursor:
+        created_at, entry_id = decode_cursor(cursor)
+        created_at = cursor_time(created_at, created_at_column)
+        statement = statement.where(tuple_(created_at_column, id_column) < tuple_(created_at, entry_id))
+    # one extra row tells us whether another page exists
+    return statement.order_by(created_at_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def split_page(rows, limit: int):
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
@@ -0,0 +1,121 @@
+import gzip
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.future import select
+
+from app.core import fastjson
+
+try:
+    import zstandard
+except ImportError:  # optional: payloads fall back to gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODECS = ("zstd", "gzip")
+
+
+class PayloadBlob(NamedTuple):
+    digest: str
+    codec: str
+    size: int
+    data: bytes
+
+
+def canonical_json(value: Any) -> bytes:
+    # stable bytes for equal payloads, so the digest deduplicates across users;
+    # stays on the stdlib encoder so digests never change with the JSON library
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def payload_digest(value: Any) -> str:
+    return hashlib.sha256(canonical_json(value)).hexdigest()
+
+
+def decompress_payload(codec: str, data: bytes) -> bytes:
+    # the canonical JSON bytes, for callers that pass them through unparsed
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd payloads")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"unknown payload codec {codec!r}")
+
+
+def decode_payload(codec: str, data: bytes) -> Any:
+    return fastjson.loads(decompress_payload(codec, data))
+
+
+# Content-addressed store for raw MCP responses. History rows keep only the
+# sha256 of the canonical JSON; the compressed bytes live once in mcp_payloads
+# no matter how many rows reference them.
+class PayloadStore:
+    def __init__(self, table, codec: str = "zstd", level: int = 3, dialect: str = "postgresql"):
+        if codec not in CODECS:
+            raise ValueError(f"unknown payload codec {codec!r}")
+        if codec == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed, storing payloads with gzip")
+            codec = "gzip"
+        # models.Payload.__table__
+        self.table = table
+        self.codec = codec
+        self.level = level
+        self.dialect = dialect
+
+    def encode(self, value: Any) -> PayloadBlob:
+        raw = canonical_json(value)
+        if self.codec == "zstd":
+            data = zstandard.ZstdCompressor(level=self.level).compress(raw)
+        else:
+            data = gzip.compress(raw, compresslevel=self.level)
+        return PayloadBlob(hashlib.sha256(raw).hexdigest(), self.codec, len(raw), data)
+
+    def externalize(self, rows: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[PayloadBlob]]:
+        # returns copies so a failed transaction can retry with the original rows
+        out: List[Dict[str, Any]] = []
+        blobs: Dict[str, PayloadBlob] = {}
+        for row in rows:
+            if "payload_digest" not in row or row.get("mcp_response") is None:
+                out.append(row)
+                continue
+            blob = self.encode(row["mcp_response"])
+            blobs.setdefault(blob.digest, blob)
+            out.append({**row, "payload_digest": blob.digest, "mcp_response": None})
+        return out, list(blobs.values())
+
+    def _insert(self):
+        if self.dialect == "sqlite":
+            return sqlite_insert(self.table).on_conflict_do_nothing(index_elements=["digest"])
+        return pg_insert(self.table).on_conflict_do_nothing(index_elements=["digest"])
+
+    async def write(self, executor, blobs: List[PayloadBlob]):
+        # executor is an AsyncConnection or AsyncSession inside the caller's transaction
+        if blobs:
+            await executor.execute(self._insert(), [blob._asdict() for blob in blobs])
+
+    async def _fetch(self, executor, digests: Iterable[str]) -> List[Tuple[str, str, bytes]]:
+        digests = list(set(digests))
+        if not digests:
+            return []
+        columns = self.table.c
+        result = await executor.execute(
+            select(columns.digest, columns.codec, columns.data).where(columns.digest.in_(digests))
+        )
+        return result.all()
+
+    async def load_many(self, executor, digests: Iterable[str]) -> Dict[str, Any]:
+        return {digest: decode_payload(codec, data) for digest, codec, data in await self._fetch(executor, digests)}
+
+    async def load(self, executor, digest: str) -> Optional[Any]:
+        return (await self.load_many(executor, [digest])).get(digest)
+
+    async def load_raw(self, executor, digest: str) -> Optional[bytes]:
+        for _, codec, data in await self._fetch(executor, [digest]):
+            return decompress_payload(codec, data)
+        return None
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from redis.exceptions import RedisError
+from sqlalchemy import text
+
+from app.cache.local import LocalTTLCache
+from app.core.metrics import family, sample
+
+logger = logging.getLogger(__name__)
+
+# seconds behind the primary; 0 when caught up or when the URL points at a primary
+REPLICA_LAG_SQL = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+    " END"
+)
+
+
+# Picks the session factory for read-only work. Reads go to the replica while
+# its measured lag is within max_lag; a user who wrote in the last max_lag
+# seconds reads from the primary so they always see their own writes. Writes
+# are remembered in-process and in Redis so every worker pins the same user.
+class ReadRouter:
+    def __init__(
+        self,
+        primary,
+        replica=None,
+        redis=None,
+        max_lag: float = 5.0,
+        check_interval: float = 1.0,
+        lag_probe: Optional[Callable[[], Awaitable[Optional[float]]]] = None,
+        prefix: str = "db:wrote",
+        maxsize: int = 10000,
+    ):
+        self.primary = primary
+        self.replica = replica
+        self.redis = redis
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_probe = lag_probe or self._probe
+        self.prefix = prefix
+        # unknown until the first probe succeeds; the replica is unused until then
+        self.lag: Optional[float] = None
+        self.routed = {"primary": 0, "replica": 0}
+        self._writes = LocalTTLCache(maxsize, max_lag)
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    def _key(self, user_id) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    def replica_usable(self) -> bool:
+        return self.replica is not None and self.lag is not None and self.lag <= self.max_lag
+
+    async def mark_write(self, *user_ids):
+        for user_id in user_ids:
+            self._writes.set(str(user_id), True)
+        if self.redis is None or not user_ids:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipe.set(self._key(user_id), 1, px=int(self.max_lag * 1000))
+            await pipe.execute()
+        except RedisError:
+            logger.warning("could not record recent writes for %d users", len(user_ids), exc_info=True)
+
+    def on_rows(self, table_name: str, rows: List[Dict[str, Any]]):
+        # HistoryWriter listener, called once rows are committed
+        if self.replica is None:
+            return
+        user_ids = {str(row["user_id"]) for row in rows if row.get("user_id") is not None}
+        if user_ids:
+            task = asyncio.ensure_future(self.mark_write(*user_ids))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def recently_wrote(self, user_id) -> bool:
+        if self._writes.get(str(user_id)):
+            return True
+        if self.redis is None:
+            return False
+        try:
+            return bool(await self.redis.exists(self._key(user_id)))
+        except RedisError:
+            # cannot tell: the primary is always consistent
+            return True
+
+    async def sessions_for(self, user_id=None):
+        if self.replica_usable() and (user_id is None or not await self.recently_wrote(user_id)):
+            self.routed["replica"] += 1
+            return self.replica
+        self.routed["primary"] += 1
+        return self.primary
+
+    async def _probe(self) -> Optional[float]:
+        async with self.replica() as session:
+            lag = (await session.execute(REPLICA_LAG_SQL)).scalar()
+        return float(lag) if lag is not None else None
+
+    async def check_lag(self):
+        try:
+            self.lag = await self.lag_probe()
+        except Exception:
+            self.lag = None
+            logger.warning("replica lag check failed, reading from the primary", exc_info=True)
+
+    def start(self):
+        if self.replica is not None and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await self.check_lag()
+            await asyncio.sleep(self.check_interval)
+
+    def collect_metrics(self) -> List[str]:
+        lines = family("db_reads_routed_total", "counter", "Read-only sessions handed out, by engine.")
+        lines += [sample("db_reads_routed_total", {"engine": name}, count) for name, count in self.routed.items()]
+        if self.replica is not None:
+            lines += family("db_replica_lag_seconds", "gauge", "Last measured replica lag; -1 when unknown.")
+            lines.append(sample("db_replica_lag_seconds", {}, self.lag if self.lag is not None else -1))
+        return lines
+
+    async def close(self):
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -1,11 +1,81 @@
+import time
+from typing import List
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import SQLModel
 from app.core.config import settings
+from app.core.metrics import DB_POOL_WAIT_SECONDS, family, sample
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True)
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # checkout wait, including opening a new connection when the pool has room
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+
+def _engine_options(url: str, pool_size: int) -> dict:
+    # sqlite uses its own single-connection pools
+    if url.startswith("sqlite"):
+        return {}
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if "+asyncpg" in url:
+        # both caches must be 0 behind pgbouncer in transaction pooling mode
+        options["connect_args"] = {
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+        }
+    return options
+
+
+engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True, **_engine_options(settings.DATABASE_URL, settings.DB_POOL_SIZE))
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# read-only engine for dashboard, export and auth lookups; without a replica
+# those reads share the primary's sessions
+replica_engine = None
+ReplicaSessionLocal = AsyncSessionLocal
+if settings.DATABASE_REPLICA_URL:
+    replica_engine = create_async_engine(
+        settings.DATABASE_REPLICA_URL, echo=False, future=True,
+        **_engine_options(settings.DATABASE_REPLICA_URL, settings.DB_REPLICA_POOL_SIZE or settings.DB_POOL_SIZE),
+    )
+    ReplicaSessionLocal = sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def collect_pool_metrics() -> List[str]:
+    pools = [("primary", engine.pool)]
+    if replica_engine is not None:
+        pools.append(("replica", replica_engine.pool))
+    pools = [(name, pool) for name, pool in pools if isinstance(pool, TimedQueuePool)]
+    if not pools:
+        return []
+    lines = []
+    for name, help, value in (
+        ("db_pool_size", "Configured pool size.", lambda pool: pool.size()),
+        ("db_pool_checked_out", "Connections currently checked out.", lambda pool: pool.checkedout()),
+        ("db_pool_overflow", "Connections open beyond the pool size.", lambda pool: max(pool.overflow(), 0)),
+    ):
+        lines += family(name, "gauge", help) + [sample(name, {"engine": engine_name}, value(pool)) for engine_name, pool in pools]
+    return lines
+
+
+async def dispose_engines():
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
 async def init_db():
     async with engine.begin() as conn:
         # create any missing tables
@@ -0,0 +1,159 @@
+import bisect
+import re
+import uuid
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import false, func, text
+from sqlalchemy.future import select
+
+_TOKEN = re.compile(r"\w+")
+
+# Searchable text column per history table.
+TEXT_COLUMNS = {"search_history": "query", "image_history": "prompt"}
+
+
+def tokenize(value: str) -> List[str]:
+    return _TOKEN.findall(unicodedata.normalize("NFKC", value).casefold())
+
+
+def ts_document(column):
+    # must match the GIN expression indexes exactly or the planner will not use them
+    return func.to_tsvector(text("'simple'"), column)
+
+
+def literal_match(model, keyword: str):
+    # a keyword with no word characters ("!!!", "-") has no terms to search
+    # for; it still filters, as a plain substring like the old ILIKE did
+    return getattr(model, TEXT_COLUMNS[model.__tablename__]).contains(keyword, autoescape=True)
+
+
+class TextSearchBackend:
+    def match(self, model, keyword: str, user_id=None):
+        raise NotImplementedError
+
+    def rank(self, model, keyword: str):
+        return None
+
+    def index_rows(self, table_name: str, rows: Iterable[dict]):
+        pass
+
+    def remove(self, table_name: str, entry_id):
+        pass
+
+
+# Full-text search via to_tsvector('simple', ...) GIN expression indexes;
+# every keyword term is a prefix match and all terms must be present.
+class PostgresTextSearch(TextSearchBackend):
+    def _tsquery(self, keyword: str):
+        terms = tokenize(keyword)
+        if not terms:
+            return None
+        return func.to_tsquery(text("'simple'"), " & ".join(f"{term}:*" for term in terms))
+
+    def match(self, model, keyword: str, user_id=None):
+        query = self._tsquery(keyword)
+        if query is None:
+            return literal_match(model, keyword)
+        return ts_document(getattr(model, TEXT_COLUMNS[model.__tablename__])).op("@@")(query)
+
+    def rank(self, model, keyword: str):
+        query = self._tsquery(keyword)
+        if query is None:
+            return None
+        return func.ts_rank(ts_document(getattr(model, TEXT_COLUMNS[model.__tablename__])), query)
+
+
+# In-process inverted index (token -> entry ids) with prefix lookups over a
+# sorted token list, one per (table, user) so a keyword filter only ever
+# expands to the caller's own ids. For tests and single-process development
+# without full-text support: each worker holds its own copy, kept current by
+# its history writer and dashboard deletes, so it is not coherent across workers.
+class InvertedIndexTextSearch(TextSearchBackend):
+    def __init__(self):
+        self._postings: Dict[Tuple[str, str], Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+        self._tokens: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+        # entry id -> (user id, terms) so a delete needs only the id
+        self._documents: Dict[str, Dict[str, Tuple[str, List[str]]]] = defaultdict(dict)
+
+    def index_rows(self, table_name: str, rows: Iterable[dict]):
+        column = TEXT_COLUMNS.get(table_name)
+        if column is None:
+            return
+        for row in rows:
+            entry_id, user_id = str(row["id"]), str(row.get("user_id"))
+            postings = self._postings[table_name, user_id]
+            tokens = self._tokens[table_name, user_id]
+            terms = sorted(set(tokenize(row.get(column) or "")))
+            self._documents[table_name][entry_id] = (user_id, terms)
+            for term in terms:
+                if term not in postings:
+                    bisect.insort(tokens, term)
+                postings[term].add(entry_id)
+
+    def remove(self, table_name: str, entry_id):
+        entry_id = str(entry_id)
+        user_id, terms = self._documents[table_name].pop(entry_id, (None, []))
+        postings = self._postings.get((table_name, user_id), {})
+        for term in terms:
+            ids = postings.get(term)
+            if ids is None:
+                continue
+            ids.discard(entry_id)
+            if not ids:
+                del postings[term]
+                tokens = self._tokens[table_name, user_id]
+                del tokens[bisect.bisect_left(tokens, term)]
+
+    def _lookup_user(self, key: Tuple[str, str], terms: List[str]) -> Set[str]:
+        postings = self._postings.get(key)
+        if not postings:
+            return set()
+        tokens = self._tokens[key]
+        result: Optional[Set[str]] = None
+        for term in terms:
+            matched: Set[str] = set()
+            i = bisect.bisect_left(tokens, term)
+            while i < len(tokens) and tokens[i].startswith(term):
+                matched |= postings[tokens[i]]
+                i += 1
+            result = matched if result is None else result & matched
+            if not result:
+                return set()
+        return result or set()
+
+    def lookup(self, table_name: str, keyword: str, user_id=None) -> Optional[Set[str]]:
+        terms = tokenize(keyword)
+        if not terms:
+            return None
+        if user_id is not None:
+            return self._lookup_user((table_name, str(user_id)), terms)
+        # admin exports across every user
+        result: Set[str] = set()
+        for key in list(self._postings):
+            if key[0] == table_name:
+                result |= self._lookup_user(key, terms)
+        return result
+
+    def match(self, model, keyword: str, user_id=None):
+        ids = self.lookup(model.__tablename__, keyword, user_id)
+        if ids is None:
+            return literal_match(model, keyword)
+        if not ids:
+            return false()
+        return model.id.in_([uuid.UUID(entry_id) for entry_id in ids])
+
+    async def warm(self, session, models):
+        for model in models:
+            column = TEXT_COLUMNS[model.__tablename__]
+            statement = select(model.id, model.user_id, getattr(model, column)).execution_options(yield_per=5000)
+            result = await session.stream(statement)
+            async for entry_id, user_id, value in result:
+                self.index_rows(model.__tablename__, [{"id": entry_id, "user_id": user_id, column: value}])
+
+
+def build_text_search(backend: str) -> TextSearchBackend:
+    if backend == "memory":
+        return InvertedIndexTextSearch()
+    return PostgresTextSearch()
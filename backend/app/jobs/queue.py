@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from redis.exceptions import RedisError
+
+from app.core import fastjson
+from app.core.metrics import family, sample
+from app.mcp.admission import BATCH, set_caller
+from app.mcp.resilience import UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+TERMINAL = (SUCCEEDED, FAILED)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+# Fire-and-forget jobs run by a bounded pool of worker tasks. Job records
+# live in Redis so any web worker can answer status polls; completion is
+# also published so waiters do not have to poll. Jobs for the same user and
+# dedup key share one record while it is pending, running or succeeded; a
+# pending or running job not updated within the lease (its worker exited, or
+# its retry was dropped) no longer counts.
+class JobQueue:
+    def __init__(
+        self,
+        redis,
+        runner: Callable[[str, dict], Awaitable[dict]],
+        name: str = "image",
+        workers: int = 4,
+        max_queue: int = 1000,
+        max_attempts: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        ttl: int = 86400,
+        lease: float = 300.0,
+    ):
+        self.redis = redis
+        self.runner = runner
+        self.name = name
+        self.prefix = f"jobs:{name}"
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.ttl = ttl
+        self.lease = lease
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max_queue)
+        self._tasks: List[asyncio.Task] = []
+        self._retries: Dict[str, asyncio.TimerHandle] = {}
+        self._abandoning: Set[asyncio.Task] = set()
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def collect_metrics(self) -> List[str]:
+        labels = {"queue": self.name}
+        lines = family("job_queue_depth", "gauge", "Jobs waiting for a worker.")
+        lines.append(sample("job_queue_depth", labels, self._queue.qsize()))
+        lines += family("job_queue_capacity", "gauge", "Jobs the queue holds before submissions are refused.")
+        lines.append(sample("job_queue_capacity", labels, self._queue.maxsize))
+        for name, help, value in (
+            ("jobs_completed_total", "Jobs that finished successfully.", self.completed),
+            ("jobs_failed_total", "Jobs that failed for good.", self.failed),
+            ("jobs_retried_total", "Job attempts scheduled for a retry.", self.retried),
+        ):
+            lines += family(name, "counter", help) + [sample(name, labels, value)]
+        return lines
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}"
+
+    def _dedup_key(self, user_id: str, dedup: str) -> str:
+        return f"{self.prefix}:dedup:{user_id}:{dedup}"
+
+    def _channel(self, job_id: str) -> str:
+        return f"{self.prefix}:done:{job_id}"
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def _save(self, job: dict):
+        job["updated_at"] = time.time()
+        await self.redis.set(self._job_key(job["id"]), fastjson.dumps(job), ex=self.ttl)
+
+    async def _load(self, job_id: str) -> Optional[dict]:
+        raw = await self.redis.get(self._job_key(job_id))
+        return fastjson.loads(raw) if raw is not None else None
+
+    def _reusable(self, job: Optional[dict]) -> bool:
+        if job is None or job["status"] == FAILED:
+            return False
+        return job["status"] == SUCCEEDED or time.time() - job["updated_at"] < self.lease
+
+    async def submit(self, user_id, payload: dict, dedup: str) -> Tuple[dict, bool]:
+        user_id = str(user_id)
+        dedup_key = self._dedup_key(user_id, dedup)
+        if self._queue.full():
+            raise JobQueueFull("job queue is full")
+        job = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "payload": payload,
+            "status": PENDING,
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+        }
+        # the record exists before the dedup key points at it, so a concurrent
+        # submit that loses the claim always finds the winner's job
+        await self._save(job)
+        if not await self.redis.set(dedup_key, job["id"], nx=True, ex=self.ttl):
+            existing = await self._load(await self.redis.get(dedup_key) or "")
+            if self._reusable(existing):
+                await self.redis.delete(self._job_key(job["id"]))
+                return existing, False
+            if existing is not None and existing["status"] != FAILED:
+                await self._fail(existing, "abandoned: lease expired")
+            # replaces a failed, abandoned or expired job holding the dedup key
+            await self.redis.set(dedup_key, job["id"], ex=self.ttl)
+        self._queue.put_nowait(job["id"])
+        return job, True
+
+    async def get(self, job_id: str, user_id) -> Optional[dict]:
+        job = await self._load(job_id)
+        if job is None or job["user_id"] != str(user_id):
+            return None
+        return job
+
+    async def wait(self, job_id: str, user_id, timeout: float) -> Optional[dict]:
+        try:
+            pubsub = self.redis.pubsub()
+            await pubsub.subscribe(self._channel(job_id))
+        except RedisError:
+            return await self.get(job_id, user_id)
+        try:
+            # re-read after subscribing so a completion in between is not missed
+            job = await self.get(job_id, user_id)
+            if job is None or job["status"] in TERMINAL:
+                return job
+            deadline = time.monotonic() + timeout
+            while (remaining := deadline - time.monotonic()) > 0:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message and message.get("type") == "message":
+                    break
+            return await self.get(job_id, user_id)
+        finally:
+            try:
+                await pubsub.unsubscribe(self._channel(job_id))
+                await pubsub.close()
+            except RedisError:
+                pass
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        if isinstance(error, UpstreamUnavailable):
+            return error.retry_after
+        # exponential backoff with jitter
+        return min(self.backoff * 2 ** (attempt - 1), self.max_backoff) * (0.5 + random.random() / 2)
+
+    async def _run(self, job_id: str):
+        job = await self._load(job_id)
+        if job is None or job["status"] in TERMINAL:
+            return
+        job["status"] = RUNNING
+        job["attempts"] += 1
+        await self._save(job)
+        set_caller(job["user_id"], BATCH)
+        try:
+            job["result"] = await self.runner(job["user_id"], job["payload"])
+        except Exception as e:
+            job["error"] = str(getattr(e, "detail", None) or e)
+            if job["attempts"] < self.max_attempts:
+                job["status"] = PENDING
+                await self._save(job)
+                self.retried += 1
+                delay = self._retry_delay(job["attempts"], e)
+                self._retries[job_id] = asyncio.get_running_loop().call_later(delay, self._requeue, job_id)
+                return
+            await self._fail(job, job["error"])
+            return
+        job["status"] = SUCCEEDED
+        job["error"] = None
+        self.completed += 1
+        await self._finish(job)
+
+    async def _finish(self, job: dict):
+        await self._save(job)
+        try:
+            await self.redis.publish(self._channel(job["id"]), job["status"])
+        except RedisError:
+            pass
+
+    async def _fail(self, job: dict, error: str):
+        job["status"] = FAILED
+        job["error"] = error
+        self.failed += 1
+        await self._finish(job)
+
+    async def _abandon(self, job_id: str, error: str):
+        try:
+            job = await self._load(job_id)
+            if job is not None and job["status"] not in TERMINAL:
+                await self._fail(job, error)
+        except RedisError:
+            logger.warning("could not mark job %s failed", job_id, exc_info=True)
+
+    def _requeue(self, job_id: str):
+        self._retries.pop(job_id, None)
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            logger.error("dropping retry of job %s, queue is full", job_id)
+            # fail it so the dedup key stops pointing at a job that will never run
+            task = asyncio.ensure_future(self._abandon(job_id, "retry dropped: job queue is full"))
+            self._abandoning.add(task)
+            task.add_done_callback(self._abandoning.discard)
+
+    async def close(self):
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
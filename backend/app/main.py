@@ -1,26 +1,214 @@
+import logging
+import math
+import httpx
 import uvicorn
-from fastapi import FastAPI
-from app.api import auth, search
-from app.db.session import init_db
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.api.api_v1.api import api_router
+from app.api.image import image_job_runner
+from app.assets.images import ImageAssetStore
+from app.db.session import init_db, engine, replica_engine, AsyncSessionLocal, ReplicaSessionLocal, collect_pool_metrics, dispose_engines
+from app.db.routing import ReadRouter
+from app.db.history_writer import HistoryWriter
+from app.db.payload_store import PayloadStore
+from app.db.text_search import build_text_search, InvertedIndexTextSearch
+from app.jobs.queue import JobQueue
+from app.models import SearchHistory, ImageHistory, Payload
 from app.core.config import settings
-import redis.asyncio as aioredis
+from app.core.fastjson import FastJSONResponse
+from app.core.security import password_hasher
+from app.core.metrics import REGISTRY, EventLoopMonitor, MetricsMiddleware
+from app.core.profiler import SamplingProfiler
+from app.mcp.registry import build_registry
+from app.mcp.resilience import UpstreamUnavailable
+from app.core.singleflight import SingleFlight
+from app.cache.local import LocalTTLCache
+from app.cache.result_cache import ResultCache, CachePolicy
+from app.cache.refresh import BackgroundRefresher
+from app.cache.principal import PrincipalCache
+from app.cache.dashboard import DashboardCache
+from app.cache.near import NearCache
+from app.core.redis import create_redis, create_tracker
+from app.cache.semantic import SemanticCache, HashedNgramEmbedder, VectorIndex
+import os
 
-app = FastAPI(title="AI Content Explorer Backend")
+logger = logging.getLogger(__name__)
 
-app.include_router(auth.router)
-app.include_router(search.router)
+app = FastAPI(title="AI Content Explorer Backend", default_response_class=FastJSONResponse)
+
+# every domain router: auth, search, image, dashboard, upstreams, assets, metrics
+app.include_router(api_router)
+
+# per-handler request latency; also labels the stage timings taken inside handlers
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    # open breaker or shed load: fail fast instead of queueing behind the upstream
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
 
 @app.on_event("startup")
 async def on_startup():
     # create db tables if missing
     await init_db()
-    # init redis client and attach to app state
-    app.state.redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+    # one pooled redis client for every subsystem, with hot keys served from memory
+    app.state.redis = create_redis(settings.REDIS_URL)
+    if settings.NEAR_CACHE_ENABLED:
+        app.state.redis = NearCache(
+            app.state.redis,
+            create_tracker(app.state.redis, settings.REDIS_URL),
+            settings.NEAR_CACHE_PREFIXES,
+            maxsize=settings.NEAR_CACHE_MAXSIZE,
+            ttl=settings.NEAR_CACHE_TTL,
+        )
+        app.state.redis.start()
+        REGISTRY.add_collector("near_cache", app.state.redis.collect_metrics)
+    # keyword filtering over history
+    app.state.text_search = build_text_search(settings.HISTORY_TEXT_SEARCH_BACKEND)
+    if isinstance(app.state.text_search, InvertedIndexTextSearch):
+        async with AsyncSessionLocal() as session:
+            await app.state.text_search.warm(session, [SearchHistory, ImageHistory])
+    # raw MCP responses are stored once per content hash, compressed
+    app.state.payloads = PayloadStore(Payload.__table__, settings.PAYLOAD_CODEC, settings.PAYLOAD_COMPRESSION_LEVEL, dialect=engine.dialect.name)
+    # dashboard, export and auth reads go to the replica unless it lags or the user just wrote
+    app.state.db_router = ReadRouter(
+        AsyncSessionLocal,
+        ReplicaSessionLocal if replica_engine is not None else None,
+        redis=app.state.redis,
+        max_lag=settings.DB_REPLICA_MAX_LAG,
+        check_interval=settings.DB_REPLICA_LAG_CHECK_INTERVAL,
+    )
+    app.state.db_router.start()
+    # rendered dashboard pages; history inserts, deletes and asset attachments bump the user's version
+    if settings.DASHBOARD_CACHE_ENABLED:
+        # one listener: the replica write-pin is set before the version moves
+        app.state.dashboard_cache = DashboardCache(
+            app.state.redis,
+            local=LocalTTLCache(settings.DASHBOARD_CACHE_LOCAL_MAXSIZE, settings.DASHBOARD_CACHE_TTL),
+            ttl=settings.DASHBOARD_CACHE_TTL,
+            mark_write=app.state.db_router.mark_write if replica_engine is not None else None,
+        )
+        history_listeners = [app.state.dashboard_cache.on_rows]
+    else:
+        history_listeners = [app.state.db_router.on_rows]
+    # generated images are copied locally (with thumbnails) once their rows are written
+    app.state.image_assets = ImageAssetStore(
+        settings.IMAGE_ASSET_DIR,
+        engine,
+        ImageHistory.__table__,
+        httpx.AsyncClient(timeout=settings.IMAGE_ASSET_DOWNLOAD_TIMEOUT, follow_redirects=True),
+        redis=app.state.redis,
+        max_bytes=settings.IMAGE_ASSET_MAX_BYTES,
+        thumbnail_size=settings.IMAGE_THUMBNAIL_SIZE,
+        workers=settings.IMAGE_THUMBNAIL_WORKERS,
+        max_concurrency=settings.IMAGE_ASSET_DOWNLOAD_CONCURRENCY,
+        max_pending=settings.IMAGE_ASSET_MAX_PENDING,
+        listeners=history_listeners,
+    )
+    # history rows are bulk-inserted in the background
+    app.state.history_writer = HistoryWriter(
+        engine,
+        max_queue=settings.HISTORY_QUEUE_MAXSIZE,
+        batch_size=settings.HISTORY_BATCH_SIZE,
+        flush_interval=settings.HISTORY_FLUSH_INTERVAL,
+        enqueue_timeout=settings.HISTORY_ENQUEUE_TIMEOUT,
+        drain_timeout=settings.HISTORY_DRAIN_TIMEOUT,
+        listeners=[app.state.text_search.index_rows, app.state.image_assets.on_rows, *history_listeners],
+        payloads=app.state.payloads,
+    )
+    app.state.history_writer.start()
+    # decoded tokens and user rows for get_current_user, invalidated over pub/sub
+    app.state.principals = PrincipalCache(app.state.redis, settings.PRINCIPAL_CACHE_TTL, settings.PRINCIPAL_CACHE_MAXSIZE)
+    app.state.principals.start()
+    # pooled MCP transports shared by every request
+    app.state.mcp = build_registry(app.state.redis)
+    # coalesce identical in-flight MCP calls within and across workers
+    app.state.singleflight = SingleFlight(
+        redis=app.state.redis if settings.SINGLEFLIGHT_ENABLED else None,
+        lock_ttl=settings.SINGLEFLIGHT_LOCK_TTL,
+        result_ttl=settings.SINGLEFLIGHT_RESULT_TTL,
+    )
+    app.state.result_cache = ResultCache(
+        app.state.redis,
+        local=LocalTTLCache(settings.RESULT_CACHE_LOCAL_MAXSIZE, settings.RESULT_CACHE_LOCAL_TTL),
+        policies={
+            "tavily-search": CachePolicy(settings.SEARCH_CACHE_FRESH_TTL, settings.SEARCH_CACHE_STALE_TTL),
+            "generateImageUrl": CachePolicy(settings.IMAGE_CACHE_FRESH_TTL, settings.IMAGE_CACHE_STALE_TTL),
+        },
+    )
+    # stale-while-revalidate refreshes
+    app.state.refresher = BackgroundRefresher(settings.CACHE_REFRESH_CONCURRENCY, settings.CACHE_REFRESH_MAX_PENDING)
+    if settings.SEMANTIC_CACHE_ENABLED:
+        index = VectorIndex(settings.SEMANTIC_CACHE_DIM, settings.SEMANTIC_CACHE_CAPACITY)
+        if settings.SEMANTIC_CACHE_INDEX_PATH and os.path.exists(settings.SEMANTIC_CACHE_INDEX_PATH):
+            try:
+                index.load(settings.SEMANTIC_CACHE_INDEX_PATH)
+            except Exception:
+                # a truncated or foreign file must not stop startup; it is rebuilt as queries come in
+                logger.warning("could not load semantic index %s, starting empty", settings.SEMANTIC_CACHE_INDEX_PATH, exc_info=True)
+                index = VectorIndex(settings.SEMANTIC_CACHE_DIM, settings.SEMANTIC_CACHE_CAPACITY)
+        app.state.semantic_cache = SemanticCache(
+            HashedNgramEmbedder(settings.SEMANTIC_CACHE_DIM), index, settings.SEMANTIC_CACHE_THRESHOLD
+        )
+    # POST /image/jobs, run by a bounded worker pool with retries
+    app.state.image_jobs = JobQueue(
+        app.state.redis,
+        image_job_runner(app.state),
+        name="image",
+        workers=settings.IMAGE_JOB_WORKERS,
+        max_queue=settings.IMAGE_JOB_MAX_QUEUE,
+        max_attempts=settings.IMAGE_JOB_MAX_ATTEMPTS,
+        backoff=settings.IMAGE_JOB_BACKOFF,
+        max_backoff=settings.IMAGE_JOB_MAX_BACKOFF,
+        ttl=settings.IMAGE_JOB_TTL,
+        lease=settings.IMAGE_JOB_LEASE,
+    )
+    app.state.image_jobs.start()
+    # scrape-time metrics read from state the subsystems already keep
+    app.state.loop_monitor = EventLoopMonitor(settings.EVENT_LOOP_MONITOR_INTERVAL)
+    app.state.loop_monitor.start()
+    app.state.profiler = SamplingProfiler(settings.PROFILER_INTERVAL)
+    REGISTRY.add_collector("mcp", app.state.mcp.collect_metrics)
+    REGISTRY.add_collector("db_pool", collect_pool_metrics)
+    REGISTRY.add_collector("db_router", app.state.db_router.collect_metrics)
+    REGISTRY.add_collector("event_loop", app.state.loop_monitor.collect)
+    REGISTRY.add_collector("password_hasher", password_hasher.collect_metrics)
+    REGISTRY.add_collector("history_writer", app.state.history_writer.collect_metrics)
+    REGISTRY.add_collector("image_jobs", app.state.image_jobs.collect_metrics)
+    REGISTRY.add_collector("image_assets", app.state.image_assets.collect_metrics)
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    if getattr(app.state, "profiler", None):
+        app.state.profiler.stop()
+    if getattr(app.state, "loop_monitor", None):
+        await app.state.loop_monitor.close()
+    if getattr(app.state, "image_jobs", None):
+        await app.state.image_jobs.close()
+    if getattr(app.state, "principals", None):
+        await app.state.principals.close()
+    if getattr(app.state, "refresher", None):
+        await app.state.refresher.close()
+    if getattr(app.state, "history_writer", None):
+        await app.state.history_writer.close()
+    if getattr(app.state, "image_assets", None):
+        await app.state.image_assets.close()
+    if getattr(app.state, "dashboard_cache", None):
+        await app.state.dashboard_cache.close()
+    if getattr(app.state, "db_router", None):
+        await app.state.db_router.close()
+    if getattr(app.state, "semantic_cache", None) and settings.SEMANTIC_CACHE_INDEX_PATH:
+        app.state.semantic_cache.index.save(settings.SEMANTIC_CACHE_INDEX_PATH)
     if getattr(app.state, "redis", None):
         await app.state.redis.close()
+    if getattr(app.state, "mcp", None):
+        await app.state.mcp.close()
+    await dispose_engines()
+    password_hasher.shutdown()
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
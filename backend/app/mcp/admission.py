@@ -0,0 +1,249 @@
+import asyncio
+import itertools
+from collections import Counter
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from app.mcp.resilience import LatencyHistogram, UpstreamUnavailable
+
+# lower value is served first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+
+# (user id, priority) of whoever is driving the current MCP call; set per
+# request by the API layer and inherited by tasks it spawns
+_caller: ContextVar[Tuple[Optional[str], int]] = ContextVar("mcp_caller", default=(None, INTERACTIVE))
+
+
+def set_caller(user_id=None, priority: int = INTERACTIVE):
+    _caller.set((str(user_id) if user_id is not None else None, priority))
+
+
+def current_caller() -> Tuple[Optional[str], int]:
+    return _caller.get()
+
+
+# Takes one token from every bucket in KEYS or from none of them.
+# ARGV holds (rate per second, burst) per key; returns {allowed, wait seconds}.
+_TAKE_TOKENS = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local burst = tonumber(ARGV[i * 2])
+    local state = redis.call("HMGET", key, "tokens", "ts")
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(now - ts, 0) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+end
+local allowed = wait == 0 and 1 or 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local burst = tonumber(ARGV[i * 2])
+    redis.call("HSET", key, "tokens", levels[i] - allowed, "ts", now)
+    redis.call("PEXPIRE", key, math.ceil(burst / rate * 1000) + 1000)
+end
+return {allowed, tostring(wait)}
+"""
+
+
+# Cross-worker rate limit for one upstream: a shared bucket plus an optional
+# per-user bucket, both debited atomically. Fails open when Redis is down.
+class RedisTokenBucket:
+    def __init__(
+        self,
+        redis,
+        name: str,
+        rate: float,
+        burst: Optional[float] = None,
+        user_rate: float = 0,
+        user_burst: Optional[float] = None,
+        prefix: str = "admission",
+    ):
+        self.redis = redis
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self.user_rate = user_rate
+        self.user_burst = user_burst or max(user_rate, 1)
+        self.prefix = prefix
+
+    async def take(self, user_id: Optional[str]) -> float:
+        keys, args = [], []
+        if self.rate > 0:
+            keys.append(f"{self.prefix}:{self.name}:bucket")
+            args += [self.rate, self.burst]
+        if self.user_rate > 0 and user_id is not None:
+            keys.append(f"{self.prefix}:{self.name}:user:{user_id}")
+            args += [self.user_rate, self.user_burst]
+        if not keys:
+            return 0.0
+        try:
+            allowed, wait = await self.redis.eval(_TAKE_TOKENS, len(keys), *keys, *args)
+        except RedisError:
+            return 0.0
+        return 0.0 if int(allowed) else float(wait)
+
+
+class AdmissionRejected(UpstreamUnavailable):
+    pass
+
+
+class _Waiter:
+    __slots__ = ("user", "priority", "seq", "future")
+
+    def __init__(self, user: Optional[str], priority: int, seq: int, future: asyncio.Future):
+        self.user = user
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+
+
+# Per-worker concurrency limit for one upstream. Callers beyond max_concurrency
+# wait in a bounded queue served by priority, then by whichever user holds the
+# fewest slots, then FIFO. A full queue, a user already holding per_user_queue
+# queue positions or an empty token bucket is rejected immediately with a
+# Retry-After hint.
+class AdmissionController:
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 32,
+        max_queue: int = 64,
+        max_wait: float = 5.0,
+        per_user_queue: int = 8,
+        bucket: Optional[RedisTokenBucket] = None,
+        latency: Optional[LatencyHistogram] = None,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.per_user_queue = per_user_queue
+        self.bucket = bucket
+        # used to estimate Retry-After when shedding
+        self.latency = latency
+        self._active = 0
+        self._active_by_user: Counter = Counter()
+        self._queued_by_user: Counter = Counter()
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.shed = 0
+        self.rate_limited = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        user, priority = current_caller()
+        await self._acquire(user, priority)
+        try:
+            yield
+        finally:
+            self._release(user)
+
+    def _retry_after(self) -> float:
+        p50 = self.latency.percentile(0.5) if self.latency is not None else None
+        if p50 is None:
+            return 1.0
+        return max(p50 * (len(self._waiters) + 1) / self.max_concurrency, 1.0)
+
+    async def _acquire(self, user: Optional[str], priority: int):
+        if self.bucket is not None:
+            wait = await self.bucket.take(user)
+            if wait > 0:
+                self.rate_limited += 1
+                raise AdmissionRejected(f"MCP upstream '{self.name}' rate limit reached", wait, status_code=429)
+        if self._free():
+            self._grant(user)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            raise AdmissionRejected(f"MCP upstream '{self.name}' is overloaded", self._retry_after())
+        if user is not None and self._queued_by_user[user] >= self.per_user_queue:
+            self.shed += 1
+            raise AdmissionRejected("Too many queued requests, slow down", self._retry_after(), status_code=429)
+
+        waiter = _Waiter(user, priority, next(self._seq), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        if user is not None:
+            self._queued_by_user[user] += 1
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait)
+        except BaseException as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # granted just as we gave up: pass the slot on
+                self._release(user)
+            else:
+                self._dequeue(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed += 1
+                raise AdmissionRejected(f"MCP upstream '{self.name}' is overloaded", self._retry_after())
+            raise
+
+    async def reserve(self) -> Optional[Callable[[], None]]:
+        # an extra slot for a hedged request: never queues and never sheds, just
+        # returns None when no slot (or token) is free; otherwise the release callback
+        user, _ = current_caller()
+        if not self._free():
+            return None
+        if self.bucket is not None and await self.bucket.take(user) > 0:
+            return None
+        if not self._free():
+            return None
+        self._grant(user)
+        return lambda: self._release(user)
+
+    def _free(self) -> bool:
+        return self._active < self.max_concurrency and not self._waiters
+
+    def _grant(self, user: Optional[str]):
+        self._active += 1
+        self.admitted += 1
+        if user is not None:
+            self._active_by_user[user] += 1
+
+    def _dequeue(self, waiter: _Waiter):
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            if waiter.user is not None:
+                self._queued_by_user[waiter.user] -= 1
+                if not self._queued_by_user[waiter.user]:
+                    del self._queued_by_user[waiter.user]
+
+    def _release(self, user: Optional[str]):
+        self._active -= 1
+        if user is not None:
+            self._active_by_user[user] -= 1
+            if not self._active_by_user[user]:
+                del self._active_by_user[user]
+        while self._active < self.max_concurrency and self._waiters:
+            waiter = min(
+                self._waiters,
+                key=lambda w: (w.priority, self._active_by_user[w.user] if w.user is not None else 0, w.seq),
+            )
+            self._dequeue(waiter)
+            if waiter.future.done():
+                continue
+            self._grant(waiter.user)
+            waiter.future.set_result(None)
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "rate_limited": self.rate_limited,
+        }
@@ -1,26 +1,136 @@
+import json
 import uuid
 import httpx
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, NamedTuple, Optional
+from app.mcp.admission import AdmissionController
+from app.mcp.resilience import UpstreamGuard
+
+
+class MCPEvent(NamedTuple):
+    kind: str  # "progress", "notification" or "result"
+    data: dict
+
+
+# Groups "data:" lines into one JSON-RPC message per SSE event.
+async def iter_sse_messages(lines: AsyncIterator[str]) -> AsyncIterator[dict]:
+    data = []
+    async for line in lines:
+        if not line:
+            if data:
+                yield json.loads("\n".join(data))
+                data = []
+            continue
+        if line.startswith("data:"):
+            data.append(line[5:].lstrip(" "))
+    if data:
+        yield json.loads("\n".join(data))
 
 class MCPClient:
-    def __init__(self, base_url: str, api_key: str | None = None, timeout: int = 30):
-        self.base_url = base_url
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str | None = None,
+        profile: str | None = None,
+        timeout: float = 30,
+        http: Optional[httpx.AsyncClient] = None,
+        guard: Optional[UpstreamGuard] = None,
+        admission: Optional[AdmissionController] = None,
+    ):
+        self.base_url = str(base_url)
         self.api_key = api_key
+        self.profile = profile
         self.timeout = timeout
+        # pooled transport shared across requests; when absent a one-off client is used per call
+        self.http = http
+        # breaker, adaptive timeout and hedging; calls go straight through when absent
+        self.guard = guard
+        # concurrency limit, priority queue and rate limit in front of the upstream
+        self.admission = admission
 
-    async def call_tool(self, tool_name: str, arguments: dict):
-        payload = {
+    def _headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _params(self) -> dict:
+        return {"profile": self.profile} if self.profile else {}
+
+    def _payload(self, tool_name: str, arguments: dict, progress_token: Optional[str] = None) -> dict:
+        params = {"name": tool_name, "arguments": arguments}
+        if progress_token:
+            params["_meta"] = {"progressToken": progress_token}
+        return {
             "jsonrpc": "2.0",
             "id": str(uuid.uuid4()),
             "method": "tools/call",
-            "params": {
-                "name": tool_name,
-                "arguments": arguments
-            }
+            "params": params,
         }
-        headers = {"Content-Type": "application/json"}
-        if self.api_key:
-            headers["Authorization"] = f"Bearer {self.api_key}"
+
+    @asynccontextmanager
+    async def _admit(self):
+        # an open breaker fails fast before the call takes a queue position
+        if self.guard is not None:
+            self.guard.breaker.check()
+        if self.admission is None:
+            yield
+            return
+        async with self.admission.slot():
+            yield
+
+    async def call_tool(self, tool_name: str, arguments: dict):
+        payload = self._payload(tool_name, arguments)
+        async with self._admit():
+            if self.guard is not None:
+                # a hedge is a second upstream request, so it needs a second slot
+                reserve = self.admission.reserve if self.admission is not None else None
+                return await self.guard.call(tool_name, lambda: self._post(payload), reserve)
+            return await self._post(payload)
+
+    async def _post(self, payload: dict):
+        if self.http is not None:
+            resp = await self.http.post(self.base_url, json=payload, headers=self._headers(), params=self._params())
+            resp.raise_for_status()
+            return resp.json()
         async with httpx.AsyncClient(timeout=self.timeout) as client:
-            resp = await client.post(self.base_url, json=payload, headers=headers)
+            resp = await client.post(self.base_url, json=payload, headers=self._headers(), params=self._params())
             resp.raise_for_status()
             return resp.json()
+
+    # Same call as call_tool, but asks the server for an SSE stream and yields
+    # progress notifications as they arrive. Servers that answer with plain
+    # JSON produce a single "result" event.
+    async def stream_tool(self, tool_name: str, arguments: dict) -> AsyncIterator[MCPEvent]:
+        payload = self._payload(tool_name, arguments, progress_token=uuid.uuid4().hex)
+        headers = {**self._headers(), "Accept": "application/json, text/event-stream"}
+        async with self._admit():
+            async with self.guard.track() if self.guard is not None else nullcontext():
+                async for event in self._stream_via(payload, headers):
+                    yield event
+
+    async def _stream_via(self, payload: dict, headers: dict) -> AsyncIterator[MCPEvent]:
+        if self.http is not None:
+            async for event in self._stream(self.http, payload, headers):
+                yield event
+            return
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async for event in self._stream(client, payload, headers):
+                yield event
+
+    async def _stream(self, http: httpx.AsyncClient, payload: dict, headers: dict) -> AsyncIterator[MCPEvent]:
+        async with http.stream("POST", self.base_url, json=payload, headers=headers, params=self._params()) as resp:
+            resp.raise_for_status()
+            if not resp.headers.get("content-type", "").startswith("text/event-stream"):
+                await resp.aread()
+                yield MCPEvent("result", resp.json())
+                return
+            async for message in iter_sse_messages(resp.aiter_lines()):
+                if message.get("id") == payload["id"]:
+                    yield MCPEvent("result", message)
+                    return
+                if message.get("method") == "notifications/progress":
+                    yield MCPEvent("progress", message.get("params") or {})
+                elif "method" in message:
+                    yield MCPEvent("notification", message.get("params") or {})
+        raise httpx.RemoteProtocolError("MCP stream ended without a result")
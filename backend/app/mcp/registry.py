@@ -0,0 +1,163 @@
+import httpx
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import family, histogram_samples, sample
+from app.mcp.client import MCPClient
+from app.mcp.admission import AdmissionController, RedisTokenBucket
+from app.mcp.resilience import CLOSED, CircuitBreaker, UpstreamGuard
+
+TAVILY = "tavily"
+FLUX = "flux"
+
+
+# process-wide MCP clients, one pooled HTTP transport per upstream
+class MCPClientRegistry:
+    def __init__(self, redis=None):
+        # shared token buckets for cross-worker rate limits; per-worker limits only when absent
+        self.redis = redis
+        self._clients: Dict[str, MCPClient] = {}
+        self._transports: Dict[str, httpx.AsyncClient] = {}
+
+    def register(
+        self,
+        name: str,
+        base_url: str,
+        api_key: Optional[str] = None,
+        profile: Optional[str] = None,
+        timeout: float = 30,
+    ) -> MCPClient:
+        limits = httpx.Limits(
+            max_connections=settings.MCP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.MCP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.MCP_KEEPALIVE_EXPIRY,
+        )
+        transport = httpx.AsyncClient(
+            limits=limits,
+            timeout=httpx.Timeout(timeout, connect=settings.MCP_CONNECT_TIMEOUT),
+            http2=settings.MCP_HTTP2,
+        )
+        self._transports[name] = transport
+        guard = UpstreamGuard(
+            name,
+            max_timeout=timeout,
+            min_timeout=settings.MCP_ADAPTIVE_TIMEOUT_MIN,
+            timeout_multiplier=settings.MCP_ADAPTIVE_TIMEOUT_MULTIPLIER,
+            min_samples=settings.MCP_LATENCY_MIN_SAMPLES,
+            window=settings.MCP_LATENCY_WINDOW,
+            hedge_tools=settings.MCP_HEDGE_TOOLS,
+            hedge_quantile=settings.MCP_HEDGE_QUANTILE,
+            breaker=CircuitBreaker(
+                name,
+                failure_threshold=settings.MCP_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.MCP_BREAKER_RESET_TIMEOUT,
+                half_open_max_calls=settings.MCP_BREAKER_HALF_OPEN_MAX_CALLS,
+            ),
+        )
+        bucket = None
+        if self.redis is not None and (settings.MCP_RATE_LIMIT > 0 or settings.MCP_USER_RATE_LIMIT > 0):
+            bucket = RedisTokenBucket(
+                self.redis,
+                name,
+                rate=settings.MCP_RATE_LIMIT,
+                burst=settings.MCP_RATE_BURST,
+                user_rate=settings.MCP_USER_RATE_LIMIT,
+                user_burst=settings.MCP_USER_RATE_BURST,
+            )
+        admission = AdmissionController(
+            name,
+            max_concurrency=settings.MCP_ADMISSION_MAX_CONCURRENCY,
+            max_queue=settings.MCP_ADMISSION_MAX_QUEUE,
+            max_wait=settings.MCP_ADMISSION_MAX_WAIT,
+            per_user_queue=settings.MCP_ADMISSION_USER_QUEUE,
+            bucket=bucket,
+            latency=guard.latency,
+        )
+        self._clients[name] = MCPClient(
+            base_url, api_key=api_key, profile=profile, timeout=timeout, http=transport, guard=guard, admission=admission,
+        )
+        return self._clients[name]
+
+    def get(self, name: str) -> MCPClient:
+        client = self._clients.get(name)
+        if client is None:
+            raise KeyError(f"MCP upstream '{name}' is not configured")
+        return client
+
+    def stats(self) -> Dict[str, dict]:
+        stats = {}
+        for name, client in self._clients.items():
+            stats[name] = client.guard.snapshot() if client.guard is not None else {}
+            if client.admission is not None:
+                stats[name]["admission"] = client.admission.snapshot()
+        return stats
+
+    def collect_metrics(self) -> List[str]:
+        latency = family("mcp_request_duration_seconds", "histogram", "Latency of successful MCP upstream calls.")
+        counters = {
+            "mcp_failures_total": ("Failed MCP upstream calls (5xx, 429, timeouts, transport errors).", []),
+            "mcp_timeouts_total": ("MCP upstream calls cut off by the adaptive timeout.", []),
+            "mcp_hedged_total": ("Hedged second requests sent.", []),
+            "mcp_hedges_skipped_total": ("Hedges not sent because no admission slot was free.", []),
+            "mcp_rejected_total": ("MCP calls rejected before reaching the upstream.", []),
+        }
+        gauges = {
+            "mcp_breaker_open": ("1 while the upstream's circuit breaker is open or half open.", []),
+            "mcp_timeout_seconds": ("Current adaptive timeout.", []),
+            "mcp_admission_active": ("Calls holding an admission slot.", []),
+            "mcp_admission_queued": ("Calls waiting for an admission slot.", []),
+        }
+        for name, client in self._clients.items():
+            labels = {"upstream": name}
+            guard = client.guard
+            if guard is not None:
+                histogram = guard.latency
+                latency += histogram_samples("mcp_request_duration_seconds", labels, histogram.bounds, histogram.counts, histogram.total)
+                counters["mcp_failures_total"][1].append(sample("mcp_failures_total", labels, guard.failures))
+                counters["mcp_timeouts_total"][1].append(sample("mcp_timeouts_total", labels, guard.timeouts))
+                counters["mcp_hedged_total"][1].append(sample("mcp_hedged_total", labels, guard.hedged))
+                counters["mcp_hedges_skipped_total"][1].append(sample("mcp_hedges_skipped_total", labels, guard.hedges_skipped))
+                counters["mcp_rejected_total"][1].append(
+                    sample("mcp_rejected_total", {**labels, "reason": "circuit_open"}, guard.breaker.rejected)
+                )
+                gauges["mcp_breaker_open"][1].append(sample("mcp_breaker_open", labels, int(guard.breaker.state != CLOSED)))
+                gauges["mcp_timeout_seconds"][1].append(sample("mcp_timeout_seconds", labels, guard.timeout()))
+            admission = client.admission
+            if admission is not None:
+                snapshot = admission.snapshot()
+                counters["mcp_rejected_total"][1].append(sample("mcp_rejected_total", {**labels, "reason": "shed"}, snapshot["shed"]))
+                counters["mcp_rejected_total"][1].append(
+                    sample("mcp_rejected_total", {**labels, "reason": "rate_limited"}, snapshot["rate_limited"])
+                )
+                gauges["mcp_admission_active"][1].append(sample("mcp_admission_active", labels, snapshot["active"]))
+                gauges["mcp_admission_queued"][1].append(sample("mcp_admission_queued", labels, snapshot["queued"]))
+        lines = latency
+        for kind, families in (("counter", counters), ("gauge", gauges)):
+            for metric, (help, samples) in families.items():
+                lines += family(metric, kind, help) + samples
+        return lines
+
+    async def close(self):
+        for transport in self._transports.values():
+            await transport.aclose()
+        self._transports.clear()
+        self._clients.clear()
+
+
+def build_registry(redis=None) -> MCPClientRegistry:
+    registry = MCPClientRegistry(redis)
+    if settings.TAVILY_MCP_URL:
+        registry.register(
+            TAVILY,
+            settings.TAVILY_MCP_URL,
+            api_key=settings.TAVILY_API_KEY,
+            profile=settings.TAVILY_PROFILE,
+            timeout=settings.TAVILY_TIMEOUT,
+        )
+    if settings.FLUX_MCP_URL:
+        registry.register(
+            FLUX,
+            settings.FLUX_MCP_URL,
+            api_key=settings.FLUX_API_KEY,
+            timeout=settings.FLUX_TIMEOUT,
+        )
+    return registry
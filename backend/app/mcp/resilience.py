@@ -0,0 +1,282 @@
+import asyncio
+import bisect
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+import httpx
+
+# upper bounds (seconds) of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+# Raised before any request is sent upstream; mapped to a response with Retry-After.
+class UpstreamUnavailable(Exception):
+    def __init__(self, message: str, retry_after: float, status_code: int = 503):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class CircuitOpen(UpstreamUnavailable):
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"MCP upstream '{upstream}' is unavailable (circuit open)", retry_after)
+        self.upstream = upstream
+
+
+class UpstreamTimeout(Exception):
+    pass
+
+
+# Cumulative bucket counts for reporting plus a sliding window of recent
+# samples that the percentiles are computed from.
+class LatencyHistogram:
+    def __init__(self, window: int = 1000, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._recent: deque = deque(maxlen=window)
+        self._sorted: Optional[list] = None
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self._recent.append(seconds)
+        self._sorted = None
+
+    def samples(self) -> int:
+        return len(self._recent)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._recent:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._recent)
+        return self._sorted[min(int(q * len(self._sorted)), len(self._sorted) - 1)]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "buckets": {str(bound): count for bound, count in zip([*self.bounds, "+Inf"], self.counts)},
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+# closed -> open after failure_threshold consecutive failures; open -> half_open
+# after reset_timeout; half_open lets half_open_max_calls probes through and
+# closes on the first success or re-opens on the first failure.
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        return max(self._opened_at + self.reset_timeout - time.monotonic(), 1.0)
+
+    def check(self):
+        # fail fast without taking a half-open probe slot
+        if self.state == OPEN:
+            self.rejected += 1
+            raise CircuitOpen(self.name, self.retry_after())
+
+    def acquire(self):
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._probes >= self.half_open_max_calls):
+            self.rejected += 1
+            raise CircuitOpen(self.name, self.retry_after())
+        if state == HALF_OPEN:
+            self._probes += 1
+
+    def release(self):
+        # a probe that ended without an outcome (cancelled)
+        if self._state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record_success(self):
+        self._state = CLOSED
+        self._failures = 0
+        self._probes = 0
+
+    def record_failure(self):
+        if self._state == HALF_OPEN:
+            self._trip()
+            return
+        self._failures += 1
+        if self._state == CLOSED and self._failures >= self.failure_threshold:
+            self._trip()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probes = 0
+        self.opened += 1
+
+    def snapshot(self) -> dict:
+        state = self.state
+        return {
+            "state": state,
+            "consecutive_failures": self._failures,
+            "retry_after": self.retry_after() if state == OPEN else None,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, (asyncio.TimeoutError, UpstreamTimeout, httpx.TransportError))
+
+
+# Per-upstream guard around MCP calls: circuit breaker, latency-driven
+# timeouts and, for idempotent tools, a hedged second request once the
+# first one has run longer than the hedge quantile. With reserve, the hedge
+# needs its own admission slot and is skipped when none is free.
+class UpstreamGuard:
+    def __init__(
+        self,
+        name: str,
+        max_timeout: float,
+        min_timeout: float = 1.0,
+        timeout_multiplier: float = 3.0,
+        min_samples: int = 50,
+        window: int = 1000,
+        hedge_tools: Iterable[str] = (),
+        hedge_quantile: float = 0.95,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+        self.hedge_tools = set(hedge_tools)
+        self.hedge_quantile = hedge_quantile
+        self.breaker = breaker or CircuitBreaker(name)
+        self.latency = LatencyHistogram(window)
+        self.timeouts = 0
+        self.failures = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedges_skipped = 0
+
+    def timeout(self) -> float:
+        p99 = self.latency.percentile(0.99)
+        if p99 is None or self.latency.samples() < self.min_samples:
+            return self.max_timeout
+        return min(max(p99 * self.timeout_multiplier, self.min_timeout), self.max_timeout)
+
+    def hedge_delay(self, tool_name: str) -> Optional[float]:
+        # never hedge into an upstream that is already struggling
+        if tool_name not in self.hedge_tools or self.breaker.state != CLOSED:
+            return None
+        if self.latency.samples() < self.min_samples:
+            return None
+        return self.latency.percentile(self.hedge_quantile)
+
+    @asynccontextmanager
+    async def track(self):
+        self.breaker.acquire()
+        start = time.monotonic()
+        outcome = None
+        try:
+            yield
+            outcome = True
+        except Exception as e:
+            outcome = not is_upstream_failure(e)
+            raise
+        finally:
+            if outcome is None:
+                self.breaker.release()
+            elif outcome:
+                self.latency.observe(time.monotonic() - start)
+                self.breaker.record_success()
+            else:
+                self.failures += 1
+                self.breaker.record_failure()
+
+    async def call(
+        self,
+        tool_name: str,
+        fn: Callable[[], Awaitable[Any]],
+        reserve: Optional[Callable[[], Awaitable[Optional[Callable[[], None]]]]] = None,
+    ) -> Any:
+        timeout = self.timeout()
+        async with self.track():
+            try:
+                return await asyncio.wait_for(self._attempt(fn, self.hedge_delay(tool_name), reserve), timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise UpstreamTimeout(f"MCP upstream '{self.name}' timed out after {timeout:.2f}s")
+
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]], hedge_after: Optional[float], reserve=None) -> Any:
+        if hedge_after is None:
+            return await fn()
+        primary = asyncio.ensure_future(fn())
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if primary in done:
+                return primary.result()
+            release = None
+            if reserve is not None:
+                release = await reserve()
+                if release is None:
+                    self.hedges_skipped += 1
+                    return await primary
+            self.hedged += 1
+            hedge = asyncio.ensure_future(fn())
+            if release is not None:
+                # the slot is held until the hedge finishes or its cancellation lands
+                hedge.add_done_callback(lambda _: release())
+            pending.add(hedge)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def snapshot(self) -> dict:
+        return {
+            "breaker": self.breaker.snapshot(),
+            "latency": self.latency.snapshot(),
+            "timeout": self.timeout(),
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedges_skipped": self.hedges_skipped,
+        }
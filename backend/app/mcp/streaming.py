@@ -0,0 +1,40 @@
+import asyncio
+from typing import AsyncIterator
+
+from app.core.singleflight import SingleFlight
+from app.mcp.client import MCPClient, MCPEvent
+
+
+# Streams a tool call while still going through single-flight: the leader
+# relays upstream progress as it arrives, while coalesced callers only see
+# the final result once the shared call completes.
+async def stream_tool_call(
+    singleflight: SingleFlight,
+    key: str,
+    client: MCPClient,
+    tool: str,
+    arguments: dict,
+) -> AsyncIterator[MCPEvent]:
+    events: "asyncio.Queue[MCPEvent]" = asyncio.Queue()
+
+    async def call():
+        async for event in client.stream_tool(tool, arguments):
+            if event.kind == "result":
+                return event.data
+            events.put_nowait(event)
+
+    task = asyncio.ensure_future(singleflight.do(key, call, timeout=client.timeout))
+    try:
+        while not task.done():
+            getter = asyncio.ensure_future(events.get())
+            await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield getter.result()
+            else:
+                getter.cancel()
+        while not events.empty():
+            yield events.get_nowait()
+        yield MCPEvent("result", task.result())
+    finally:
+        if not task.done():
+            task.cancel()
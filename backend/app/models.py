@@ -1,6 +1,7 @@
 from typing import Optional, List
 from sqlmodel import SQLModel, Field, Column
-from sqlalchemy import text
+from sqlalchemy import text, Index, LargeBinary
+from app.db.text_search import ts_document
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID, JSONB, TIMESTAMP, TEXT as PG_TEXT, INTEGER
 import uuid
 from datetime import datetime, timedelta
@@ -23,23 +24,47 @@ class RefreshToken(SQLModel, table=True):
     token_hash: str = Field(sa_column=Column(PG_TEXT, nullable=False))
     expires_at: datetime = Field(default_factory=lambda: datetime.utcnow() + timedelta(days=30), sa_column=Column(TIMESTAMP(timezone=True)))
 
+class Payload(SQLModel, table=True):
+    # deduplicated, compressed MCP responses keyed by sha256 of the canonical JSON (see app.db.payload_store)
+    __tablename__ = "mcp_payloads"
+    digest: str = Field(sa_column=Column(PG_TEXT, primary_key=True))
+    codec: str = Field(sa_column=Column(PG_TEXT, nullable=False))
+    size: int = Field(sa_column=Column(INTEGER, nullable=False))
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(TIMESTAMP(timezone=True), server_default=text('now()')))
+
 class SearchHistory(SQLModel, table=True):
     __tablename__ = "search_history"
+    __table_args__ = (
+        # keyset pagination: WHERE user_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC
+        Index("ix_search_history_user_created_id", "user_id", "created_at", "id"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, sa_column=Column(PG_UUID(as_uuid=True), primary_key=True))
     user_id: uuid.UUID = Field(sa_column=Column(PG_UUID(as_uuid=True), nullable=False))
     query: str
+    # legacy inline payload; new rows reference mcp_payloads through payload_digest
     mcp_response: Optional[dict] = Field(default=None, sa_column=Column(JSONB))
+    payload_digest: Optional[str] = Field(default=None, sa_column=Column(PG_TEXT))
     mcp_server: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(TIMESTAMP(timezone=True), server_default=text('now()')))
 
 class ImageHistory(SQLModel, table=True):
     __tablename__ = "image_history"
+    __table_args__ = (
+        Index("ix_image_history_user_created_id", "user_id", "created_at", "id"),
+    )
 
     id: Optional[uuid.UUID] = Field(default_factory=uuid.uuid4, primary_key=True, index=True)
     user_id: Optional[uuid.UUID] = Field(default=None, foreign_key="user.id", index=True)
     prompt: str = Field(nullable=False, max_length=500)
     image_url: str = Field(nullable=False)
-    mcp_response: dict = Field(sa_column=Column(JSONB), nullable=False)
+    # local copy in the image asset store (app.assets.images), set once downloaded
+    asset_key: Optional[str] = Field(default=None, max_length=80)
+    mcp_response: Optional[dict] = Field(default=None, sa_column=Column(JSONB))
+    payload_digest: Optional[str] = Field(default=None, sa_column=Column(PG_TEXT))
     mcp_server: str = Field(nullable=False, max_length=256)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+# GIN full-text indexes for dashboard keyword filtering (see app.db.text_search)
+Index("ix_search_history_query_fts", ts_document(SearchHistory.query), postgresql_using="gin")
+Index("ix_image_history_prompt_fts", ts_document(ImageHistory.prompt), postgresql_using="gin")
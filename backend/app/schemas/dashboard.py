@@ -11,8 +11,10 @@ class DashboardFilter(BaseModel):
 class SearchEntry(BaseModel):
     id: str
     query: str
-    mcp_response: dict
-    mcp_server: str
+    # only filled in by the detail endpoint; list views return payload_digest instead
+    mcp_response: Optional[dict] = None
+    payload_digest: Optional[str] = None
+    mcp_server: Optional[str] = None
     created_at: datetime
 
     class Config:
@@ -22,7 +24,11 @@ class ImageEntry(BaseModel):
     id: str
     prompt: str
     image_url: str
-    mcp_response: dict
+    # served from /assets once downloaded, the upstream image_url until then
+    full_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    mcp_response: Optional[dict] = None
+    payload_digest: Optional[str] = None
     mcp_server: str
     created_at: datetime
 
@@ -32,3 +38,18 @@ class ImageEntry(BaseModel):
 class DashboardResponse(BaseModel):
     searches: List[SearchEntry] = []
     images: List[ImageEntry] = []
+    next_search_cursor: Optional[str] = None
+    next_image_cursor: Optional[str] = None
+
+class TimelineEntry(BaseModel):
+    type: Literal["search", "image"]
+    id: str
+    text: str
+    image_url: Optional[str] = None
+    payload_digest: Optional[str] = None
+    mcp_server: Optional[str] = None
+    created_at: datetime
+
+class TimelineResponse(BaseModel):
+    entries: List[TimelineEntry] = []
+    next_cursor: Optional[str] = None
@@ -6,5 +6,16 @@ class ImageGenerateRequest(BaseModel):
 
 class ImageGenerateResponse(BaseModel):
     cached: bool
+    stale: bool = False
     image_url: str
     saved_id: Optional[str] = None
+
+class ImageJobResponse(BaseModel):
+    id: str
+    status: str
+    attempts: int
+    image_url: Optional[str] = None
+    saved_id: Optional[str] = None
+    cached: Optional[bool] = None
+    error: Optional[str] = None
+    created_at: float
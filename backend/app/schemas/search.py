@@ -1,10 +1,31 @@
-from pydantic import BaseModel
-from typing import Any, Optional
+from pydantic import BaseModel, Field
+from typing import Any, List, Optional
 
 class SearchRequest(BaseModel):
     query: str
 
+class SemanticLookup(BaseModel):
+    hit: bool
+    similarity: Optional[float] = None
+    matched_query: Optional[str] = None
+
 class SearchResponse(BaseModel):
     cached: bool
+    stale: bool = False
     result: Any
     saved_id: Optional[str]
+    semantic: Optional[SemanticLookup] = None
+
+class SearchBatchRequest(BaseModel):
+    queries: List[str] = Field(..., min_items=1)
+
+class SearchBatchItem(BaseModel):
+    query: str
+    cached: bool = False
+    stale: bool = False
+    result: Any = None
+    saved_id: Optional[str] = None
+    error: Optional[str] = None
+
+class SearchBatchResponse(BaseModel):
+    results: List[SearchBatchItem]
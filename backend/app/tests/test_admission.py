@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from redis.exceptions import RedisError
+from app.mcp.admission import AdmissionController, AdmissionRejected, RedisTokenBucket, BACKGROUND, INTERACTIVE, set_caller
+
+
+async def hold(controller, user, priority, started, release, order):
+    set_caller(user, priority)
+    async with controller.slot():
+        order.append(user)
+        started.set()
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_queue_prefers_priority_then_least_served_user():
+    controller = AdmissionController("tavily", max_concurrency=2, max_queue=10)
+    hold_a, hold_x = asyncio.Event(), asyncio.Event()
+    order = []
+    started_a, started_x = asyncio.Event(), asyncio.Event()
+    running_a = asyncio.ensure_future(hold(controller, "a", INTERACTIVE, started_a, hold_a, order))
+    running_x = asyncio.ensure_future(hold(controller, "x", INTERACTIVE, started_x, hold_x, order))
+    await asyncio.gather(started_a.wait(), started_x.wait())
+
+    release = asyncio.Event()
+    queued = [
+        asyncio.ensure_future(hold(controller, user, priority, asyncio.Event(), release, order))
+        for user, priority in [("bg", BACKGROUND), ("a", INTERACTIVE), ("b", INTERACTIVE)]
+    ]
+    await asyncio.sleep(0)
+    assert controller.snapshot()["queued"] == 3
+
+    # one slot frees up while "a" still holds the other: "b" goes ahead of a's second call
+    hold_x.set()
+    await running_x
+    await asyncio.sleep(0)
+    assert order[2:] == ["b"]
+
+    hold_a.set()
+    release.set()
+    await asyncio.gather(running_a, *queued)
+    assert order[2:] == ["b", "a", "bg"]
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_shed_with_retry_after():
+    controller = AdmissionController("flux", max_concurrency=1, max_queue=1)
+    release = asyncio.Event()
+    started = asyncio.Event()
+    running = asyncio.ensure_future(hold(controller, "a", INTERACTIVE, started, release, []))
+    await started.wait()
+    queued = asyncio.ensure_future(hold(controller, "b", INTERACTIVE, asyncio.Event(), release, []))
+    await asyncio.sleep(0)
+
+    set_caller("c")
+    with pytest.raises(AdmissionRejected) as exc:
+        async with controller.slot():
+            pass
+    assert exc.value.status_code == 503 and exc.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+    assert controller.snapshot()["active"] == 0 and controller.snapshot()["shed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_waiter_gives_up_after_max_wait():
+    controller = AdmissionController("flux", max_concurrency=1, max_wait=0.01)
+    release = asyncio.Event()
+    started = asyncio.Event()
+    running = asyncio.ensure_future(hold(controller, "a", INTERACTIVE, started, release, []))
+    await started.wait()
+
+    set_caller("b")
+    with pytest.raises(AdmissionRejected):
+        async with controller.slot():
+            pass
+    assert controller.snapshot()["queued"] == 0
+
+    release.set()
+    await running
+
+
+class ScriptedRedis:
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        self.calls.append((numkeys, keys_and_args))
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.mark.asyncio
+async def test_empty_token_bucket_is_rejected_with_429():
+    redis = ScriptedRedis([1, "0"], [0, "0.25"], RedisError("down"))
+    bucket = RedisTokenBucket(redis, "tavily", rate=10, burst=20, user_rate=1)
+    controller = AdmissionController("tavily", bucket=bucket)
+    set_caller("u1")
+
+    async with controller.slot():
+        pass
+    # the shared and the per-user bucket are debited in one script call
+    assert redis.calls[0] == (2, ("admission:tavily:bucket", "admission:tavily:user:u1", 10, 20, 1, 1))
+
+    with pytest.raises(AdmissionRejected) as exc:
+        async with controller.slot():
+            pass
+    assert exc.value.status_code == 429 and exc.value.retry_after == 0.25
+    assert controller.snapshot()["rate_limited"] == 1 and controller.snapshot()["active"] == 0
+
+    # Redis down: fail open
+    async with controller.slot():
+        pass
+    assert controller.snapshot()["admitted"] == 2
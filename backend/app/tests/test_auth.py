@@ -6,9 +6,9 @@ from app.models import User
 @pytest.mark.asyncio
 async def test_password_hashing():
     password = "StrongPass123!"
-    hashed = hash_password(password)
-    assert verify_password(password, hashed)
-    assert not verify_password("WrongPass", hashed)
+    hashed = await hash_password(password)
+    assert await verify_password(password, hashed)
+    assert not await verify_password("WrongPass", hashed)
 
 @pytest.mark.asyncio
 async def test_register_login_logout(client):
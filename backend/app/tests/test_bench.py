@@ -0,0 +1,66 @@
+import httpx
+import pytest
+from app.mcp.client import MCPClient
+from bench.fake_mcp import FLUX, TAVILY, FakeMCPConfig, create_app
+from bench.report import Sample, compare, percentile, summarize, unreachable
+
+
+def test_percentiles_and_summary():
+    assert percentile(list(range(1, 101)), 0.99) == 99
+    assert percentile([5.0], 0.5) == 5.0
+    assert percentile([], 0.5) is None
+
+    samples = [Sample("search", i, latency, 200, i % 2 == 0) for i, latency in enumerate([0.01, 0.02, 0.03, 0.04])]
+    samples.append(Sample("dashboard", 0, 0.5, 503))
+    samples += [Sample("image", 0, 0.001, 404), Sample("image", 1, 0.001, 404)]
+    samples.append(Sample("poll", 0, 0.002, 304))
+    summary = summarize(samples, duration=2.0)
+    assert summary["search"]["p50_ms"] == 20.0
+    assert summary["search"]["cache_hit_ratio"] == 0.5
+    assert summary["dashboard"]["error_rate"] == 1.0
+    # 404s are errors and stay out of latency and throughput
+    assert summary["image"]["error_rate"] == 1.0
+    assert summary["image"]["p50_ms"] is None
+    assert summary["poll"]["errors"] == 0
+    assert summary["all"]["requests"] == 8
+    assert summary["all"]["throughput_rps"] == 2.5
+    assert unreachable({"scenarios": summary}) == ["image"]
+
+
+def test_compare_flags_regressions():
+    baseline = {"version": 2, "scenarios": {"search": {"p50_ms": 10, "p95_ms": 20, "p99_ms": 30, "throughput_rps": 100, "error_rate": 0}}}
+    current = {"version": 2, "scenarios": {"search": {"p50_ms": 10.5, "p95_ms": 30, "p99_ms": 30, "throughput_rps": 80, "error_rate": 0}}}
+    regressed = {row["metric"] for row in compare(baseline, current, threshold=0.1) if row["regressed"]}
+    assert regressed == {"p95_ms", "throughput_rps"}
+
+
+@pytest.mark.asyncio
+async def test_fake_servers_speak_tools_call():
+    tavily = create_app(FakeMCPConfig(tool=TAVILY, latency="fixed:0", payload_bytes=64, results=3))
+    flux = create_app(FakeMCPConfig(tool=FLUX, latency="fixed:0", image_size=8, public_url="http://flux.test"))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=tavily)) as http:
+        client = MCPClient("http://tavily.test/mcp", http=http)
+        first = await client.call_tool("tavily-search", {"query": "redis", "limit": 3})
+        again = await client.call_tool("tavily-search", {"query": "redis", "limit": 3})
+        events = [event.kind async for event in client.stream_tool("tavily-search", {"query": "redis", "limit": 3})]
+    assert len(first["result"]["results"]) == 3
+    assert first["result"] == again["result"]
+    assert events[-1] == "result" and events.count("progress") == 3
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=flux), base_url="http://flux.test") as http:
+        client = MCPClient("http://flux.test/mcp", http=http)
+        response = await client.call_tool("generateImageUrl", {"prompt": "a fox"})
+        image = await http.get(response["result"]["url"])
+    assert image.headers["content-type"] == "image/png"
+    assert image.content.startswith(b"\x89PNG")
+
+
+@pytest.mark.asyncio
+async def test_fake_server_injects_errors():
+    app = create_app(FakeMCPConfig(tool=TAVILY, latency="fixed:0", error_rate=1.0, error_status=503))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app)) as http:
+        client = MCPClient("http://tavily.test/mcp", http=http)
+        with pytest.raises(httpx.HTTPStatusError) as exc:
+            await client.call_tool("tavily-search", {"query": "x"})
+    assert exc.value.response.status_code == 503
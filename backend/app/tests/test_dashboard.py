@@ -1,13 +1,16 @@
+import uuid
+from datetime import datetime, timedelta, timezone
 import pytest
+from app.models import SearchHistory, ImageHistory
 
 @pytest.mark.asyncio
 async def test_dashboard_crud(client, monkeypatch):
 
 
-    async def mock_search_tool(tool_name, params):
+    async def mock_search_tool(self, tool_name, arguments):
         return {"result": {"items": ["search1"]}}
 
-    async def mock_image_tool(tool_name, params):
+    async def mock_image_tool(self, tool_name, arguments):
         return {"result": {"url": "http://image.url/test.png"}}
 
     monkeypatch.setattr("app.mcp.client.MCPClient.call_tool", mock_search_tool)
@@ -42,4 +45,32 @@ async def test_dashboard_crud(client, monkeypatch):
     if json_res["images"]:
         image_id = json_res["images"][0]["id"]
         res = await client.delete(f"/api/v1/dashboard/image/{image_id}", cookies=cookies)
-        assert res.status_code == 204
\ No newline at end of file
+        assert res.status_code == 204
+
+
+@pytest.mark.asyncio
+async def test_timeline_walks_pages_across_both_histories(client, db_session):
+    user_data = {"email": "timeline@example.com", "password": "StrongPass1"}
+    await client.post("/api/v1/auth/register", json=user_data)
+    cookies = (await client.post("/api/v1/auth/login", json=user_data)).cookies
+    user_id = uuid.UUID((await client.get("/api/v1/auth/me", cookies=cookies)).json()["id"])
+
+    # interleaved: search rows are timestamptz, image rows naive UTC
+    now = datetime.utcnow().replace(microsecond=0)
+    for i in range(2):
+        db_session.add(SearchHistory(user_id=user_id, query=f"search {i}", mcp_server="tavily",
+                                     created_at=(now - timedelta(minutes=2 * i)).replace(tzinfo=timezone.utc)))
+        db_session.add(ImageHistory(user_id=user_id, prompt=f"image {i}", image_url="http://img/x.png",
+                                    mcp_server="flux", created_at=now - timedelta(minutes=2 * i + 1)))
+    await db_session.commit()
+
+    first = await client.get("/api/v1/dashboard/timeline", params={"limit": 3}, cookies=cookies)
+    assert first.status_code == 200
+    assert first.json()["next_cursor"]
+    second = await client.get(
+        "/api/v1/dashboard/timeline", params={"limit": 3, "cursor": first.json()["next_cursor"]}, cookies=cookies
+    )
+    assert second.status_code == 200
+    entries = first.json()["entries"] + second.json()["entries"]
+    assert [e["text"] for e in entries] == ["search 0", "image 0", "search 1", "image 1"]
+    assert second.json()["next_cursor"] is None
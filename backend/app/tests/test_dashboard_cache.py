@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+from app.cache.dashboard import DashboardCache, etag_matches, make_etag
+from app.cache.local import LocalTTLCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        value = self.store.get(key)
+        return str(value) if value is not None else None
+
+    async def hget(self, key, field):
+        return self.store.get(key, {}).get(field)
+
+    async def hgetall(self, key):
+        return dict(self.store.get(key, {}))
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def hset(self, key, mapping):
+        # decode_responses=True hands strings back
+        self.ops.append(lambda: self.redis.store.setdefault(key, {}).update(
+            {field: value.decode() if isinstance(value, bytes) else value for field, value in mapping.items()}
+        ))
+
+    def expire(self, key, ttl):
+        self.ops.append(lambda: None)
+
+    def incr(self, key):
+        self.ops.append(lambda: self.redis.store.__setitem__(key, self.redis.store.get(key, 0) + 1))
+
+    async def execute(self):
+        for op in self.ops:
+            op()
+
+
+def test_etag_matching():
+    etag = make_etag(b'{"searches":[]}')
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+@pytest.mark.asyncio
+async def test_pages_are_shared_across_workers_until_the_version_is_bumped():
+    redis = FakeRedis()
+    worker_a = DashboardCache(redis, local=LocalTTLCache(16, 60))
+    worker_b = DashboardCache(redis, local=LocalTTLCache(16, 60))
+    key = DashboardCache.filters_key({"type": None, "limit": 50})
+    assert key == DashboardCache.filters_key({"limit": 50, "type": None})
+
+    version = await worker_a.version("u1")
+    assert version == "0"
+    page = await worker_a.put("u1", version, key, b'{"searches":[1]}')
+
+    assert await worker_b.etag("u1", version, key) == page.etag
+    assert await worker_b.get("u1", version, key) == page
+
+    worker_a.on_rows("search_history", [{"id": "r1", "user_id": "u1"}, {"id": "r2", "user_id": "u1"}])
+    await asyncio.sleep(0)
+    bumped = await worker_b.version("u1")
+    assert bumped == "1"
+    assert await worker_b.get("u1", bumped, key) is None
+    assert await worker_b.version("u2") == "0"
+
+
+@pytest.mark.asyncio
+async def test_write_pin_is_set_before_the_version_moves():
+    redis = FakeRedis()
+    order = []
+
+    async def mark_write(*user_ids):
+        await asyncio.sleep(0.01)
+        order.append(("pin", user_ids))
+
+    cache = DashboardCache(redis, mark_write=mark_write)
+    original = cache.bump
+
+    async def bump(*user_ids):
+        order.append(("bump", user_ids))
+        await original(*user_ids)
+
+    cache.bump = bump
+    cache.on_rows("search_history", [{"id": "r1", "user_id": "u1"}])
+    assert len(cache._pending) == 1
+    await cache.close()
+    assert order == [("pin", ("u1",)), ("bump", ("u1",))]
+    assert await cache.version("u1") == "1"
+    assert not cache._pending
@@ -0,0 +1,75 @@
+import pytest
+from app.db.routing import ReadRouter
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def exists(self, key):
+        return int(key in self.store)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def set(self, key, value, px=None):
+        self.ops.append((key, value))
+
+    async def execute(self):
+        for key, value in self.ops:
+            self.redis.store[key] = value
+
+
+def primary():
+    pass
+
+
+def replica():
+    pass
+
+
+def make_router(lag, redis=None):
+    async def probe():
+        return lag
+    return ReadRouter(primary, replica, redis=redis, max_lag=5.0, lag_probe=probe)
+
+
+@pytest.mark.asyncio
+async def test_replica_used_only_within_max_lag():
+    router = make_router(0.5)
+    # unknown lag until the first probe
+    assert await router.sessions_for("u1") is primary
+    await router.check_lag()
+    assert await router.sessions_for("u1") is replica
+    assert await router.sessions_for() is replica
+
+    router.lag_probe = make_router(30.0).lag_probe
+    await router.check_lag()
+    assert await router.sessions_for("u1") is primary
+
+
+@pytest.mark.asyncio
+async def test_recent_writer_is_pinned_to_primary_across_workers():
+    redis = FakeRedis()
+    worker_a, worker_b = make_router(0.1, redis), make_router(0.1, redis)
+    await worker_a.check_lag()
+    await worker_b.check_lag()
+
+    await worker_a.mark_write("u1")
+    assert await worker_a.sessions_for("u1") is primary
+    assert await worker_b.sessions_for("u1") is primary
+    assert await worker_b.sessions_for("u2") is replica
+    assert worker_b.routed == {"primary": 1, "replica": 1}
+
+
+def test_without_replica_everything_reads_primary():
+    router = ReadRouter(primary)
+    router.on_rows("search_history", [{"user_id": "u1"}])
+    assert not router.replica_usable()
+    assert router.collect_metrics()[0].startswith("# HELP db_reads_routed_total")
@@ -0,0 +1,22 @@
+import json
+import uuid
+from datetime import datetime, timezone
+from app.core.fastjson import FastJSONResponse, RawJSON, dumps, loads
+
+
+def test_raw_json_is_spliced_verbatim():
+    raw = b'{"results":[{"title":"a \\u00e9","score":0.5}]}'
+    out = dumps({"items": [{"id": 1, "mcp_response": RawJSON(raw)}, {"id": 2, "mcp_response": RawJSON(b"null")}]})
+    assert raw in out
+    assert loads(out) == {"items": [{"id": 1, "mcp_response": json.loads(raw)}, {"id": 2, "mcp_response": None}]}
+
+
+def test_native_types_and_response_class():
+    user_id = uuid.uuid4()
+    created = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    resp = FastJSONResponse({"user_id": user_id, "created_at": created, "tags": {"x"}})
+    body = loads(resp.body)
+    assert body["user_id"] == str(user_id)
+    assert body["created_at"].startswith("2024-01-02T03:04:05")
+    assert body["tags"] == ["x"]
+    assert resp.media_type == "application/json"
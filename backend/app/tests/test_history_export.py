@@ -0,0 +1,72 @@
+import csv
+import gzip
+import io
+import json
+import uuid
+from datetime import datetime
+import pytest
+from sqlalchemy import Column, DateTime, JSON, MetaData, String, Table, literal_column, null, cast, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.history_export import stream_export, encode_ndjson, CSVEncoder
+
+metadata = MetaData()
+searches = Table(
+    "searches", metadata,
+    Column("id", String, primary_key=True),
+    Column("user_id", String),
+    Column("query", String),
+    Column("mcp_server", String),
+    Column("created_at", DateTime),
+    Column("mcp_response", JSON),
+)
+
+
+async def make_session_factory(rows):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+        if rows:
+            await conn.execute(searches.insert(), rows)
+    return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def statement():
+    return select(
+        literal_column("'search'").label("type"),
+        searches.c.id, searches.c.user_id, searches.c.query.label("text"),
+        cast(null(), String).label("image_url"), searches.c.mcp_server,
+        searches.c.created_at, searches.c.mcp_response,
+        cast(null(), String).label("payload_codec"), cast(null(), String).label("payload_data"),
+    ).order_by(searches.c.created_at)
+
+
+def sample_rows(n):
+    return [
+        {"id": str(uuid.uuid4()), "user_id": "u1", "query": f"q{i}", "mcp_server": "tavily",
+         "created_at": datetime(2024, 1, 1, 0, 0, i), "mcp_response": {"n": i}}
+        for i in range(n)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_gzip_ndjson_export_streams_every_row():
+    factory = await make_session_factory(sample_rows(25))
+    chunks = [c async for c in stream_export(factory, [statement()], encode_ndjson, compress=True, yield_per=4)]
+    lines = gzip.decompress(b"".join(chunks)).decode().splitlines()
+    assert len(lines) == 25
+    first = json.loads(lines[0])
+    assert first["type"] == "search" and first["text"] == "q0" and first["mcp_response"] == {"n": 0}
+
+
+@pytest.mark.asyncio
+async def test_csv_export_has_single_header_even_when_empty():
+    factory = await make_session_factory(sample_rows(3))
+    body = b"".join([c async for c in stream_export(factory, [statement()], CSVEncoder(), yield_per=2)])
+    records = list(csv.DictReader(io.StringIO(body.decode())))
+    assert [r["text"] for r in records] == ["q0", "q1", "q2"]
+
+    empty = await make_session_factory([])
+    body = b"".join([c async for c in stream_export(empty, [statement()], CSVEncoder())])
+    assert body.decode().strip() == "type,id,user_id,text,image_url,mcp_server,created_at,mcp_response"
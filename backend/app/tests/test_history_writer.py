@@ -0,0 +1,56 @@
+import uuid
+import pytest
+from sqlalchemy import Column, String, select, func
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import declarative_base
+from app.db.history_writer import HistoryWriter, HistoryQueueFull
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = "writer_rows"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    query = Column(String)
+
+
+async def make_engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_rows_are_batched_and_drained_on_close():
+    engine = await make_engine()
+    writer = HistoryWriter(engine, batch_size=50, flush_interval=0.02)
+    inserts = []
+    original = writer.insert_rows
+
+    async def counting_insert(table, rows):
+        inserts.append(len(rows))
+        await original(table, rows)
+
+    writer.insert_rows = counting_insert
+    writer.start()
+    for i in range(120):
+        await writer.submit(Row(id=str(i), query=f"q{i}"))
+    await writer.close()
+
+    async with engine.connect() as conn:
+        count = (await conn.execute(select(func.count()).select_from(Row.__table__))).scalar()
+    assert count == 120
+    assert sum(inserts) == 120
+    assert len(inserts) < 120
+    assert "history_rows_flushed_total 120" in writer.collect_metrics()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_without_fallback_raises():
+    engine = await make_engine()
+    writer = HistoryWriter(engine, max_queue=1, enqueue_timeout=0.01)
+    await writer.submit(Row(id="a", query="a"))
+    with pytest.raises(HistoryQueueFull):
+        await writer.submit(Row(id="b", query="b"))
+    assert "history_queue_depth 1" in writer.collect_metrics()
@@ -2,20 +2,26 @@ import pytest
 
 @pytest.mark.asyncio
 async def test_image_generation(client, redis_mock, monkeypatch):
+    calls = []
 
-    async def mock_call_tool(tool_name, params):
+    async def mock_call_tool(self, tool_name, arguments):
+        calls.append(tool_name)
         return {"result": {"url": "http://image.url/sample.png"}}
 
     monkeypatch.setattr("app.mcp.client.MCPClient.call_tool", mock_call_tool)
 
+    user_data = {"email": "imageuser@example.com", "password": "StrongPass1"}
+    await client.post("/api/v1/auth/register", json=user_data)
+    cookies = (await client.post("/api/v1/auth/login", json=user_data)).cookies
+
     data = {"prompt": "An astronaut riding a unicorn"}
-    res = await client.post("/api/v1/image/", json=data)
+    res = await client.post("/api/v1/image/", json=data, cookies=cookies)
     assert res.status_code == 201
     json_res = res.json()
     assert not json_res["cached"]
     assert "image_url" in json_res
 
-
-    res = await client.post("/api/v1/image/", json=data)
+    res = await client.post("/api/v1/image/", json=data, cookies=cookies)
     assert res.status_code == 201
-    assert res.json()["cached"]
\ No newline at end of file
+    assert res.json()["cached"]
+    assert len(calls) == 1
@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import os
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from sqlalchemy import Column, MetaData, String, Table, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.assets.images import ImageAssetStore, asset_path, store_files, thumbnail_path
+from app.assets.responses import asset_response, parse_range
+
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+)
+
+metadata = MetaData()
+images = Table(
+    "image_history", metadata,
+    Column("id", String, primary_key=True),
+    Column("image_url", String),
+    Column("asset_key", String),
+)
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=0-5,10-20", 100) is None
+
+
+@pytest.mark.asyncio
+async def test_asset_response_etag_and_range(tmp_path):
+    path = tmp_path / "asset.bin"
+    path.write_bytes(bytes(range(100)))
+    app = FastAPI()
+
+    @app.get("/asset")
+    async def serve(request: Request):
+        return asset_response(request, str(path), "abc", "application/octet-stream")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        full = await client.get("/asset")
+        assert full.status_code == 200 and full.headers["etag"] == '"abc"' and len(full.content) == 100
+
+        assert (await client.get("/asset", headers={"If-None-Match": '"abc"'})).status_code == 304
+
+        partial = await client.get("/asset", headers={"Range": "bytes=10-19"})
+        assert partial.status_code == 206
+        assert partial.headers["content-range"] == "bytes 10-19/100"
+        assert partial.content == bytes(range(10, 20))
+
+        assert (await client.get("/asset", headers={"Range": "bytes=200-"})).status_code == 416
+
+
+@pytest.mark.asyncio
+async def test_store_downloads_once_and_attaches_key(tmp_path):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+        await conn.execute(images.insert(), [{"id": str(i), "image_url": "http://img/1"} for i in range(3)])
+
+    downloads = []
+
+    def handler(request: httpx.Request):
+        downloads.append(str(request.url))
+        return httpx.Response(200, headers={"content-type": "image/png"}, content=PNG)
+
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    store = ImageAssetStore(str(tmp_path), engine, images, http)
+    store.on_rows("image_history", [{"id": str(i), "image_url": "http://img/1"} for i in range(3)])
+    await asyncio.gather(*store._tasks)
+
+    key = f"{hashlib.sha256(PNG).hexdigest()}.png"
+    assert downloads == ["http://img/1"]
+    assert os.path.exists(asset_path(str(tmp_path), key))
+    async with engine.connect() as conn:
+        assert {row.asset_key for row in (await conn.execute(select(images))).all()} == {key}
+    assert "image_assets_stored_total 1" in store.collect_metrics()
+    await store.close()
+
+
+def test_undecodable_image_keeps_the_full_asset(tmp_path):
+    pytest.importorskip("PIL")
+    data = b"\x89PNG\r\n\x1a\n not really a png"
+    key = hashlib.sha256(data).hexdigest() + ".png"
+    assert store_files(str(tmp_path), key, data, 64) is False
+    assert os.path.exists(asset_path(str(tmp_path), key))
+    assert not os.path.exists(thumbnail_path(str(tmp_path), key))
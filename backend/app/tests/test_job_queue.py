@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from app.jobs.queue import FAILED, SUCCEEDED, JobQueue
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.published = []
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+async def finished(queue, job_id, user_id):
+    for _ in range(200):
+        job = await queue.get(job_id, user_id)
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+@pytest.mark.asyncio
+async def test_same_prompt_reuses_job_and_retries_until_success():
+    calls = []
+
+    async def runner(user_id, payload):
+        calls.append(payload["prompt"])
+        if len(calls) < 2:
+            raise RuntimeError("flaky upstream")
+        return {"image_url": "https://img/1.png", "saved_id": "s1", "cached": False}
+
+    queue = JobQueue(FakeRedis(), runner, workers=2, backoff=0.01)
+    queue.start()
+    try:
+        job, created = await queue.submit("u1", {"prompt": "a cat"}, dedup="d1")
+        again, created_again = await queue.submit("u1", {"prompt": "a cat"}, dedup="d1")
+        assert created and not created_again
+        assert again["id"] == job["id"]
+
+        done = await finished(queue, job["id"], "u1")
+        assert done["status"] == SUCCEEDED
+        assert done["attempts"] == 2
+        assert done["result"]["image_url"] == "https://img/1.png"
+        assert calls == ["a cat", "a cat"]
+        metrics = queue.collect_metrics()
+        assert 'jobs_completed_total{queue="image"} 1' in metrics
+        assert 'jobs_retried_total{queue="image"} 1' in metrics
+        # another user cannot see the job
+        assert await queue.get(job["id"], "u2") is None
+    finally:
+        await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_job_fails_after_max_attempts_and_can_be_resubmitted():
+    async def runner(user_id, payload):
+        raise RuntimeError("upstream down")
+
+    redis = FakeRedis()
+    queue = JobQueue(redis, runner, workers=1, max_attempts=2, backoff=0.01)
+    queue.start()
+    try:
+        job, _ = await queue.submit("u1", {"prompt": "a dog"}, dedup="d2")
+        done = await finished(queue, job["id"], "u1")
+        assert done["status"] == FAILED
+        assert done["attempts"] == 2
+        assert done["error"] == "upstream down"
+        assert redis.published == [(f"jobs:image:done:{job['id']}", FAILED)]
+
+        retry, created = await queue.submit("u1", {"prompt": "a dog"}, dedup="d2")
+        assert created and retry["id"] != job["id"]
+    finally:
+        await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_abandoned_jobs_do_not_hold_the_dedup_key():
+    from app.core.redis import InMemoryRedis
+
+    async def runner(user_id, payload):
+        return {"image_url": "https://img/2.png"}
+
+    redis = InMemoryRedis()
+    # a worker that exited with the job still queued
+    dead = JobQueue(redis, runner, workers=1, max_queue=1)
+    job, _ = await dead.submit("u1", {"prompt": "a fox"}, dedup="d3")
+
+    restarted = JobQueue(redis, runner, workers=1, lease=0)
+    replacement, created = await restarted.submit("u1", {"prompt": "a fox"}, dedup="d3")
+    assert created and replacement["id"] != job["id"]
+    assert (await restarted.get(job["id"], "u1"))["status"] == FAILED
+
+    # a retry dropped on a full queue fails the job instead of leaving it pending
+    stuck = {**job, "id": "stuck", "status": "pending", "error": "flaky"}
+    await dead._save(stuck)
+    dead._requeue("stuck")
+    await asyncio.gather(*dead._abandoning)
+    failed = await dead.get("stuck", "u1")
+    assert failed["status"] == FAILED and "queue is full" in failed["error"]
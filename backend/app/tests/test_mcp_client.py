@@ -0,0 +1,67 @@
+import json
+import httpx
+import pytest
+from app.mcp.client import MCPClient, MCPEvent
+from app.mcp.registry import MCPClientRegistry
+
+
+@pytest.mark.asyncio
+async def test_call_tool_uses_shared_transport():
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(json.loads(request.content))
+        return httpx.Response(200, json={"result": {"items": ["a"]}})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        client = MCPClient("http://mcp.test/mcp", api_key="k", http=http)
+        first = await client.call_tool("tavily-search", {"query": "x"})
+        await client.call_tool("tavily-search", {"query": "y"})
+
+    assert first == {"result": {"items": ["a"]}}
+    assert [body["params"]["arguments"]["query"] for body in seen] == ["x", "y"]
+    assert all(body["method"] == "tools/call" for body in seen)
+
+
+@pytest.mark.asyncio
+async def test_registry_register_and_close():
+    registry = MCPClientRegistry()
+    client = registry.register("tavily", "http://mcp.test/mcp", timeout=5)
+    assert registry.get("tavily") is client
+    assert client.http is not None
+
+    await registry.close()
+    assert client.http.is_closed
+    with pytest.raises(KeyError):
+        registry.get("tavily")
+
+
+@pytest.mark.asyncio
+async def test_stream_tool_yields_progress_then_result():
+    def handler(request: httpx.Request):
+        body = json.loads(request.content)
+        token = body["params"]["_meta"]["progressToken"]
+        progress = {"jsonrpc": "2.0", "method": "notifications/progress", "params": {"progressToken": token, "progress": 1, "total": 2}}
+        result = {"jsonrpc": "2.0", "id": body["id"], "result": {"url": "http://img/1.png"}}
+        stream = f"data: {json.dumps(progress)}\n\ndata: {json.dumps(result)}\n\n"
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=stream.encode())
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        client = MCPClient("http://mcp.test/mcp", http=http)
+        events = [event async for event in client.stream_tool("generateImageUrl", {"prompt": "cat"})]
+
+    assert [event.kind for event in events] == ["progress", "result"]
+    assert events[0].data["progress"] == 1
+    assert events[1].data["result"] == {"url": "http://img/1.png"}
+
+
+@pytest.mark.asyncio
+async def test_stream_tool_falls_back_to_plain_json():
+    def handler(request: httpx.Request):
+        return httpx.Response(200, json={"result": {"items": []}})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        client = MCPClient("http://mcp.test/mcp", http=http)
+        events = [event async for event in client.stream_tool("tavily-search", {"query": "x"})]
+
+    assert events == [MCPEvent("result", {"result": {"items": []}})]
@@ -0,0 +1,83 @@
+import threading
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from app.core.metrics import STAGE_SECONDS, Counter, Histogram, MetricsMiddleware, MetricsRegistry, handler_for, stage
+from app.core.profiler import SamplingProfiler
+
+
+def test_render_prometheus_text_format():
+    registry = MetricsRegistry()
+    hits = registry.register(Counter("cache_hits_total", "Hits.", ("tier",)))
+    latency = registry.register(Histogram("op_seconds", "Latency.", buckets=(0.1, 1.0)))
+    hits.inc(tier="local")
+    hits.inc(2, tier="local")
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+    registry.add_collector("extra", lambda: ['extra_value{name="a\\"b"} 1'])
+
+    lines = registry.render().splitlines()
+    assert "# TYPE cache_hits_total counter" in lines
+    assert 'cache_hits_total{tier="local"} 3' in lines
+    assert 'op_seconds_bucket{le="0.1"} 1' in lines
+    assert 'op_seconds_bucket{le="1.0"} 2' in lines
+    assert 'op_seconds_bucket{le="+Inf"} 3' in lines
+    assert "op_seconds_count 3" in lines
+    assert "op_seconds_sum 5.55" in lines
+    assert lines[-1] == 'extra_value{name="a\\"b"} 1'
+
+
+def test_handler_for_paths():
+    assert handler_for("/search/batch") == "search"
+    assert handler_for("/api/v1/dashboard/timeline") == "dashboard"
+    assert handler_for("/docs") == "other"
+    assert handler_for("/") == "other"
+
+
+@pytest.mark.asyncio
+async def test_stages_are_labelled_with_the_request_handler():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/image/probe")
+    async def probe():
+        with stage("probe_stage"):
+            return {"ok": True}
+
+    before = STAGE_SECONDS.count(handler="image", stage="probe_stage")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.get("/image/probe")
+    assert resp.status_code == 200
+    assert STAGE_SECONDS.count(handler="image", stage="probe_stage") == before + 1
+    # outside a request the stage is attributed to background work
+    with stage("probe_stage"):
+        pass
+    assert STAGE_SECONDS.count(handler="background", stage="probe_stage") >= 1
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampling_profiler_collects_collapsed_stacks():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,))
+    worker.start()
+    profiler = SamplingProfiler(interval=0.001)
+    try:
+        profiler.start(thread_id=worker.ident)
+        assert profiler.running
+        deadline = time.monotonic() + 2
+        while profiler.samples < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+
+    assert not profiler.running
+    assert profiler.samples >= 5
+    assert "test_metrics:busy_loop" in profiler.collapsed()
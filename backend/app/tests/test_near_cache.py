@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from app.cache.near import NearCache
+from app.core.redis import InMemoryRedis, create_redis
+
+
+async def started(near: NearCache) -> NearCache:
+    near.start()
+    for _ in range(100):
+        if near.tracking:
+            return near
+        await asyncio.sleep(0)
+    raise AssertionError("tracking never came up")
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_in_memory_redis_covers_the_commands_the_app_uses():
+    redis = create_redis("memory://")
+    assert isinstance(redis, InMemoryRedis)
+    assert await redis.set("lock", "a", px=10_000, nx=True)
+    assert await redis.set("lock", "b", nx=True) is None
+    assert await redis.incr("version") == 1
+    pipe = redis.pipeline(transaction=False)
+    pipe.hset("page", mapping={"etag": '"x"', "body": b"{}"})
+    pipe.expire("page", 0)
+    pipe.incr("version")
+    await pipe.execute()
+    assert await redis.hgetall("page") == {}
+    assert await redis.mget(["lock", "version", "missing"]) == ["a", "2", None]
+
+    pubsub = redis.pubsub()
+    await pubsub.subscribe("events")
+    assert await redis.publish("events", "hello") == 1
+    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+    assert message["data"] == "hello"
+    await pubsub.close()
+
+
+@pytest.mark.asyncio
+async def test_writes_from_any_worker_invalidate_the_near_cache():
+    redis = InMemoryRedis()
+    worker_a = await started(NearCache(redis, redis, ["dashboard:version:"]))
+    worker_b = await started(NearCache(redis, redis, ["dashboard:version:"]))
+
+    assert await worker_a.get("dashboard:version:u1") is None
+    await redis.set("dashboard:version:u1", 1)
+    await settle()
+    assert await worker_a.get("dashboard:version:u1") == "1"
+    assert worker_a._local.get("dashboard:version:u1") == "1"
+
+    # another worker's pipelined bump reaches worker_a as an invalidation message
+    pipe = worker_b.pipeline(transaction=False)
+    pipe.incr("dashboard:version:u1")
+    await pipe.execute()
+    await settle()
+    assert worker_a._local.get("dashboard:version:u1") is None
+    assert await worker_a.get("dashboard:version:u1") == "2"
+    assert worker_a.invalidations >= 2
+
+    # batched reads: cached keys locally, the rest in one MGET; untracked keys pass through
+    await redis.set("other", "x")
+    assert await worker_b.mget(["dashboard:version:u1", "other", "dashboard:version:u2"]) == ["2", "x", None]
+    assert worker_b._local.get("other", "absent") == "absent"
+
+    await worker_a.close()
+    await worker_b.close()
+
+
+@pytest.mark.asyncio
+async def test_own_writes_are_visible_immediately_and_nothing_is_cached_untracked():
+    redis = InMemoryRedis()
+    near = NearCache(redis, redis, ["mcp:result:"])
+    # listener not started: reads go straight to Redis
+    await redis.set("mcp:result:a", "v1")
+    assert await near.get("mcp:result:a") == "v1"
+    assert len(near._local) == 0
+
+    await started(near)
+    assert await near.get("mcp:result:a") == "v1"
+    await near.set("mcp:result:a", "v2")
+    assert await near.get("mcp:result:a") == "v2"
+    await redis.flushall()
+    await settle()
+    assert await near.get("mcp:result:a") is None
+    await near.close()
@@ -0,0 +1,44 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, select
+from app.db.pagination import cursor_time, encode_cursor, decode_cursor, keyset_columns_page, split_page, InvalidCursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    entry_id = uuid.uuid4()
+    assert decode_cursor(encode_cursor(created_at, entry_id)) == (created_at, entry_id)
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor")
+
+
+def test_split_page_emits_cursor_only_when_more_rows_exist():
+    rows = [SimpleNamespace(created_at=datetime(2024, 1, i + 1), id=uuid.uuid4()) for i in range(3)]
+    page, cursor = split_page(rows, 3)
+    assert len(page) == 3 and cursor is None
+
+    page, cursor = split_page(rows, 2)
+    assert len(page) == 2
+    assert decode_cursor(cursor) == (rows[1].created_at, rows[1].id)
+
+
+def test_cursor_matches_the_column_timezone():
+    metadata = MetaData()
+    naive = Table("image_history", metadata, Column("id", Integer), Column("created_at", DateTime()))
+    aware = Table("search_history", metadata, Column("id", Integer), Column("created_at", DateTime(timezone=True)))
+    # the merged timeline hands back a timestamptz; the image branch compares it to a TIMESTAMP
+    created_at = datetime(2024, 5, 1, 14, 30, tzinfo=timezone(timedelta(hours=2)))
+    cursor = encode_cursor(created_at, uuid.uuid4())
+
+    for table, expected in ((naive, datetime(2024, 5, 1, 12, 30)), (aware, created_at)):
+        statement = keyset_columns_page(select(table.c.id), table.c.created_at, table.c.id, cursor, 10)
+        params = statement.compile().params
+        value = next(v for v in params.values() if isinstance(v, datetime))
+        assert value == expected and (value.tzinfo is None) == (table is naive)
+
+    assert cursor_time(datetime(2024, 5, 1, 12, 30), aware.c.created_at).tzinfo is timezone.utc
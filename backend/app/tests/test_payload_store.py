@@ -0,0 +1,60 @@
+import uuid
+import pytest
+from sqlalchemy import JSON, Column, Integer, LargeBinary, MetaData, String, Table, func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.db.history_writer import HistoryWriter
+from app.db.payload_store import PayloadStore, decode_payload, payload_digest
+
+metadata = MetaData()
+payloads = Table(
+    "mcp_payloads", metadata,
+    Column("digest", String, primary_key=True),
+    Column("codec", String, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("data", LargeBinary, nullable=False),
+)
+history = Table(
+    "history", metadata,
+    Column("id", String, primary_key=True),
+    Column("mcp_response", JSON),
+    Column("payload_digest", String),
+)
+
+
+async def make_engine():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+    return engine
+
+
+def test_digest_ignores_key_order_and_blob_round_trips():
+    store = PayloadStore(payloads, codec="gzip")
+    blob = store.encode({"b": [1, 2], "a": "x"})
+    assert blob.digest == payload_digest({"a": "x", "b": [1, 2]})
+    assert decode_payload(blob.codec, blob.data) == {"a": "x", "b": [1, 2]}
+
+
+def test_externalize_dedups_and_leaves_input_untouched():
+    store = PayloadStore(payloads, codec="gzip")
+    rows = [{"id": str(i), "mcp_response": {"same": True}, "payload_digest": None} for i in range(3)]
+    out, blobs = store.externalize(rows)
+    assert len(blobs) == 1
+    assert all(row["mcp_response"] is None and row["payload_digest"] == blobs[0].digest for row in out)
+    assert rows[0]["mcp_response"] == {"same": True}
+
+
+@pytest.mark.asyncio
+async def test_writer_stores_each_payload_once():
+    engine = await make_engine()
+    store = PayloadStore(payloads, codec="gzip", dialect="sqlite")
+    writer = HistoryWriter(engine, payloads=store)
+    for _ in range(2):
+        rows = [{"id": str(uuid.uuid4()), "mcp_response": {"results": ["a"] * 100}, "payload_digest": None} for _ in range(3)]
+        await writer.insert_rows(history, rows)
+
+    async with engine.connect() as conn:
+        assert (await conn.execute(select(func.count()).select_from(payloads))).scalar() == 1
+        digests = (await conn.execute(select(history.c.payload_digest, history.c.mcp_response))).all()
+        assert len(digests) == 6 and all(d == digests[0][0] and r is None for d, r in digests)
+        assert await store.load(conn, digests[0][0]) == {"results": ["a"] * 100}
@@ -0,0 +1,53 @@
+import asyncio
+import time
+import uuid
+import pytest
+from app.cache.principal import Principal, PrincipalCache
+from app.core.redis import InMemoryRedis
+
+
+class RecordingRedis:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+def test_token_is_not_cached_past_its_expiry():
+    cache = PrincipalCache(ttl=60)
+    cache.remember_token("expired", "u1", expires_at=time.time() - 1)
+    cache.remember_token("valid", "u1", expires_at=time.time() + 3600)
+    assert cache.user_id_for("expired") is None
+    assert cache.user_id_for("valid") == "u1"
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_principal_and_broadcasts():
+    redis = RecordingRedis()
+    cache = PrincipalCache(redis)
+    user_id = uuid.uuid4()
+    cache.put(Principal(id=user_id, email="a@example.com", is_active=True, is_admin=False))
+    assert cache.get(str(user_id)).email == "a@example.com"
+
+    await cache.invalidate(user_id)
+    assert cache.get(str(user_id)) is None
+    assert redis.published == [("auth:principal:invalidate", str(user_id))]
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers():
+    redis = InMemoryRedis()
+    worker_a, worker_b = PrincipalCache(redis), PrincipalCache(redis)
+    worker_b.start()
+    await asyncio.sleep(0)
+    user_id = uuid.uuid4()
+    principal = Principal(id=user_id, email="a@example.com", is_active=True, is_admin=False)
+    worker_a.put(principal)
+    worker_b.put(principal)
+
+    await worker_a.invalidate(user_id)
+    await asyncio.sleep(0.01)
+    assert worker_a.get(str(user_id)) is None
+    assert worker_b.get(str(user_id)) is None
+    await worker_b.close()
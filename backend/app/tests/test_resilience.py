@@ -0,0 +1,87 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.mcp.admission import AdmissionController
+from app.mcp.client import MCPClient
+from app.mcp.resilience import CircuitBreaker, CircuitOpen, UpstreamGuard, CLOSED, HALF_OPEN, OPEN
+
+
+def test_breaker_opens_then_half_opens_and_closes_on_probe_success():
+    breaker = CircuitBreaker("tavily", failure_threshold=2, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.acquire()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.acquire()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    breaker.acquire()
+    with pytest.raises(CircuitOpen):
+        breaker.acquire()  # only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_adaptive_timeout_follows_p99_within_bounds():
+    guard = UpstreamGuard("tavily", max_timeout=30, min_timeout=0.5, timeout_multiplier=3, min_samples=10)
+    assert guard.timeout() == 30
+    for _ in range(20):
+        guard.latency.observe(0.4)
+    assert guard.timeout() == pytest.approx(1.2)
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_over_slow_primary():
+    guard = UpstreamGuard("tavily", max_timeout=5, min_samples=1, hedge_tools=["tavily-search"])
+    guard.latency.observe(0.01)
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(1 if len(calls) == 1 else 0)
+        return len(calls)
+
+    assert await guard.call("tavily-search", fn) == 2
+    assert guard.hedged == 1 and guard.hedge_wins == 1
+
+
+@pytest.mark.asyncio
+async def test_client_fails_fast_once_breaker_is_open():
+    hits = []
+
+    def handler(request: httpx.Request):
+        hits.append(1)
+        return httpx.Response(503)
+
+    guard = UpstreamGuard("flux", max_timeout=5, breaker=CircuitBreaker("flux", failure_threshold=2, reset_timeout=60))
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+        client = MCPClient("http://mcp.test/mcp", http=http, guard=guard)
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.call_tool("generateImageUrl", {"prompt": "x"})
+        with pytest.raises(CircuitOpen) as exc:
+            await client.call_tool("generateImageUrl", {"prompt": "x"})
+
+    assert len(hits) == 2
+    assert exc.value.retry_after > 0
+    assert guard.snapshot()["breaker"]["state"] == OPEN
+
+
+@pytest.mark.asyncio
+async def test_hedge_takes_its_own_admission_slot_or_is_skipped():
+    async def fn():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    for max_concurrency, hedged in ((1, 0), (2, 1)):
+        guard = UpstreamGuard("tavily", max_timeout=5, min_samples=1, hedge_tools=["tavily-search"])
+        guard.latency.observe(0.001)
+        admission = AdmissionController("tavily", max_concurrency=max_concurrency)
+        async with admission.slot():
+            assert await guard.call("tavily-search", fn, admission.reserve) == "ok"
+            assert guard.hedged == hedged and guard.hedges_skipped == 1 - hedged
+        await asyncio.sleep(0.06)
+        assert admission.snapshot()["active"] == 0
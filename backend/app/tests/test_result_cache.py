@@ -0,0 +1,148 @@
+import asyncio
+import time
+import pytest
+from app.cache.local import LocalTTLCache
+from app.cache.normalize import normalize_query, content_digest
+from app.cache.refresh import BackgroundRefresher
+from app.cache.result_cache import ResultCache, CachePolicy
+
+
+class DictRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def mget(self, keys):
+        return [self.store.get(key) for key in keys]
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    def pipeline(self, transaction=True):
+        return DictPipeline(self)
+
+
+class DictPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def set(self, key, value, ex=None):
+        self.ops.append((key, value))
+
+    async def execute(self):
+        for key, value in self.ops:
+            self.redis.store[key] = value
+
+
+def test_normalization_collapses_case_whitespace_and_width():
+    assert normalize_query("  Python\t WEB  ") == "python web"
+    assert normalize_query("ｐｙｔｈｏｎ") == "python"
+    assert content_digest(" Python ") == content_digest("python")
+    assert normalize_query(" Python ", casefold=False) == "Python"
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalTTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_local_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LocalTTLCache(maxsize=8, ttl=30)
+    cache.set("k", "v", ttl=10)
+    now[0] += 9
+    assert cache.get("k") == "v"
+    now[0] += 2
+    assert cache.get("k") is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_result_cache_is_shared_and_goes_stale(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = ResultCache(DictRedis(), policies={"tavily-search": CachePolicy(fresh_ttl=60, stale_ttl=600)})
+
+    await cache.set("tavily-search", cache.digest("Python"), {"items": [1]})
+    entry = await cache.get("tavily-search", cache.digest("  python "))
+    assert entry.value == {"items": [1]} and not entry.stale
+
+    now[0] += 120
+    entry = await cache.get("tavily-search", cache.digest("python"))
+    assert entry.stale
+
+    now[0] += 600
+    assert await cache.get("tavily-search", cache.digest("python")) is None
+
+
+@pytest.mark.asyncio
+async def test_refresher_runs_each_key_once():
+    refresher = BackgroundRefresher(max_concurrency=2, max_pending=10)
+    runs = []
+
+    async def refresh():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+
+    assert refresher.schedule("k", refresh)
+    assert not refresher.schedule("k", refresh)
+    await asyncio.sleep(0.05)
+    assert runs == [1]
+    assert refresher.pending() == 0
+
+
+@pytest.mark.asyncio
+async def test_get_many_reads_local_tier_then_one_mget():
+    redis = DictRedis()
+    writer = ResultCache(redis)
+    await writer.set_many("tavily-search", {"a": 1, "b": 2})
+
+    reader = ResultCache(redis, local=LocalTTLCache(maxsize=8, ttl=60))
+    await reader.get("tavily-search", "a")
+    calls = []
+    original = redis.mget
+
+    async def counting_mget(keys):
+        calls.append(keys)
+        return await original(keys)
+
+    redis.mget = counting_mget
+    entries = await reader.get_many("tavily-search", ["a", "b", "c"])
+    assert {d: e.value for d, e in entries.items()} == {"a": 1, "b": 2}
+    assert len(calls) == 1 and len(calls[0]) == 2
+
+
+@pytest.mark.asyncio
+async def test_lookup_fetches_result_and_saved_id_together():
+    redis = DictRedis()
+    cache = ResultCache(redis)
+    digest = cache.digest("python")
+    assert await cache.lookup("tavily-search", "u1", digest) == (None, None)
+
+    await cache.set("tavily-search", digest, {"results": []})
+    await cache.set_saved_id("tavily-search", "u1", digest, "s1")
+    entry, saved_id = await cache.lookup("tavily-search", "u1", digest)
+    assert entry.value == {"results": []} and not entry.stale
+    assert saved_id == "s1"
+    assert (await cache.lookup("tavily-search", "u2", digest))[1] is None
+
+
+@pytest.mark.asyncio
+async def test_an_empty_local_cache_is_kept():
+    # an empty LocalTTLCache has len 0 and is falsy; it must still be used
+    local = LocalTTLCache(maxsize=8, ttl=60)
+    cache = ResultCache(DictRedis(), local=local)
+    assert cache.local is local
+
+    await cache.set("tavily-search", "a", {"items": []})
+    assert len(local) == 1
@@ -1,21 +1,28 @@
 import pytest
-from app.schemas import search as search_schemas
 
 @pytest.mark.asyncio
 async def test_search_endpoint(client, redis_mock, monkeypatch):
+    calls = []
 
-    async def mock_call_tool(tool_name, params):
+    async def mock_call_tool(self, tool_name, arguments):
+        calls.append(tool_name)
         return {"result": {"items": ["result1", "result2"]}}
 
     monkeypatch.setattr("app.mcp.client.MCPClient.call_tool", mock_call_tool)
 
+    user_data = {"email": "searchuser@example.com", "password": "StrongPass1"}
+    await client.post("/api/v1/auth/register", json=user_data)
+    cookies = (await client.post("/api/v1/auth/login", json=user_data)).cookies
+
     data = {"query": "quantum computing"}
-    res = await client.post("/api/v1/search/", json=data)
+    res = await client.post("/api/v1/search/", json=data, cookies=cookies)
     assert res.status_code == 200
     assert res.json()["cached"] is False
     assert "result" in res.json()
 
-
-    res = await client.post("/api/v1/search/", json=data)
+    # served from the shared result cache in app.state.redis
+    res = await client.post("/api/v1/search/", json={"query": "  Quantum  Computing "}, cookies=cookies)
     assert res.status_code == 200
-    assert res.json()["cached"] is True
\ No newline at end of file
+    assert res.json()["cached"] is True
+    assert calls == ["tavily-search"]
+    assert await redis_mock.keys("mcp:result:tavily-search:*")
@@ -1,15 +1,45 @@
+import asyncio
+import threading
 import pytest
-from app.core.security import hash_password, verify_password, create_access_token, decode_token
+from app.core.security import PasswordHasher, PasswordHasherBusy, hash_password, verify_password, verify_and_update_password, create_access_token, decode_token, pwd_context
 from app.core.config import settings
 import time
 
-def test_hash_and_verify():
+@pytest.mark.asyncio
+async def test_hash_and_verify():
     pw = "strong-password-123"
-    h = hash_password(pw)
-    assert verify_password(pw, h) is True
-    assert verify_password("wrong", h) is False
+    h = await hash_password(pw)
+    assert await verify_password(pw, h) is True
+    assert await verify_password("wrong", h) is False
 
 def test_jwt_create_and_decode():
     token = create_access_token("user-id-123", expires_minutes=1)
     payload = decode_token(token)
     assert payload and payload.get("sub") == "user-id-123"
+
+
+@pytest.mark.asyncio
+async def test_legacy_bcrypt_hash_is_upgraded_on_verify():
+    legacy = pwd_context.handler("bcrypt").using(rounds=4).hash("strong-password-123")
+    valid, new_hash = await verify_and_update_password("strong-password-123", legacy)
+    assert valid
+    assert new_hash and new_hash.startswith("$argon2")
+    valid, again = await verify_and_update_password("strong-password-123", new_hash)
+    assert valid and again is None
+
+
+@pytest.mark.asyncio
+async def test_hasher_exports_queue_depth_and_rejections():
+    hasher = PasswordHasher(max_workers=1, max_pending=2)
+    release = threading.Event()
+    calls = [asyncio.ensure_future(hasher._submit(release.wait)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    lines = hasher.collect_metrics()
+    assert "password_hash_in_flight 2" in lines
+    assert "password_hash_queue_depth 1" in lines
+    assert "password_hash_rejected_total 1" in lines
+    release.set()
+    results = await asyncio.gather(*calls, return_exceptions=True)
+    assert sum(isinstance(r, PasswordHasherBusy) for r in results) == 1
+    assert "password_hash_in_flight 0" in hasher.collect_metrics()
+    hasher.shutdown()
@@ -0,0 +1,43 @@
+import os
+import pytest
+from app.cache.semantic import SemanticCache, HashedNgramEmbedder, VectorIndex
+
+
+def make_cache(threshold=0.85, capacity=100):
+    return SemanticCache(HashedNgramEmbedder(dim=512), VectorIndex(512, capacity), threshold)
+
+
+@pytest.mark.asyncio
+async def test_reordered_query_is_a_near_duplicate():
+    cache = make_cache()
+    assert await cache.lookup("anything") is None
+    cache.add("best python web framework", "d1")
+    cache.add("rust async runtime", "d2")
+
+    match = await cache.lookup("python best web frameworks")
+    assert match.digest == "d1"
+    assert cache.is_hit(match)
+    assert not cache.is_hit(await cache.lookup("weather in paris"))
+
+
+def test_index_round_trips_through_disk(tmp_path):
+    cache = make_cache()
+    cache.add("best python web framework", "d1")
+    cache.add("rust async runtime", "d2")
+    cache.discard("d2")
+    path = str(tmp_path / "semantic.npz")
+    cache.index.save(path)
+
+    warm = make_cache()
+    assert warm.index.load(path) == 1
+    assert warm.index.nearest(warm.embedder.embed("python best web frameworks")).digest == "d1"
+    assert sorted(os.listdir(tmp_path)) == ["semantic.npz"]
+
+
+def test_full_index_overwrites_oldest_rows():
+    cache = make_cache(capacity=2)
+    cache.add("first query", "a")
+    cache.add("second query", "b")
+    cache.add("third query", "c")
+    assert len(cache.index) == 2
+    assert cache.index.nearest(cache.embedder.embed("first query")).digest != "a"
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from app.core.redis import InMemoryRedis
+from app.core.singleflight import SingleFlight
+from app.mcp.resilience import UpstreamUnavailable
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_share_one_call():
+    sf = SingleFlight()
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"result": {"items": ["r1"]}}
+
+    results = await asyncio.gather(*[sf.do("tavily-search:python", upstream) for _ in range(20)])
+
+    assert calls == 1
+    assert all(r == {"result": {"items": ["r1"]}} for r in results)
+    assert sf.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_failure_propagates_to_all_waiters_and_is_not_cached():
+    sf = SingleFlight()
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*[sf.do("k", failing) for _ in range(5)], return_exceptions=True)
+    assert calls == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    async def ok():
+        return 1
+
+    assert await sf.do("k", ok) == 1
+
+
+@pytest.mark.asyncio
+async def test_follower_in_another_worker_gets_the_leaders_503():
+    redis = InMemoryRedis()
+    leader, follower = SingleFlight(redis), SingleFlight(redis)
+    started = asyncio.Event()
+
+    async def shed():
+        started.set()
+        await asyncio.sleep(0.02)
+        raise UpstreamUnavailable("MCP upstream 'tavily' is overloaded", 7.0)
+
+    async def never():
+        raise AssertionError("follower must not call the upstream")
+
+    leading = asyncio.ensure_future(leader.do("tavily-search:python", shed))
+    await started.wait()
+    with pytest.raises(UpstreamUnavailable) as exc:
+        await follower.do("tavily-search:python", never)
+    assert exc.value.status_code == 503 and exc.value.retry_after == 7.0
+    with pytest.raises(UpstreamUnavailable):
+        await leading
@@ -0,0 +1,64 @@
+import uuid
+from sqlalchemy import Column, String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import declarative_base
+from app.db.text_search import InvertedIndexTextSearch, PostgresTextSearch
+
+Base = declarative_base()
+
+
+class SearchRow(Base):
+    __tablename__ = "search_history"
+    id = Column(postgresql.UUID(as_uuid=True), primary_key=True)
+    query = Column(String)
+
+
+def test_inverted_index_prefix_and_all_terms():
+    index = InvertedIndexTextSearch()
+    a, b, c = (str(uuid.uuid4()) for _ in range(3))
+    index.index_rows("search_history", [
+        {"id": a, "query": "Python web frameworks"},
+        {"id": b, "query": "python packaging"},
+        {"id": c, "query": "Rust web servers"},
+    ])
+
+    assert index.lookup("search_history", "pyth") == {a, b}
+    assert index.lookup("search_history", "web PYTHON") == {a}
+    assert index.lookup("search_history", "golang") == set()
+    assert index.lookup("search_history", "!!") is None
+
+    index.remove("search_history", a)
+    assert index.lookup("search_history", "web") == {c}
+    assert index.lookup("search_history", "frame") == set()
+
+
+def test_inverted_index_only_matches_the_users_own_rows():
+    index = InvertedIndexTextSearch()
+    mine, theirs = str(uuid.uuid4()), str(uuid.uuid4())
+    index.index_rows("search_history", [
+        {"id": mine, "user_id": "u1", "query": "python tips"},
+        {"id": theirs, "user_id": "u2", "query": "python jobs"},
+    ])
+
+    assert index.lookup("search_history", "python", "u1") == {mine}
+    assert index.lookup("search_history", "python", "u3") == set()
+    assert index.lookup("search_history", "python") == {mine, theirs}
+
+    index.remove("search_history", theirs)
+    assert index.lookup("search_history", "pyth", "u2") == set()
+    assert index.lookup("search_history", "python") == {mine}
+
+
+def test_postgres_match_uses_indexed_expression_with_prefix_terms():
+    clause = PostgresTextSearch().match(SearchRow, "web py")
+    sql = str(clause.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    assert "to_tsvector('simple', search_history.query) @@ to_tsquery('simple', 'web:* & py:*')" in sql
+
+
+def test_punctuation_only_keyword_still_filters():
+    for backend in (PostgresTextSearch(), InvertedIndexTextSearch()):
+        clause = backend.match(SearchRow, "!%-")
+        assert clause is not None
+        compiled = clause.compile(dialect=postgresql.dialect())
+        assert "search_history.query LIKE" in str(compiled)
+        assert list(compiled.params.values()) == ["!/%-"]
@@ -0,0 +1,51 @@
+import random
+from typing import List
+
+# total history rows per scale; users get an equal share, 3 searches per image
+SCALES = {"small": 1_000, "medium": 100_000, "large": 1_000_000}
+USERS = {"small": 10, "medium": 100, "large": 1_000}
+
+PASSWORD = "bench-password"
+
+_SUBJECTS = (
+    "python", "postgres", "redis", "fastapi", "kubernetes", "react", "rust", "vector search", "http/2", "asyncio",
+    "event loop", "connection pool", "jwt", "zstd", "prometheus", "docker", "nginx", "tls", "websockets", "graphql",
+)
+_ANGLES = (
+    "performance tuning", "best practices", "benchmarks", "memory usage", "latency", "tutorial", "internals",
+    "vs alternatives", "in production", "common pitfalls", "configuration", "scaling", "monitoring", "security",
+)
+_STYLES = ("watercolor", "isometric", "pixel art", "photorealistic", "line drawing", "low poly", "oil painting")
+_THINGS = ("lighthouse", "robot", "city skyline", "forest", "teapot", "mountain lake", "fox", "spaceship", "library")
+
+
+def user_email(i: int) -> str:
+    return f"bench{i}@example.com"
+
+
+def query_pool(n: int, seed: int = 1) -> List[str]:
+    # stable list: the same seed gives the same queries in the seeder and the load generator
+    rng = random.Random(seed)
+    return [f"{rng.choice(_SUBJECTS)} {rng.choice(_ANGLES)} {i}" for i in range(n)]
+
+
+def prompt_pool(n: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed + 1)
+    return [f"a {rng.choice(_STYLES)} {rng.choice(_THINGS)} #{i}" for i in range(n)]
+
+
+class ZipfPicker:
+    # rank r is picked with probability proportional to 1 / r**s; s around 1 gives
+    # the long tail of repeated queries that caches feed on, s = 0 is uniform
+    def __init__(self, items: List[str], s: float, rng: random.Random):
+        self.items = items
+        self.rng = rng
+        weights = [1 / (rank ** s) for rank in range(1, len(items) + 1)]
+        total = 0.0
+        self.cumulative = []
+        for weight in weights:
+            total += weight
+            self.cumulative.append(total)
+
+    def pick(self) -> str:
+        return self.rng.choices(self.items, cum_weights=self.cumulative)[0]
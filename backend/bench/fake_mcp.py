@@ -0,0 +1,195 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+TAVILY = "tavily"
+FLUX = "flux"
+
+TOOLS = {TAVILY: "tavily-search", FLUX: "generateImageUrl"}
+
+
+# "fixed:0.1", "uniform:0.05:0.3", "exp:0.1" (mean) or "lognormal:0.2:0.5"
+# (median seconds, sigma); heavy-tailed lognormal is closest to real upstreams
+class LatencyModel:
+    def __init__(self, spec: str, rng: random.Random):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        self.rng = rng
+        expected = {"fixed": 1, "uniform": 2, "exp": 1, "lognormal": 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"invalid latency spec {spec!r}")
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            return p[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(p[0], p[1])
+        if self.kind == "exp":
+            return self.rng.expovariate(1 / p[0]) if p[0] > 0 else 0.0
+        return self.rng.lognormvariate(0, p[1]) * p[0]
+
+
+@dataclass
+class FakeMCPConfig:
+    tool: str = TAVILY
+    latency: str = "lognormal:0.2:0.5"
+    # fraction of calls answered with error_status instead of a result
+    error_rate: float = 0.0
+    error_status: int = 500
+    # approximate size of each search result's content, in bytes
+    payload_bytes: int = 2048
+    results: int = 5
+    # progress notifications sent before the result on SSE requests
+    progress_steps: int = 3
+    image_size: int = 512
+    seed: int = 1
+    public_url: str = "http://127.0.0.1:9002"
+    calls: int = field(default=0, init=False)
+    errors: int = field(default=0, init=False)
+
+
+def png_bytes(width: int, height: int, seed: str) -> bytes:
+    # solid-colour RGB PNG; deterministic per seed so asset dedup behaves like production
+    color = hashlib.sha256(seed.encode()).digest()[:3]
+    raw = b"".join(b"\x00" + color * width for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+def _filler(rng: random.Random, size: int) -> str:
+    words = ("latency", "cache", "vector", "upstream", "search", "result", "python", "async", "index", "query")
+    out = []
+    while sum(len(w) + 1 for w in out) < size:
+        out.append(rng.choice(words))
+    return " ".join(out)
+
+
+def tavily_result(config: FakeMCPConfig, arguments: dict) -> dict:
+    query = str(arguments.get("query", ""))
+    # same query, same payload: repeated calls compress and dedupe like the real thing
+    rng = random.Random(f"{config.seed}:{query}")
+    limit = int(arguments.get("limit", config.results))
+    return {
+        "query": query,
+        "results": [
+            {
+                "title": f"{query} result {i}",
+                "url": f"https://example.com/{hashlib.sha1(f'{query}:{i}'.encode()).hexdigest()[:12]}",
+                "content": _filler(rng, config.payload_bytes),
+                "score": round(rng.random(), 4),
+            }
+            for i in range(limit)
+        ],
+    }
+
+
+def flux_result(config: FakeMCPConfig, arguments: dict) -> dict:
+    prompt = str(arguments.get("prompt", ""))
+    name = hashlib.sha256(f"{config.seed}:{prompt}".encode()).hexdigest()[:16]
+    return {"url": f"{config.public_url}/images/{name}.png", "prompt": prompt}
+
+
+def create_app(config: FakeMCPConfig) -> FastAPI:
+    app = FastAPI(title=f"fake {config.tool} MCP server")
+    rng = random.Random(config.seed)
+    latency = LatencyModel(config.latency, rng)
+    tool_name = TOOLS[config.tool]
+    build = tavily_result if config.tool == TAVILY else flux_result
+    app.state.config = config
+
+    def rpc_error(request_id, code: int, message: str, status_code: int = 200) -> JSONResponse:
+        return JSONResponse({"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}, status_code=status_code)
+
+    @app.post("/")
+    @app.post("/mcp")
+    async def tools_call(request: Request):
+        body = await request.json()
+        request_id = body.get("id")
+        if body.get("method") != "tools/call":
+            return rpc_error(request_id, -32601, f"method {body.get('method')!r} not found")
+        params = body.get("params") or {}
+        if params.get("name") != tool_name:
+            return rpc_error(request_id, -32602, f"unknown tool {params.get('name')!r}")
+        config.calls += 1
+        delay = latency.sample()
+        failed = rng.random() < config.error_rate
+        result = {"jsonrpc": "2.0", "id": request_id, "result": build(config, params.get("arguments") or {})}
+
+        token = (params.get("_meta") or {}).get("progressToken")
+        if token and "text/event-stream" in request.headers.get("accept", "") and not failed:
+            async def events():
+                steps = max(config.progress_steps, 0)
+                for step in range(steps):
+                    await asyncio.sleep(delay / (steps + 1))
+                    note = {"jsonrpc": "2.0", "method": "notifications/progress", "params": {"progressToken": token, "progress": step + 1, "total": steps + 1}}
+                    yield f"data: {json.dumps(note)}\n\n"
+                await asyncio.sleep(delay / (steps + 1))
+                yield f"data: {json.dumps(result)}\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(delay)
+        if failed:
+            config.errors += 1
+            return rpc_error(request_id, -32000, "injected upstream failure", status_code=config.error_status)
+        return JSONResponse(result)
+
+    @app.get("/images/{name}.png")
+    async def image(name: str):
+        return Response(png_bytes(config.image_size, config.image_size, name), media_type="image/png")
+
+    @app.get("/stats")
+    async def stats():
+        return {"tool": config.tool, "calls": config.calls, "errors": config.errors}
+
+    return app
+
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description="Stand-in Tavily/Flux MCP server for benchmarks")
+    parser.add_argument("tool", choices=sorted(TOOLS))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="default 9001 for tavily, 9002 for flux")
+    parser.add_argument("--latency", default=FakeMCPConfig.latency)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--payload-bytes", type=int, default=FakeMCPConfig.payload_bytes)
+    parser.add_argument("--results", type=int, default=FakeMCPConfig.results)
+    parser.add_argument("--progress-steps", type=int, default=FakeMCPConfig.progress_steps)
+    parser.add_argument("--image-size", type=int, default=FakeMCPConfig.image_size)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    port = args.port or (9001 if args.tool == TAVILY else 9002)
+    config = FakeMCPConfig(
+        tool=args.tool,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        payload_bytes=args.payload_bytes,
+        results=args.results,
+        progress_steps=args.progress_steps,
+        image_size=args.image_size,
+        seed=args.seed,
+        public_url=f"http://{args.host}:{port}",
+    )
+    uvicorn.run(create_app(config), host=args.host, port=port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import random
+import sys
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from bench.datasets import PASSWORD, USERS, ZipfPicker, prompt_pool, query_pool, user_email
+from bench.report import Sample, build_report, compare, format_comparison, format_summary, load_report, unreachable, write_report
+
+DEFAULT_MIX = "search=60,dashboard=25,image=10,login=5"
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f"unknown scenario {name!r}; expected one of {sorted(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class Workload:
+    def __init__(self, args: argparse.Namespace):
+        self.rng = random.Random(args.seed)
+        self.queries = ZipfPicker(query_pool(args.queries, args.seed), args.zipf, self.rng)
+        self.prompts = ZipfPicker(prompt_pool(args.prompts, args.seed), args.zipf, self.rng)
+        self.clients: List[httpx.AsyncClient] = []
+        self.emails: List[str] = []
+
+    def client(self) -> httpx.AsyncClient:
+        return self.rng.choice(self.clients)
+
+
+def _cached(resp: httpx.Response) -> Optional[bool]:
+    if resp.status_code >= 300:
+        return None
+    try:
+        return bool(resp.json().get("cached"))
+    except ValueError:
+        return None
+
+
+async def search(workload: Workload, client: httpx.AsyncClient):
+    resp = await client.post("/search/", json={"query": workload.queries.pick()})
+    return resp.status_code, _cached(resp)
+
+
+async def image(workload: Workload, client: httpx.AsyncClient):
+    resp = await client.post("/image/", json={"prompt": workload.prompts.pick()})
+    return resp.status_code, _cached(resp)
+
+
+async def dashboard(workload: Workload, client: httpx.AsyncClient):
+    resp = await client.get("/dashboard/", params={"limit": 20})
+    return resp.status_code, None
+
+
+async def login(workload: Workload, client: httpx.AsyncClient):
+    # fresh client so the session cookie of the driving client is left alone
+    email = workload.rng.choice(workload.emails)
+    async with httpx.AsyncClient(base_url=str(client.base_url), timeout=client.timeout) as fresh:
+        resp = await fresh.post("/auth/login", json={"email": email, "password": PASSWORD})
+    return resp.status_code, None
+
+
+SCENARIOS: Dict[str, Callable] = {"search": search, "image": image, "dashboard": dashboard, "login": login}
+
+
+async def log_in_users(workload: Workload, base_url: str, users: int, timeout: float, pool: int):
+    limits = httpx.Limits(max_connections=pool, max_keepalive_connections=pool)
+    for i in range(users):
+        email = user_email(i)
+        client = httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits)
+        resp = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        if resp.status_code == 401:
+            # not seeded: register on the fly
+            await client.post("/auth/register", json={"email": email, "password": PASSWORD})
+            resp = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        resp.raise_for_status()
+        workload.clients.append(client)
+        workload.emails.append(email)
+
+
+async def run_load(args: argparse.Namespace) -> List[Sample]:
+    workload = Workload(args)
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    await log_in_users(workload, args.base_url, args.users, args.timeout, args.pool)
+
+    samples: List[Sample] = []
+    in_flight: set = set()
+    skipped = 0
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    measure_from = start + args.warmup
+    end = measure_from + args.duration
+
+    async def one(name: str, due: float):
+        # latency runs from when the request was due, not when it was sent, so a
+        # stalled server is not hidden by the generator backing off
+        try:
+            status, cached = await SCENARIOS[name](workload, workload.client())
+        except httpx.HTTPError:
+            status, cached = 0, None
+        if due >= measure_from:
+            samples.append(Sample(name, due - measure_from, loop.time() - due, status, cached))
+
+    async def closed_worker():
+        while loop.time() < end:
+            name = workload.rng.choices(names, weights)[0]
+            await one(name, loop.time())
+
+    try:
+        if args.rate:
+            # open loop: Poisson arrivals at the target rate regardless of response times
+            due = start
+            while due < end:
+                due += workload.rng.expovariate(args.rate)
+                if due >= end:
+                    break
+                delay = due - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if len(in_flight) >= args.max_in_flight:
+                    skipped += 1
+                    continue
+                task = asyncio.ensure_future(one(workload.rng.choices(names, weights)[0], due))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            if in_flight:
+                await asyncio.wait(in_flight, timeout=args.timeout)
+        else:
+            await asyncio.gather(*(closed_worker() for _ in range(args.concurrency)))
+    finally:
+        for task in in_flight:
+            task.cancel()
+        for client in workload.clients:
+            await client.aclose()
+    if skipped:
+        print(f"warning: {skipped} arrivals skipped, {args.max_in_flight} requests already in flight", file=sys.stderr)
+    return samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the API with a mixed workload and report latency percentiles")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of load before measuring")
+    parser.add_argument("--rate", type=float, default=0.0, help="open-loop requests per second; 0 uses --concurrency")
+    parser.add_argument("--concurrency", type=int, default=32, help="closed-loop workers")
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. search=60,dashboard=25,image=10,login=5")
+    parser.add_argument("--users", type=int, default=USERS["small"])
+    parser.add_argument("--queries", type=int, default=1000, help="distinct search queries")
+    parser.add_argument("--prompts", type=int, default=200, help="distinct image prompts")
+    parser.add_argument("--zipf", type=float, default=1.0, help="query popularity skew; 0 is uniform")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--pool", type=int, default=100, help="connections per client")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    samples = asyncio.run(run_load(args))
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    report = build_report(samples, args.duration, config)
+    print(format_summary(report))
+    if args.output:
+        write_report(report, args.output)
+    missing = unreachable(report)
+    if missing:
+        print(f"error: every {', '.join(missing)} request returned 404; those scenarios never ran", file=sys.stderr)
+        sys.exit(2)
+
+    if args.compare:
+        rows = compare(load_report(args.compare), report, args.threshold)
+        print()
+        print(format_comparison(rows))
+        if any(row["regressed"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import json
+import math
+import platform
+import subprocess
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+# Bump when the report layout changes so old baselines are not compared blindly.
+REPORT_VERSION = 2
+
+# latency fields a regression check looks at, and the direction that is worse
+COMPARED = {"p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "throughput_rps": -1, "error_rate": 1}
+
+
+class Sample(NamedTuple):
+    scenario: str
+    # seconds since the run started, at the moment the request was due
+    started: float
+    latency: float
+    status: int
+    # True/False when the response says whether it was served from cache
+    cached: Optional[bool] = None
+
+
+def succeeded(status: int) -> bool:
+    # 304 is a success for conditional polls; 0 (transport error), 3xx, 4xx and 5xx are not
+    return 200 <= status < 300 or status == 304
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    # nearest rank, so p99 of 100 samples is the 99th value and never interpolated
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 3) if value is not None else None
+
+
+def summarize(samples: Iterable[Sample], duration: float) -> Dict[str, dict]:
+    by_scenario: Dict[str, List[Sample]] = defaultdict(list)
+    for s in samples:
+        by_scenario[s.scenario].append(s)
+    by_scenario["all"] = [s for group in list(by_scenario.values()) for s in group]
+
+    summary = {}
+    for scenario, group in by_scenario.items():
+        # latency and throughput cover successes only: a fast 404 is not a served request
+        ok = [s for s in group if succeeded(s.status)]
+        latencies = sorted(s.latency for s in ok)
+        errors = len(group) - len(ok)
+        cacheable = [s.cached for s in group if s.cached is not None]
+        statuses: Dict[str, int] = defaultdict(int)
+        for s in group:
+            statuses[str(s.status)] += 1
+        summary[scenario] = {
+            "requests": len(group),
+            "errors": errors,
+            "error_rate": round(errors / len(group), 6) if group else 0.0,
+            "throughput_rps": round(len(ok) / duration, 3) if duration > 0 else 0.0,
+            "mean_ms": _ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50_ms": _ms(percentile(latencies, 0.50)),
+            "p95_ms": _ms(percentile(latencies, 0.95)),
+            "p99_ms": _ms(percentile(latencies, 0.99)),
+            "max_ms": _ms(latencies[-1]) if latencies else None,
+            "cache_hit_ratio": round(sum(cacheable) / len(cacheable), 4) if cacheable else None,
+            "status": dict(statuses),
+        }
+    return summary
+
+
+def unreachable(report: dict) -> List[str]:
+    # scenarios that never got past routing, e.g. a router that is not mounted
+    return [
+        scenario for scenario, s in report["scenarios"].items()
+        if scenario != "all" and s["requests"] and set(s["status"]) == {"404"}
+    ]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def build_report(samples: List[Sample], duration: float, config: dict) -> dict:
+    return {
+        "version": REPORT_VERSION,
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "duration_s": round(duration, 3),
+        "config": config,
+        "scenarios": summarize(samples, duration),
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> List[dict]:
+    # one row per (scenario, metric) present in both reports; "regressed" when the
+    # metric moved in the bad direction by more than threshold (relative)
+    if baseline.get("version") != current.get("version"):
+        raise ValueError(f"report versions differ: {baseline.get('version')} != {current.get('version')}")
+    rows = []
+    for scenario, now in current["scenarios"].items():
+        before = baseline["scenarios"].get(scenario)
+        if before is None:
+            continue
+        for metric, worse in COMPARED.items():
+            old, new = before.get(metric), now.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else math.inf)
+            rows.append({
+                "scenario": scenario,
+                "metric": metric,
+                "baseline": old,
+                "current": new,
+                "change": round(change, 4) if math.isfinite(change) else None,
+                "regressed": change * worse > threshold,
+            })
+    return rows
+
+
+def format_summary(report: dict) -> str:
+    header = f"{'scenario':<12}{'reqs':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}{'cache':>8}"
+    lines = [header, "-" * len(header)]
+    for scenario, s in report["scenarios"].items():
+        hit = f"{s['cache_hit_ratio']:.0%}" if s["cache_hit_ratio"] is not None else "-"
+        lines.append(
+            f"{scenario:<12}{s['requests']:>8}{s['throughput_rps']:>10.1f}"
+            f"{s['p50_ms'] or 0:>10.1f}{s['p95_ms'] or 0:>10.1f}{s['p99_ms'] or 0:>10.1f}{s['errors']:>8}{hit:>8}"
+        )
+    return "\n".join(lines)
+
+
+def format_comparison(rows: List[dict]) -> str:
+    lines = []
+    for row in rows:
+        change = f"{row['change']:+.1%}" if row["change"] is not None else "n/a"
+        flag = "  REGRESSION" if row["regressed"] else ""
+        lines.append(f"{row['scenario']:<12}{row['metric']:<16}{row['baseline']:>12}{row['current']:>12}{change:>10}{flag}")
+    return "\n".join(lines)
+
+
+def load_report(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_report(report: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.core.security import hash_password, password_hasher
+from app.db.history_writer import HistoryWriter
+from app.db.payload_store import PayloadStore
+from app.db.session import engine
+from app.models import ImageHistory, Payload, SearchHistory, User
+from bench.datasets import PASSWORD, SCALES, USERS, prompt_pool, query_pool, user_email
+from bench.fake_mcp import FakeMCPConfig, flux_result, tavily_result
+
+BATCH_SIZE = 2000
+
+
+async def ensure_users(count: int) -> List[uuid.UUID]:
+    # one hash for every bench user; hashing is the slow part of creating users
+    hashed = await hash_password(PASSWORD)
+    emails = [user_email(i) for i in range(count)]
+    async with engine.begin() as conn:
+        await conn.execute(
+            pg_insert(User.__table__)
+            .values([{"id": uuid.uuid4(), "email": email, "hashed_password": hashed, "is_active": True, "is_admin": False} for email in emails])
+            .on_conflict_do_nothing(index_elements=["email"])
+        )
+        result = await conn.execute(select(User.__table__.c.id, User.__table__.c.email).where(User.__table__.c.email.in_(emails)))
+        by_email = {row.email: row.id for row in result}
+    return [by_email[email] for email in emails]
+
+
+async def reset_history(user_ids: List[uuid.UUID]):
+    async with engine.begin() as conn:
+        for model in (SearchHistory, ImageHistory):
+            await conn.execute(delete(model.__table__).where(model.__table__.c.user_id.in_(user_ids)))
+
+
+def history_batches(scale: str, user_ids: List[uuid.UUID], seed: int) -> Iterator[Tuple[str, List[dict]]]:
+    # generated lazily: the large scale does not fit in memory at once
+    rng = random.Random(seed)
+    total = SCALES[scale]
+    # a tenth as many distinct queries as rows, so payloads dedupe the way real traffic does
+    queries = query_pool(max(total // 10, 1), seed)
+    prompts = prompt_pool(max(total // 40, 1), seed)
+    config = FakeMCPConfig(seed=seed)
+
+    @lru_cache(maxsize=4096)
+    def search_response(query: str) -> dict:
+        return {"jsonrpc": "2.0", "id": query, "result": tavily_result(config, {"query": query, "limit": 5})}
+
+    @lru_cache(maxsize=4096)
+    def image_response(prompt: str) -> dict:
+        return {"jsonrpc": "2.0", "id": prompt, "result": flux_result(config, {"prompt": prompt})}
+
+    now = datetime.now(timezone.utc)
+    pending: Dict[str, List[dict]] = {"search": [], "image": []}
+    for i in range(total):
+        user_id = user_ids[i % len(user_ids)]
+        created_at = now - timedelta(seconds=rng.uniform(0, 90 * 24 * 3600))
+        if i % 4 == 3:
+            kind = "image"
+            prompt = rng.choice(prompts)
+            response = image_response(prompt)
+            pending[kind].append({
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "prompt": prompt,
+                "image_url": response["result"]["url"],
+                "mcp_response": response,
+                "mcp_server": settings.FLUX_MCP_URL,
+                "created_at": created_at,
+            })
+        else:
+            kind = "search"
+            query = rng.choice(queries)
+            pending[kind].append({
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "query": query,
+                "mcp_response": search_response(query),
+                "mcp_server": settings.TAVILY_MCP_URL,
+                "created_at": created_at,
+            })
+        if len(pending[kind]) >= BATCH_SIZE:
+            yield kind, pending[kind]
+            pending[kind] = []
+    for kind, rows in pending.items():
+        if rows:
+            yield kind, rows
+
+
+async def seed(scale: str, users: int, seed_value: int, reset: bool):
+    started = time.monotonic()
+    user_ids = await ensure_users(users)
+    if reset:
+        await reset_history(user_ids)
+    # same insert path as the write-behind writer, including payload externalization
+    writer = HistoryWriter(
+        engine,
+        payloads=PayloadStore(Payload.__table__, settings.PAYLOAD_CODEC, settings.PAYLOAD_COMPRESSION_LEVEL, dialect=engine.dialect.name),
+    )
+    tables = {"search": SearchHistory.__table__, "image": ImageHistory.__table__}
+    counts = {"search": 0, "image": 0}
+    for kind, rows in history_batches(scale, user_ids, seed_value):
+        await writer.insert_rows(tables[kind], rows)
+        counts[kind] += len(rows)
+    print(f"search: {counts['search']} rows, image: {counts['image']} rows")
+    print(f"seeded scale={scale} users={users} in {time.monotonic() - started:.1f}s (password: {PASSWORD})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed bench users and history rows")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--users", type=int, default=None, help="defaults to the scale's user count")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help="delete the bench users' history first")
+    args = parser.parse_args(argv)
+
+    async def run():
+        try:
+            await seed(args.scale, args.users or USERS[args.scale], args.seed, args.reset)
+        finally:
+            await engine.dispose()
+            password_hasher.shutdown()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
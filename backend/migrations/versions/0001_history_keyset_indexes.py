@@ -0,0 +1,31 @@
+"""composite (user_id, created_at, id) indexes for dashboard keyset pagination
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction and avoids locking writes on big tables
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_search_history_user_created_id "
+            "ON search_history (user_id, created_at, id)"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_image_history_user_created_id "
+            "ON image_history (user_id, created_at, id)"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_image_history_user_created_id")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_search_history_user_created_id")
@@ -0,0 +1,31 @@
+"""GIN full-text expression indexes for dashboard keyword filtering
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # expressions must match app.db.text_search.ts_document
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_search_history_query_fts "
+            "ON search_history USING gin (to_tsvector('simple', query))"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_image_history_prompt_fts "
+            "ON image_history USING gin (to_tsvector('simple', prompt))"
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_image_history_prompt_fts")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_search_history_query_fts")
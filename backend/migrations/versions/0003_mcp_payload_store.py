@@ -0,0 +1,36 @@
+"""Content-addressed payload table; history rows reference payloads by digest
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "mcp_payloads",
+        sa.Column("digest", sa.Text(), primary_key=True),
+        sa.Column("codec", sa.Text(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("data", postgresql.BYTEA(), nullable=False),
+        sa.Column("created_at", postgresql.TIMESTAMP(timezone=True), server_default=sa.text("now()")),
+    )
+    # existing rows keep their inline mcp_response; readers fall back to it
+    op.add_column("search_history", sa.Column("payload_digest", sa.Text(), nullable=True))
+    op.add_column("image_history", sa.Column("payload_digest", sa.Text(), nullable=True))
+    op.alter_column("image_history", "mcp_response", nullable=True)
+
+
+def downgrade():
+    op.alter_column("image_history", "mcp_response", nullable=False)
+    op.drop_column("image_history", "payload_digest")
+    op.drop_column("search_history", "payload_digest")
+    op.drop_table("mcp_payloads")
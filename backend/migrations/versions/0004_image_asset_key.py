@@ -0,0 +1,21 @@
+"""Local asset key on image_history
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("image_history", sa.Column("asset_key", sa.String(length=80), nullable=True))
+
+
+def downgrade():
+    op.drop_column("image_history", "asset_key")